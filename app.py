@@ -1,6 +1,10 @@
 import logging
+import click
+from flask import current_app
 from app import create_app, db
 from flask.cli import FlaskGroup
+from flask_migrate import stamp
+from sqlalchemy import inspect
 
 # Create a function to get the app instance
 def get_app():
@@ -14,10 +18,22 @@ logger = logging.getLogger('strategist')
 
 @cli.command("create_db")
 def create_db():
-    """Create the database tables."""
+    """Create the tables of an empty database and mark them as up to date with the migrations."""
+    existing_tables = set(inspect(db.engine).get_table_names())
+    if existing_tables:
+        # create_all would skip the indexes and backfills of the migrations on an existing database
+        if 'alembic_version' in existing_tables:
+            print("The database already exists. Apply schema changes with: python app.py db upgrade")
+        else:
+            print("The database was created before migrations were added. Bring it up to date with:\n"
+                  "    python app.py db stamp c551bb5ea492\n"
+                  "    python app.py db upgrade")
+        return
+    
     logger.info("Creating database tables...")
     try:
         db.create_all()
+        stamp()
         logger.info("Database tables created successfully")
         print("Database tables created successfully")
     except Exception as e:
@@ -38,6 +54,54 @@ def drop_db():
         print(f"Error dropping database tables: {str(e)}")
         raise
 
+@cli.command("drain_outbox")
+@click.option('--once', is_flag=True, help='Exit once no system update is ready to be delivered.')
+@click.option('--batch-size', type=int, default=None, help='Maximum updates to claim per batch.')
+@click.option('--workers', type=int, default=None, help='Maximum concurrent deliveries to Sensay.')
+@click.option('--poll-interval', type=float, default=None, help='Seconds to sleep when the outbox is empty.')
+def drain_outbox(once, batch_size, workers, poll_interval):
+    """Deliver queued system updates to the users' replicas."""
+    # Import here so the other commands do not load the Sensay client
+    from app.services.outbox import run_outbox_worker
+    
+    try:
+        processed = run_outbox_worker(current_app._get_current_object(), once=once, batch_size=batch_size,
+                                      workers=workers, poll_interval=poll_interval)
+        print(f"Delivered or retried {processed} system updates")
+    except KeyboardInterrupt:
+        logger.info("Outbox worker interrupted")
+
+@cli.command("rebuild_user_stats")
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Rebuild only this user (repeatable).')
+def rebuild_user_stats_command(user_ids):
+    """Recompute the materialized user stats from the goals, milestones and reflections."""
+    from app.user_stats import rebuild_user_stats
+    
+    rebuilt = rebuild_user_stats(list(user_ids) or None)
+    print(f"Rebuilt stats for {rebuilt} users")
+
+@cli.command("verify_user_stats")
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Verify only this user (repeatable).')
+@click.option('--repair', is_flag=True, help='Rebuild the stats of the users that drifted.')
+def verify_user_stats_command(user_ids, repair):
+    """Compare the materialized user stats with recomputed ones; exits with status 1 on drift."""
+    from app.user_stats import verify_user_stats, rebuild_user_stats
+    
+    drift = verify_user_stats(list(user_ids) or None)
+    for user_id, stored, actual in drift:
+        print(f"User {user_id}: stored {stored}, actual {actual}")
+    if not drift:
+        print("User stats are up to date")
+        return
+    
+    logger.warning(f"User stats drifted for {len(drift)} users")
+    if repair:
+        rebuild_user_stats([user_id for user_id, _, _ in drift])
+        print(f"Repaired stats for {len(drift)} users")
+    else:
+        print(f"Stats drifted for {len(drift)} users (run with --repair to rebuild them)")
+        raise SystemExit(1)
+
 if __name__ == "__main__":
     logger.info("Starting Strategist application")
     cli() 
\ No newline at end of file
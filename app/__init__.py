@@ -2,7 +2,6 @@ import os
 import logging
 from logging.handlers import RotatingFileHandler
 from flask import Flask, jsonify
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
@@ -11,8 +10,11 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Imported after load_dotenv so the engine settings see the .env file
+from app.database import ProfiledSQLAlchemy, engine_options, DB_ENGINE_PROFILE
+
 # Initialize SQLAlchemy
-db = SQLAlchemy()
+db = ProfiledSQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
 
@@ -31,27 +33,40 @@ def create_app(test_config=None):
         JWT_ACCESS_TOKEN_EXPIRES=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 86400)),
         JWT_IDENTITY_CLAIM='sub',
         JWT_JSON_SUBJECT=True,  # Allow non-string subject values
-        LOG_LEVEL=os.environ.get('LOG_LEVEL', 'INFO')
+        LOG_LEVEL=os.environ.get('LOG_LEVEL', 'INFO'),
+        DB_ENGINE_PROFILE=DB_ENGINE_PROFILE,
+        DATABASE_REPLICA_URL=os.environ.get('DATABASE_REPLICA_URL'),  # Optional read replica of DATABASE_URL
+        METRICS_TOKEN=os.environ.get('METRICS_TOKEN')  # Operator token for /api/metrics, which is disabled without one
     )
     
     # Test configuration
     if test_config is not None:
         app.config.from_mapping(test_config)
     
+    # Engine and pool options for the configured database, unless set explicitly
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI'],
+                                                                      app.config['DB_ENGINE_PROFILE']))
+    
     # Setup logging
     configure_logging(app)
     
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Batch mode lets autogenerated migrations alter SQLite tables
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(app.root_path), 'migrations'),
+                     render_as_batch=True)
     jwt.init_app(app)
     
+    # Import here to avoid circular imports
+    from app.read_replica import init_read_replica, READ_PRIMARY_UNTIL_HEADER
+    init_read_replica(app)
+    
     # Configure CORS to allow requests from the frontend domain
     CORS(app, resources={r"/api/*": {"origins": [
         "http://localhost:5173",  # Local development
         "https://navi-i412.onrender.com",  # Production frontend domain
         os.environ.get("FRONTEND_URL", "*")  # Configurable frontend URL
-    ]}})
+    ]}}, expose_headers=[READ_PRIMARY_UNTIL_HEADER])
     
     # Setup JWT error handlers
     @jwt.invalid_token_loader
@@ -75,11 +90,13 @@ def create_app(test_config=None):
     from app.api.goals import goals_bp
     from app.api.progress import progress_bp
     from app.api.chat import chat_bp
+    from app.api.metrics import metrics_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(goals_bp, url_prefix='/api/goals')
     app.register_blueprint(progress_bp, url_prefix='/api/progress')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
+    app.register_blueprint(metrics_bp, url_prefix='/api/metrics')
     
     logger.info('Application initialized successfully')
     
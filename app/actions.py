@@ -0,0 +1,408 @@
+"""
+Handlers for the actions the AI requests in its replies.
+
+Each action type is registered with @action_handler together with the
+schema from app/schemas.py that validates its payload. process_action()
+looks the handler up, loads the payload once and records per-type counts
+and timings in the metrics registry; process_actions() runs all actions
+from one reply in a single transaction. Adding an action type only needs a
+schema and a handler function.
+"""
+
+import json
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from marshmallow import ValidationError
+
+from app import db
+from app.metrics import metrics
+from app.models import Goal, Reflection, ProgressUpdate, Milestone
+from app.schemas import (
+    CreateGoalSchema, SaveReflectionSchema, SaveReflectionsSchema, UpdateProgressSchema,
+    UpdateMilestoneSchema, UpdateGoalSchema
+)
+
+logger = logging.getLogger('strategist.actions')
+
+ActionHandler = namedtuple('ActionHandler', ['func', 'schema', 'default_display'])
+
+# action_type -> ActionHandler
+ACTION_HANDLERS = {}
+
+def action_handler(action_type, schema, default_display=None):
+    """Register a function as the handler for an action type.
+
+    The handler is called as func(data, user_id, related_goal_id, commit)
+    with the payload loaded by the schema, and returns the result dictionary.
+
+    Args:
+        action_type: Value of 'action_type' in the action JSON
+        schema: Schema instance used to load the action's 'data'
+        default_display: Message shown when the action has no display_message
+    """
+    def register(func):
+        ACTION_HANDLERS[action_type] = ActionHandler(func, schema, default_display)
+        return func
+    return register
+
+def _save_action_changes(commit):
+    """Commit an action's changes, or only flush them when it is part of a batch."""
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+
+def _get_user_goal(goal_id, user_id):
+    """Return the user's goal, raising ValueError if it does not exist."""
+    if not goal_id:
+        raise ValueError("Goal ID is required")
+    goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
+    if not goal:
+        raise ValueError(f"Goal not found: {goal_id}")
+    return goal
+
+def _upsert_reflection(goal_id, reflection_type, content):
+    """Update the goal's reflection of a type, or create it.
+
+    Returns:
+        Tuple of (reflection, created)
+    """
+    reflection = Reflection.query.filter_by(goal_id=goal_id, reflection_type=reflection_type).first()
+    if reflection:
+        reflection.content = content
+        reflection.updated_at = datetime.utcnow()
+        logger.info(f"Updated existing reflection ID: {reflection.id}")
+        return reflection, False
+
+    reflection = Reflection(goal_id=goal_id, reflection_type=reflection_type, content=content)
+    db.session.add(reflection)
+    db.session.flush()  # To get the ID
+    logger.info(f"Created new reflection ID: {reflection.id}")
+    return reflection, True
+
+def format_validation_error(messages):
+    """Flatten marshmallow error messages into one line, e.g. "milestones.0.title: Not a valid string."."""
+    parts = []
+
+    def collect(value, path):
+        if isinstance(value, dict):
+            for key, nested in value.items():
+                collect(nested, path + [str(key)])
+            return
+        text = ' '.join(str(message) for message in value) if isinstance(value, list) else str(value)
+        parts.append(f"{'.'.join(path)}: {text}" if path else text)
+
+    collect(messages, [])
+    return '; '.join(parts)
+
+@action_handler('create_goal', CreateGoalSchema(),
+                default_display='Great! I\'ve created your goal. You can now view and track it in your goals dashboard.')
+def create_goal_action(data, user_id, related_goal_id, commit):
+    # Import here to avoid circular imports
+    from app.api.goals import create_goal_internal
+
+    goal = create_goal_internal(user_id, data, commit=commit)
+    logger.info(f"Successfully created goal with ID: {goal['id']}")
+    return {
+        'action': 'create_goal',
+        'goal': goal
+    }
+
+@action_handler('save_reflection', SaveReflectionSchema())
+def save_reflection_action(data, user_id, related_goal_id, commit):
+    goal = _get_user_goal(data.get('goal_id') or related_goal_id, user_id)
+    reflection, _ = _upsert_reflection(goal.id, data['reflection_type'], data['content'])
+    _save_action_changes(commit)
+    return {
+        'action': 'save_reflection',
+        'reflection': {
+            'id': reflection.id,
+            'goal_id': goal.id,
+            'reflection_type': data['reflection_type']
+        }
+    }
+
+@action_handler('save_reflections', SaveReflectionsSchema())
+def save_reflections_action(data, user_id, related_goal_id, commit):
+    goal = _get_user_goal(data.get('goal_id') or related_goal_id, user_id)
+
+    saved_reflections = []
+    for reflection_data in data['reflections']:
+        reflection_type = reflection_data.get('type')
+        content = reflection_data.get('content')
+        if not reflection_type or not content:
+            logger.warning(f"Skipping reflection with missing type or content: {reflection_data}")
+            continue
+
+        reflection, _ = _upsert_reflection(goal.id, reflection_type, content)
+        saved_reflections.append({
+            'id': reflection.id,
+            'goal_id': goal.id,
+            'reflection_type': reflection_type
+        })
+
+    _save_action_changes(commit)
+    return {
+        'action': 'save_reflections',
+        'reflections': saved_reflections
+    }
+
+@action_handler('update_progress', UpdateProgressSchema())
+def update_progress_action(data, user_id, related_goal_id, commit):
+    goal = _get_user_goal(data.get('goal_id') or related_goal_id, user_id)
+    progress_value = data['progress_value']
+    update_type = data['type']
+    notes = data['notes'] or ''
+
+    update = ProgressUpdate(
+        goal_id=goal.id,
+        progress_value=progress_value,
+        type=update_type
+    )
+    if update_type == 'progress':
+        update.progress_notes = notes
+    else:
+        update.effort_notes = notes
+
+    # Only update goal completion status when type is 'progress'
+    if update_type == 'progress':
+        goal.completion_status = progress_value
+
+        # If progress is 100%, mark goal as completed
+        if progress_value == 100 and goal.status == 'active':
+            goal.status = 'completed'
+
+    db.session.add(update)
+    _save_action_changes(commit)
+    logger.info(f"Updated {update_type} for goal ID {goal.id} to {progress_value}")
+
+    return {
+        'action': 'update_progress',
+        'progress_update': {
+            'id': update.id,
+            'goal_id': goal.id,
+            'progress_value': progress_value,
+            'type': update_type,
+            'notes': notes
+        }
+    }
+
+@action_handler('update_milestone', UpdateMilestoneSchema())
+def update_milestone_action(data, user_id, related_goal_id, commit):
+    goal = _get_user_goal(data.get('goal_id') or related_goal_id, user_id)
+
+    milestone = Milestone.query.filter_by(id=data['milestone_id'], goal_id=goal.id).first()
+    if not milestone:
+        raise ValueError(f"Milestone not found: {data['milestone_id']}")
+
+    if 'status' in data:
+        milestone.status = data['status']
+    if 'completion_status' in data:
+        milestone.completion_status = data['completion_status']
+
+    _save_action_changes(commit)
+    logger.info(f"Updated milestone ID {milestone.id} for goal ID {goal.id}")
+
+    return {
+        'action': 'update_milestone',
+        'milestone': {
+            'id': milestone.id,
+            'goal_id': goal.id,
+            'status': milestone.status,
+            'completion_status': milestone.completion_status
+        }
+    }
+
+@action_handler('update_goal', UpdateGoalSchema())
+def update_goal_action(data, user_id, related_goal_id, commit):
+    goal = _get_user_goal(data.get('goal_id') or related_goal_id, user_id)
+
+    # Track changes
+    changes = []
+
+    if 'title' in data and data['title'] != goal.title:
+        old_title = goal.title
+        goal.title = data['title']
+        changes.append(f"title from '{old_title}' to '{goal.title}'")
+
+    if 'target_date' in data and data['target_date'] != goal.target_date:
+        goal.target_date = data['target_date']
+        changes.append(f"target date to {goal.target_date.strftime('%Y-%m-%d')}")
+
+    if 'status' in data and data['status'] != goal.status:
+        old_status = goal.status
+        goal.status = data['status']
+        changes.append(f"status from '{old_status}' to '{goal.status}'")
+
+    for reflection_type, content in data.get('reflections', {}).items():
+        if not content:
+            continue
+
+        reflection = Reflection.query.filter_by(goal_id=goal.id, reflection_type=reflection_type).first()
+        if reflection:
+            # Update existing reflection if content changed
+            if reflection.content != content:
+                reflection.content = content
+                reflection.updated_at = datetime.utcnow()
+                changes.append(f"reflection on '{reflection_type}'")
+        else:
+            db.session.add(Reflection(goal_id=goal.id, reflection_type=reflection_type, content=content))
+            changes.append(f"added new reflection on '{reflection_type}'")
+
+    _save_action_changes(commit)
+    if not commit:
+        # Reload the collections so reflections added above are included
+        db.session.expire(goal, ['milestones', 'reflections'])
+    logger.info(f"Updated goal ID {goal.id}: {', '.join(changes)}")
+
+    milestones_data = [{
+        'id': milestone.id,
+        'title': milestone.title,
+        'target_date': milestone.target_date.isoformat(),
+        'completion_status': milestone.completion_status,
+        'status': milestone.status
+    } for milestone in goal.milestones]
+
+    reflections_data = {
+        reflection.reflection_type: {
+            'id': reflection.id,
+            'content': reflection.content,
+            'created_at': reflection.created_at.isoformat(),
+            'updated_at': reflection.updated_at.isoformat()
+        }
+        for reflection in goal.reflections
+    }
+
+    return {
+        'action': 'update_goal',
+        'goal': {
+            'id': goal.id,
+            'title': goal.title,
+            'start_date': goal.start_date.isoformat(),
+            'target_date': goal.target_date.isoformat(),
+            'completion_status': goal.completion_status,
+            'status': goal.status,
+            'milestones': milestones_data,
+            'reflections': reflections_data,
+            'updated_at': goal.updated_at.isoformat()
+        }
+    }
+
+def process_action(action_data, user_id, related_goal_id=None, commit=True):
+    """Process the action requested by the AI and return the result.
+
+    With commit=False the changes are only flushed; process_actions() uses
+    this to run several actions in one transaction.
+
+    Returns:
+        Tuple of (result, display_content). result has an 'error' key if the
+        action failed, and both are None for an unknown action type.
+    """
+    action_type = action_data.get('action_type')
+    logger.info(f"Processing action: {action_type}")
+    logger.debug(f"Full action JSON data: {json.dumps(action_data, indent=2)}")
+    logger.debug(f"User ID: {user_id}, Related Goal ID: {related_goal_id}")
+
+    handler = ACTION_HANDLERS.get(action_type)
+    if handler is None:
+        logger.warning(f"Unknown action type: {action_type}")
+        metrics.incr(f"actions.unknown[{action_type}]")
+        return None, None
+
+    start = time.perf_counter()
+    try:
+        data = handler.schema.load(action_data.get('data') or {})
+        result = handler.func(data, user_id, related_goal_id, commit)
+    except ValidationError as e:
+        error = f"Invalid {action_type} data: {format_validation_error(e.messages)}"
+        logger.warning(f"Rejected {action_type} action: {error}")
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Failed to process {action_type} action: {error}", exc_info=True)
+    else:
+        metrics.incr(f"actions.applied[{action_type}]")
+        logger.debug(f"{action_type} action completed successfully")
+        return result, action_data.get('display_message') or handler.default_display
+    finally:
+        metrics.observe(f"actions.duration[{action_type}]", time.perf_counter() - start)
+
+    metrics.incr(f"actions.failed[{action_type}]")
+    return {
+        'action': action_type,
+        'error': error
+    }, None
+
+def process_actions(actions, user_id, related_goal_id=None, commit=True):
+    """Process all actions from one AI reply in a single transaction.
+
+    Every action is applied with flushes only, so either all of them are
+    stored or, if any fails, the whole batch is rolled back.
+
+    Args:
+        actions: List of action dictionaries (each with 'action_type' and 'data')
+        user_id: ID of the user the actions apply to
+        related_goal_id: Goal to use when an action does not name one
+        commit: Commit the batch. Pass False to leave it pending so the caller
+            can commit it together with its own changes.
+
+    Returns:
+        Tuple of (results, display_messages). results has one entry per action
+        with a 'status' of applied, failed, rolled_back, skipped or ignored
+        (unknown action type). display_messages is empty if the batch failed.
+    """
+    results = []
+    display_messages = []
+    failed = None
+
+    for index, action_data in enumerate(actions):
+        action_type = action_data.get('action_type')
+        if failed is not None:
+            results.append({
+                'action': action_type,
+                'status': 'skipped',
+                'error': f"Not run because action {failed + 1} failed"
+            })
+            continue
+
+        result, display_content = process_action(action_data, user_id, related_goal_id, commit=False)
+        if result is None:
+            results.append({
+                'action': action_type,
+                'status': 'ignored',
+                'error': f"Unknown action type: {action_type}"
+            })
+            continue
+
+        if 'error' in result:
+            failed = index
+            result['status'] = 'failed'
+        else:
+            result['status'] = 'applied'
+            if display_content:
+                display_messages.append(display_content)
+        results.append(result)
+
+    if failed is None and commit:
+        try:
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to commit actions: {str(e)}", exc_info=True)
+            failed = len(results)
+
+    if failed is not None:
+        db.session.rollback()
+        display_messages = []
+        for index, result in enumerate(results):
+            if result['status'] == 'applied':
+                results[index] = {
+                    'action': result['action'],
+                    'status': 'rolled_back',
+                    'error': f"Rolled back because action {failed + 1} failed" if failed < len(results)
+                             else "Rolled back because the changes could not be saved"
+                }
+        logger.warning(f"Rolled back {len(actions)} action(s) for user {user_id}")
+
+    return results, display_messages
@@ -1,6 +1,7 @@
 import os
 import logging
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import (
     create_access_token, create_refresh_token, 
@@ -11,7 +12,10 @@ from app import db
 from app.models import User, UserPreference
 from app.services.sensay import get_sensay_client, SensayAPIError
 from app.utils import get_user_id_from_jwt
-from app.api.chat import ensure_replica_exists, send_system_update
+from app.services.provisioning import create_provisioning_job, submit_provisioning, get_provisioning_status
+from app.services.accounts import delete_user_data
+from app.user_stats import rebuild_user_stats
+from app.read_replica import record_user_write
 
 # Get logger
 logger = logging.getLogger('strategist.auth')
@@ -41,33 +45,9 @@ def register():
         logger.warning(f"Registration failed: Email already exists: {data['email']}")
         return jsonify({'error': 'Email already exists'}), 409
         
-    # Create user in Sensay
-    try:
-        sensay_client = get_sensay_client()
-        sensay_user_id = f"{os.environ.get('SENSAY_USER_ID_PREFIX', 'navi_')}{data['username']}"
-        logger.debug(f"Generated Sensay user ID: {sensay_user_id}")
-        
-        # Check if Sensay user exists
-        try:
-            logger.debug(f"Checking if Sensay user exists: {sensay_user_id}")
-            sensay_client.get_user(sensay_user_id)
-            logger.info(f"Sensay user already exists: {sensay_user_id}")
-            # User exists, continue with local registration
-        except Exception as e:
-            # Create user in Sensay
-            logger.info(f"Creating new Sensay user: {sensay_user_id}")
-            sensay_client.create_user({
-                'id': sensay_user_id,
-                'email': data['email'],
-                'name': data['username']
-            })
-            logger.info(f"Successfully created Sensay user: {sensay_user_id}")
-    except SensayAPIError as e:
-        logger.error(f"Failed to register with Sensay API: {str(e)}")
-        return jsonify({'error': f'Failed to register with Sensay: {str(e)}'}), 500
-    except Exception as e:
-        logger.error(f"Unexpected error during Sensay registration: {str(e)}", exc_info=True)
-        return jsonify({'error': f'Failed to register with Sensay: {str(e)}'}), 500
+    # The Sensay user and replica are provisioned in the background
+    sensay_user_id = f"{os.environ.get('SENSAY_USER_ID_PREFIX', 'navi_')}{data['username']}"
+    logger.debug(f"Generated Sensay user ID: {sensay_user_id}")
     
     # Create user in local database
     user = User(
@@ -82,27 +62,25 @@ def register():
     
     db.session.add(user)
     db.session.add(preferences)
+    provisioning_job = create_provisioning_job(user)
     
     try:
         db.session.commit()
         logger.info(f"User registered successfully: {user.username} (ID: {user.id})")
-        
-        # Create a new replica for this user
-        try:
-            replica_id = ensure_replica_exists(sensay_client, sensay_user_id)
-            logger.info(f"Created new replica with ID: {replica_id} for user: {user.username}")
-            
-            # Send an initial hello message to the replica
-            send_system_update(user.id, "Hello", save_message=True)
-            logger.info(f"Sent initial hello message to replica for user: {user.username}")
-        except Exception as e:
-            logger.error(f"Failed to create replica or send initial message: {str(e)}", exc_info=True)
-            # Continue with registration even if replica creation fails
+        # The new user's first reads must see the account on the primary
+        record_user_write(user.id)
     except Exception as e:
         db.session.rollback()
         logger.error(f"Database error during user registration: {str(e)}", exc_info=True)
         return jsonify({'error': f'Failed to register user: {str(e)}'}), 500
     
+    # Create the Sensay user and replica and send the initial hello message
+    try:
+        submit_provisioning(current_app._get_current_object(), user.id)
+    except Exception as e:
+        # Chat endpoints will run the pending job if it could not be submitted
+        logger.error(f"Failed to submit provisioning job: {str(e)}", exc_info=True)
+    
     # Generate access token
     access_token = create_access_token(identity=str(user.id))
     
@@ -114,7 +92,8 @@ def register():
             'username': user.username,
             'email': user.email,
             'sensay_user_id': user.sensay_user_id
-        }
+        },
+        'provisioning': provisioning_job.to_dict()
     }), 201
     
     
@@ -129,6 +108,26 @@ def register():
     #     }
     # }), 201
 
+@auth_bp.route('/provisioning', methods=['GET'])
+@jwt_required()
+def get_provisioning():
+    """Get the status of the current user's replica provisioning job."""
+    user_id = get_user_id_from_jwt()
+    logger.debug(f"Getting provisioning status for user ID: {user_id}")
+    
+    user = User.query.get(user_id)
+    
+    if not user:
+        logger.warning(f"Provisioning status failed: User not found: {user_id}")
+        return jsonify({'error': 'User not found'}), 404
+    
+    status = get_provisioning_status(user.id)
+    if status is None:
+        # Registered before background provisioning existed
+        status = {'status': 'completed' if user.replica_id else 'not_started'}
+    
+    return jsonify({'provisioning': status}), 200
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Log in an existing user."""
@@ -377,65 +376,74 @@ def delete_user():
         logger.warning(f"User deletion failed: User not found: {user_id}")
         return jsonify({'error': 'User not found'}), 404
     
-    logger.info(f"Deleting user: {user.username} (ID: {user.id}, Sensay ID: {user.sensay_user_id})")
+    username = user.username
+    sensay_user_id = user.sensay_user_id
+    logger.info(f"Deleting user: {username} (ID: {user.id}, Sensay ID: {sensay_user_id})")
     
-    # Delete user from Sensay first
     try:
         sensay_client = get_sensay_client()
-        logger.info(f"Deleting user from Sensay: {user.sensay_user_id}")
-        sensay_client.delete_user(user.sensay_user_id)
-        logger.info(f"Successfully deleted user from Sensay: {user.sensay_user_id}")
-    except SensayAPIError as e:
-        if e.status_code == 404:
-            # User doesn't exist in Sensay, continue with local deletion
-            logger.warning(f"User not found in Sensay (continuing with local deletion): {user.sensay_user_id}")
-        else:
-            logger.error(f"Failed to delete user from Sensay: {str(e)}")
-            return jsonify({'error': f'Failed to delete user from Sensay: {str(e)}'}), 500
     except Exception as e:
         logger.error(f"Unexpected error during Sensay user deletion: {str(e)}", exc_info=True)
         return jsonify({'error': f'Failed to delete user from Sensay: {str(e)}'}), 500
     
-    # Delete user from local database
-    # Due to foreign key constraints, we need to delete related data first
-    try:
-        # Import here to avoid circular imports
-        from app.models import ChatMessage, Goal, Reflection, ProgressUpdate, Milestone
+    # Delete the user from Sensay while the local data is deleted; the user row
+    # itself is only deleted once Sensay has confirmed, so a failed request can be retried
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='sensay-delete-user') as executor:
+        logger.info(f"Deleting user from Sensay: {sensay_user_id}")
+        sensay_deletion = executor.submit(sensay_client.delete_user, sensay_user_id)
         
-        # Delete chat messages
-        ChatMessage.query.filter_by(user_id=user_id).delete()
-        logger.debug(f"Deleted chat messages for user: {user_id}")
+        def sensay_deletion_ok():
+            """False once the Sensay deletion has failed (a missing Sensay user counts as deleted)."""
+            if not sensay_deletion.done():
+                return True
+            error = sensay_deletion.exception()
+            return error is None or (isinstance(error, SensayAPIError) and error.status_code == 404)
         
-        # Delete goals and related data (cascade should handle this, but let's be explicit)
-        goals = Goal.query.filter_by(user_id=user_id).all()
-        for goal in goals:
-            # Delete reflections
-            Reflection.query.filter_by(goal_id=goal.id).delete()
-            # Delete progress updates
-            ProgressUpdate.query.filter_by(goal_id=goal.id).delete()
-            # Delete milestones
-            Milestone.query.filter_by(goal_id=goal.id).delete()
-        
-        # Delete goals
-        Goal.query.filter_by(user_id=user_id).delete()
-        logger.debug(f"Deleted goals and related data for user: {user_id}")
+        # Delete goals, chat history and queued updates in short chunked transactions,
+        # stopping before the next chunk if the Sensay deletion fails
+        try:
+            deleted = delete_user_data(user.id, keep_going=sensay_deletion_ok)
+            logger.debug(f"Deleted local data for user {user_id}: {deleted}")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Database error during user deletion: {str(e)}", exc_info=True)
+            return jsonify({'error': f'Failed to delete user from database: {str(e)}'}), 500
         
-        # Delete user preferences
-        UserPreference.query.filter_by(user_id=user_id).delete()
+        try:
+            sensay_deletion.result()
+            logger.info(f"Successfully deleted user from Sensay: {sensay_user_id}")
+        except Exception as e:
+            if isinstance(e, SensayAPIError) and e.status_code == 404:
+                # User doesn't exist in Sensay, continue with local deletion
+                logger.warning(f"User not found in Sensay (continuing with local deletion): {sensay_user_id}")
+            else:
+                logger.error(f"Failed to delete user from Sensay: {str(e)}", exc_info=not isinstance(e, SensayAPIError))
+                rebuild_user_stats([user.id])
+                # The account remains and the request can be retried; report what is already gone
+                return jsonify({
+                    'error': f'Failed to delete user from Sensay: {str(e)}',
+                    'account_deleted': False,
+                    'deleted': deleted
+                }), 500
+    
+    # Finally, delete the user with its preferences, replica state and stats
+    try:
+        UserPreference.query.filter_by(user_id=user.id).delete()
         logger.debug(f"Deleted user preferences for user: {user_id}")
         
-        # Finally, delete the user
         db.session.delete(user)
         
         db.session.commit()
-        logger.info(f"Successfully deleted user from local database: {user.username} (ID: {user_id})")
+        logger.info(f"Successfully deleted user from local database: {username} (ID: {user_id})")
         
         return jsonify({
             'message': 'User deleted successfully',
+            'account_deleted': True,
+            'deleted': deleted,
             'deleted_user': {
                 'id': user_id,
-                'username': user.username,
-                'sensay_user_id': user.sensay_user_id
+                'username': username,
+                'sensay_user_id': sensay_user_id
             }
         }), 200
         
@@ -1,16 +1,26 @@
 import os
 import logging
+import re
 import json
+import hashlib
 from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import desc
 
 from app import db
-from app.models import User, ChatMessage, Goal, Reflection, ProgressUpdate, Milestone, UserPreference
+from app.models import User, ChatMessage, Goal, UserPreference, ReplicaState
 from app.services.sensay import get_sensay_client, SensayAPIError
+from app.services.provisioning import wait_for_provisioning
 from app.prompts import STRATEGIST_SYSTEM_MESSAGE, STRATEGIST_GREETING, YODA_INSTRUCTION
-from app.knowledge_base import get_knowledge_base_entries
+from app.knowledge_base import get_knowledge_base_entries, get_knowledge_base_manifest_hash
+from app.goal_context import (
+    get_goal_context_entry, plan_goal_context, record_goal_context_sent, add_goal_context_sections,
+    is_goal_context_trimmed
+)
+from app.prompt_builder import PromptBuilder, record_prompt_report
+from app.actions import process_actions
+from app.read_replica import use_read_replica
 
 # Get logger
 logger = logging.getLogger('strategist.chat')
@@ -23,8 +33,12 @@ REPLICA_SLUG = os.environ.get('SENSAY_REPLICA_SLUG', 'navi_planning_assistant')
 # System update message prefix
 SYSTEM_UPDATE_PREFIX = "SYSTEM_UPDATE:"
 
+# Seconds a verified replica is trusted before it is checked against Sensay again
+REPLICA_VERIFY_TTL = int(os.environ.get('REPLICA_VERIFY_TTL', 3600))
+
 @chat_bp.route('/history', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_chat_history():
     """Get chat history for the current user."""
     user_id = get_jwt_identity()
@@ -41,8 +55,16 @@ def get_chat_history():
     offset = request.args.get('offset', 0, type=int)
     goal_id = request.args.get('goal_id', type=int)
     include_system = request.args.get('include_system', 'false').lower() == 'true'
+    before_id = request.args.get('before_id', type=int)
+    after_id = request.args.get('after_id', type=int)
+    # An empty before_id asks for the newest page in cursor mode
+    use_cursor = 'before_id' in request.args or 'after_id' in request.args
+    
+    if before_id is not None and after_id is not None:
+        return jsonify({'error': 'Use either before_id or after_id, not both'}), 400
     
-    logger.debug(f"Chat history query params - limit: {limit}, offset: {offset}, goal_id: {goal_id}, include_system: {include_system}")
+    logger.debug(f"Chat history query params - limit: {limit}, offset: {offset}, before_id: {before_id}, "
+                 f"after_id: {after_id}, goal_id: {goal_id}, include_system: {include_system}")
     
     # Build query
     query = ChatMessage.query.filter_by(user_id=user_id)
@@ -57,16 +79,50 @@ def get_chat_history():
         query = query.filter(ChatMessage.sender != 'system')
         logger.debug("Filtering out system messages from chat history")
     
-    # Count total matching messages for pagination info
-    total_messages = query.count()
-    
-    # Order by creation date (newest first), apply offset and limit
-    messages = query.order_by(desc(ChatMessage.created_at)).offset(offset).limit(limit).all()
-    
-    # Reverse to get chronological order
-    messages.reverse()
-    
-    logger.info(f"Retrieved {len(messages)} chat messages for user {user_id} (offset: {offset}, limit: {limit})")
+    if use_cursor:
+        # Keyset pagination on the message ID: one extra row tells whether there is
+        # another page, so neither the skipped rows nor the total are counted
+        limit = max(limit, 0)
+        if after_id is not None:
+            messages = query.filter(ChatMessage.id > after_id).order_by(ChatMessage.id).limit(limit + 1).all()
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+        else:
+            if before_id is not None:
+                query = query.filter(ChatMessage.id < before_id)
+            messages = query.order_by(desc(ChatMessage.id)).limit(limit + 1).all()
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            messages.reverse()
+        
+        logger.info(f"Retrieved {len(messages)} chat messages for user {user_id} "
+                    f"(before_id: {before_id}, after_id: {after_id}, limit: {limit})")
+        pagination = {
+            'limit': limit,
+            'has_more': has_more,
+            # Cursors for the next older and newer pages
+            'before_id': messages[0].id if messages else before_id,
+            'after_id': messages[-1].id if messages else after_id
+        }
+    else:
+        # Count total matching messages for pagination info
+        total_messages = query.count()
+        
+        # Order by creation date (newest first), apply offset and limit
+        messages = query.order_by(desc(ChatMessage.created_at)).offset(offset).limit(limit).all()
+        
+        # Reverse to get chronological order
+        messages.reverse()
+        
+        logger.info(f"Retrieved {len(messages)} chat messages for user {user_id} (offset: {offset}, limit: {limit})")
+        pagination = {
+            'total': total_messages,
+            'offset': offset,
+            'limit': limit,
+            'has_more': offset + len(messages) < total_messages,
+            'before_id': messages[0].id if messages else None,
+            'after_id': messages[-1].id if messages else None
+        }
     
     messages_data = []
     for message in messages:
@@ -81,12 +137,7 @@ def get_chat_history():
     # Include pagination info in response
     response = {
         'messages': messages_data,
-        'pagination': {
-            'total': total_messages,
-            'offset': offset,
-            'limit': limit,
-            'has_more': offset + len(messages) < total_messages
-        }
+        'pagination': pagination
     }
     
     return jsonify(response), 200
@@ -155,6 +206,9 @@ def send_message():
         logger.debug("Initializing Sensay client")
         sensay_client = get_sensay_client()
         
+        # Make sure registration-time provisioning has finished (or run it now)
+        wait_for_provisioning(user.id)
+        
         # Get or create the replica
         logger.debug(f"Ensuring replica exists for user: {user.sensay_user_id}")
         try:
@@ -164,14 +218,15 @@ def send_message():
             logger.error(f"Failed to get/create replica: {str(e)}", exc_info=True)
             return jsonify({'error': f'Failed to initialize AI replica: {str(e)}'}), 500
         
-        # Enhance message with goal context if related to a goal
-        content_to_send = data['content']
+        # Enhance message with goal context (or what changed in it) if related to a goal
+        goal_context_plans = []
         if related_goal_id:
-            goal_context = get_goal_context(goal)
-            content_to_send = f"{goal_context}\n\n{content_to_send}"
+            goal_context_plans.append(plan_goal_context(user.id, replica_id, goal))
+        content_to_send, sent_goal_context_plans, prompt_report = build_prompt(data['content'], goal_context_plans)
         
         # Send the message to Sensay
-        logger.info(f"Sending message to Sensay API, content length: {len(content_to_send)}")
+        logger.info(f"Sending message to Sensay API, content length: {len(content_to_send)}, "
+                    f"estimated tokens: {prompt_report['total_tokens']}")
         logger.debug(f"Sending message to Sensay API, content: {content_to_send}")
         try:
             response = sensay_client.create_chat_completion(
@@ -186,27 +241,33 @@ def send_message():
             logger.error(f"Sensay API error: {str(e)}")
             return jsonify({'error': f'AI response error: {str(e)}'}), 500
         
+        for plan in sent_goal_context_plans:
+            record_goal_context_sent(user.id, replica_id, plan)
+        
         # Get the AI response content
         ai_content = response.get('content', 'Sorry, I could not generate a response.')
         logger.debug(f"AI response length: {len(ai_content)}")
         
         # Process any actions in the AI response
-        action_result = None
+        action_results = []
         display_content = ai_content
         
-        # Extract and process any action JSON from the response
-        action_data = extract_action_json(ai_content)
-        if action_data:
-            logger.info(f"Extracted action from AI response: {action_data.get('action_type', 'unknown')}")
+        # Extract and process every action JSON in the response
+        actions = extract_actions(ai_content)
+        if actions:
+            logger.info(f"Extracted actions from AI response: {', '.join(str(action['data'].get('action_type')) for action in actions)}")
             
-            # Process the action
-            action_result, display_content = process_action(action_data, user_id, related_goal_id)
+            # All actions and the reply are committed together below
+            action_results, display_messages = process_actions(
+                [action['data'] for action in actions], user_id, related_goal_id, commit=False
+            )
             
-            # If we couldn't process the action, use the original content
-            if not display_content:
-                display_content = ai_content
+            # Prefer the actions' display messages, then the reply without its JSON
+            # If neither is left, use the original content
+            display_content = '\n\n'.join(display_messages) or strip_action_spans(ai_content, actions) or ai_content
         
         # Create the AI response message in the database (with the display version)
+        # This commit also stores the actions' changes
         ai_message = ChatMessage(
             user_id=user_id,
             sender='replica',
@@ -245,9 +306,10 @@ def send_message():
             }
         }
         
-        # Include action result if any
-        if action_result:
-            response_data['action_result'] = action_result
+        # Include action results if any (action_result holds the first for older clients)
+        if action_results:
+            response_data['action_result'] = action_results[0]
+            response_data['action_results'] = action_results
         
         return jsonify(response_data), 200
         
@@ -260,601 +322,103 @@ def send_message():
         return jsonify({'error': f'Failed to communicate with the AI replica: {str(e)}'}), 500
 
 def get_goal_context(goal):
-    """Generate context information about a goal for the AI."""
-    context = (
-        f"[GOAL CONTEXT]\n"
-        f"Goal ID: {goal.id}\n"
-        f"Title: {goal.title}\n"
-        f"Start date: {goal.start_date.strftime('%Y-%m-%d')}\n"
-        f"Target date: {goal.target_date.strftime('%Y-%m-%d')}\n"
-        f"Current progress: {goal.completion_status}%\n"
-        f"Status: {goal.status}\n"
-    )
-    
-    # Include milestones if available
-    if goal.milestones:
-        context += "\nMilestones:\n"
-        for milestone in goal.milestones:
-            context += f"- ID: {milestone.id}, Title: {milestone.title}, Due: {milestone.target_date.strftime('%Y-%m-%d')}, Status: {milestone.status}, Progress: {milestone.completion_status}%\n"
-    
-    # Include reflections if available
-    if goal.reflections:
-        context += "\nReflections:\n"
-        for reflection in goal.reflections:
-            context += f"- Type: {reflection.reflection_type}, Created: {reflection.created_at.strftime('%Y-%m-%d')}\n"
-    
-    # Include recent progress updates
-    progress_updates = ProgressUpdate.query.filter_by(goal_id=goal.id).order_by(desc(ProgressUpdate.created_at)).limit(3).all()
-    if progress_updates:
-        context += "\nRecent Progress Updates:\n"
-        for update in progress_updates:
-            # Add formatted update to context
-            note_text = "No notes"
-            if update.type == 'progress' and update.progress_notes:
-                note_text = update.progress_notes
-            elif update.type == 'effort' and update.effort_notes:
-                note_text = update.effort_notes
-                
-            context += f"- Date: {update.created_at.strftime('%Y-%m-%d')}, Progress: {update.progress_value}%, Notes: {note_text}\n"
-    
-    context += "\n[END GOAL CONTEXT]\n\n"
-    return context
+    """Generate the full context information about a goal for the AI."""
+    return get_goal_context_entry(goal)['text']
 
-def extract_action_json(ai_content):
-    """Extract action JSON data from AI response text."""
-    logger.debug("Checking for action data in AI response")
-    
-    # Try to find JSON in the response
-    json_start_markers = [
-        '```json',
-        '```',
-        '{',
-        'Here\'s the action:',
-        'Action:'
-    ]
+def build_prompt(content, goal_context_plans=None, content_section='message'):
+    """Put goal contexts in front of a message, within the prompt token budget.
     
-    json_end_markers = [
-        '```',
-        '}'
-    ]
+    Args:
+        content (str): The message itself, never trimmed
+        goal_context_plans (list, optional): Results of plan_goal_context()
+        content_section (str, optional): Section name of the message in the size report
     
-    # First try to find JSON blocks with markers
-    for start_marker in json_start_markers:
-        if start_marker in ai_content:
-            start_idx = ai_content.find(start_marker) + len(start_marker)
-            
-            # Find the end of JSON
-            end_idx = None
-            if start_marker != '{':  # If we have a distinct start marker
-                for end_marker in json_end_markers:
-                    if end_marker in ai_content[start_idx:]:
-                        marker_idx = ai_content[start_idx:].find(end_marker)
-                        if end_marker == '}':  # If the end marker is }, we need to include it
-                            marker_idx += 1
-                        end_idx = start_idx + marker_idx
-                        break
-            else:  # If start marker is {, we need to find the matching }
-                # Simple approach - find the last }
-                if '}' in ai_content[start_idx-1:]:
-                    end_idx = ai_content.rfind('}') + 1
-            
-            if end_idx:
-                json_str = ai_content[start_idx:end_idx].strip()
-                try:
-                    # Handle case where the JSON might not start immediately after the marker
-                    if not json_str.startswith('{'):
-                        json_start = json_str.find('{')
-                        if json_start >= 0:
-                            json_str = json_str[json_start:]
-                    
-                    data = json.loads(json_str)
-                    # Validate that it contains an action_type
-                    if 'action_type' in data:
-                        logger.debug(f"Successfully extracted action JSON: {json.dumps(data, indent=2)}")
-                        return data
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to parse extracted JSON: {str(e)}")
-                    continue  # Try next marker
+    Returns:
+        tuple: (prompt, plans whose goal context was sent untrimmed, size report)
+    """
+    builder = PromptBuilder()
+    plan_sections = [(plan, add_goal_context_sections(builder, plan)) for plan in goal_context_plans or []]
+    builder.add_section(content_section, content, required=True)
     
-    # If no JSON found with markers, try to find any valid JSON with action_type
-    try:
-        # Look for any text between { and }
-        start_idx = ai_content.find('{')
-        if start_idx >= 0:
-            end_idx = ai_content.rfind('}') + 1
-            if end_idx > start_idx:
-                json_str = ai_content[start_idx:end_idx]
-                data = json.loads(json_str)
-                if 'action_type' in data:
-                    logger.debug(f"Successfully extracted action JSON from full content: {json.dumps(data, indent=2)}")
-                    return data
-    except json.JSONDecodeError:
-        pass
+    prompt, report = builder.build()
+    record_prompt_report(report)
+    logger.debug(f"Prompt sections: {report['sections']}")
     
-    logger.debug("No action JSON found in AI response")
-    # Log a truncated version of the response for debugging
-    if len(ai_content) > 200:
-        logger.debug(f"Response content (truncated): {ai_content[:100]}...{ai_content[-100:]}")
-    else:
-        logger.debug(f"Response content: {ai_content}")
-    return None
+    # A trimmed context was not seen in full, so it must not become the replica's snapshot
+    sent_plans = [plan for plan, names in plan_sections if not is_goal_context_trimmed(report, names)]
+    return prompt, sent_plans, report
 
-def process_action(action_data, user_id, related_goal_id=None):
-    """Process the action requested by the AI and return the result."""
-    action_type = action_data.get('action_type')
-    data = action_data.get('data', {})
-    
-    # Add detailed logging of the action JSON
-    logger.info(f"Processing action: {action_type}")
-    logger.debug(f"Full action JSON data: {json.dumps(action_data, indent=2)}")
-    logger.debug(f"User ID: {user_id}, Related Goal ID: {related_goal_id}")
-    
-    # Strip the JSON part from the display message
-    display_content = None
-    
-    if action_type == 'create_goal':
-        # Create a new goal
-        try:
-            logger.info("Creating new goal from AI action")
-            
-            # Format dates properly
-            if 'target_date' in data and data['target_date']:
-                try:
-                    datetime.fromisoformat(data['target_date'])
-                except ValueError:
-                    # Try to parse the date if it's not in ISO format
-                    from dateutil import parser
-                    try:
-                        parsed_date = parser.parse(data['target_date'])
-                        data['target_date'] = parsed_date.isoformat()
-                    except:
-                        # Default to 3 months from now if parsing fails
-                        data['target_date'] = (datetime.utcnow() + timedelta(days=90)).isoformat()
-            
-            # Process milestones
-            if 'milestones' in data and isinstance(data['milestones'], list):
-                for milestone in data['milestones']:
-                    if 'target_date' in milestone and milestone['target_date']:
-                        try:
-                            datetime.fromisoformat(milestone['target_date'])
-                        except ValueError:
-                            # Try to parse the date
-                            from dateutil import parser
-                            try:
-                                parsed_date = parser.parse(milestone['target_date'])
-                                milestone['target_date'] = parsed_date.isoformat()
-                            except:
-                                # Default to halfway to goal target
-                                goal_target = datetime.fromisoformat(data['target_date'])
-                                milestone['target_date'] = (datetime.utcnow() + (goal_target - datetime.utcnow()) / 2).isoformat()
-            
-            # Import here to avoid circular imports
-            from app.api.goals import create_goal_internal
-            
-            # Create the goal
-            goal = create_goal_internal(user_id, data)
-            
-            logger.info(f"Successfully created goal with ID: {goal['id']}")
-            
-            # Return the created goal and a user-friendly message
-            display_content = action_data.get('display_message', 'Great! I\'ve created your goal. You can now view and track it in your goals dashboard.')
-            
-            result = {
-                'action': 'create_goal',
-                'goal': goal
-            }
-            logger.debug(f"create_goal action completed successfully: {json.dumps({'goal_id': goal['id'], 'title': goal['title']})}")
-            return result, display_content
-            
-        except Exception as e:
-            logger.error(f"Failed to create goal: {str(e)}", exc_info=True)
-            return {
-                'action': 'create_goal',
-                'error': str(e)
-            }, None
-    
-    elif action_type == 'save_reflection':
-        # Save a reflection on a goal
-        try:
-            goal_id = data.get('goal_id') or related_goal_id
-            if not goal_id:
-                raise ValueError("Goal ID is required for saving a reflection")
-            
-            reflection_type = data.get('reflection_type')
-            if not reflection_type:
-                raise ValueError("Reflection type is required")
-            
-            content = data.get('content')
-            if not content:
-                raise ValueError("Reflection content is required")
-            
-            # Verify goal exists and belongs to user
-            goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
-            if not goal:
-                raise ValueError(f"Goal not found: {goal_id}")
-            
-            # Check if reflection type already exists
-            existing_reflection = Reflection.query.filter_by(
-                goal_id=goal_id, 
-                reflection_type=reflection_type
-            ).first()
-            
-            if existing_reflection:
-                # Update existing reflection
-                existing_reflection.content = content
-                existing_reflection.updated_at = datetime.utcnow()
-                reflection_id = existing_reflection.id
-                logger.info(f"Updated existing reflection ID: {reflection_id}")
-            else:
-                # Create new reflection
-                reflection = Reflection(
-                    goal_id=goal_id,
-                    reflection_type=reflection_type,
-                    content=content
-                )
-                db.session.add(reflection)
-                db.session.flush()  # To get the ID
-                reflection_id = reflection.id
-                logger.info(f"Created new reflection ID: {reflection_id}")
-            
-            db.session.commit()
-            
-            # Return the reflection info
-            display_content = action_data.get('display_message')
-            
-            result = {
-                'action': 'save_reflection',
-                'reflection': {
-                    'id': reflection_id,
-                    'goal_id': goal_id,
-                    'reflection_type': reflection_type
-                }
-            }
-            logger.debug(f"save_reflection action completed successfully: {json.dumps({'reflection_id': reflection_id, 'type': reflection_type})}")
-            return result, display_content
-            
-        except Exception as e:
-            logger.error(f"Failed to save reflection: {str(e)}", exc_info=True)
-            return {
-                'action': 'save_reflection',
-                'error': str(e)
-            }, None
-    
-    elif action_type == 'update_progress':
-        # Update progress on a goal
-        try:
-            goal_id = data.get('goal_id') or related_goal_id
-            if not goal_id:
-                raise ValueError("Goal ID is required for updating progress")
-            
-            progress_value = data.get('progress_value')
-            if progress_value is None:
-                raise ValueError("Progress value is required")
-            
-            notes = data.get('notes', '')
-            
-            # Get update type (default to 'progress' for backward compatibility)
-            update_type = data.get('type', 'progress')
-            if update_type not in ['progress', 'effort']:
-                raise ValueError("Invalid progress type. Must be 'progress' or 'effort'")
-            
-            # Verify goal exists and belongs to user
-            goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
-            if not goal:
-                raise ValueError(f"Goal not found: {goal_id}")
-            
-            # Create progress update
-            update = ProgressUpdate(
-                goal_id=goal_id,
-                progress_value=progress_value,
-                type=update_type,
-                notes=notes
-            )
-            
-            # Only update goal completion status when type is 'progress'
-            if update_type == 'progress':
-                # Update goal completion status
-                goal.completion_status = progress_value
-                
-                # If progress is 100%, mark goal as completed
-                if progress_value == 100 and goal.status == 'active':
-                    goal.status = 'completed'
-            
-            db.session.add(update)
-            db.session.commit()
-            
-            logger.info(f"Updated {update_type} for goal ID {goal_id} to {progress_value}")
-            
-            # Return the progress update info
-            display_content = action_data.get('display_message')
-            
-            result = {
-                'action': 'update_progress',
-                'progress_update': {
-                    'id': update.id,
-                    'goal_id': goal_id,
-                    'progress_value': progress_value,
-                    'type': update_type,
-                    'notes': notes
-                }
-            }
-            logger.debug(f"update_progress action completed successfully: {json.dumps({'goal_id': goal_id, 'type': update_type, 'progress_value': progress_value})}")
-            return result, display_content
-            
-        except Exception as e:
-            logger.error(f"Failed to update progress: {str(e)}", exc_info=True)
-            return {
-                'action': 'update_progress',
-                'error': str(e)
-            }, None
+_json_decoder = json.JSONDecoder()
+
+# Where a JSON object with at least one key can start
+_OBJECT_START = re.compile(r'\{\s*"')
+
+def _extend_to_code_fence(text, start, end):
+    """Widen an object's span to a surrounding ``` / ```json fence, if it wraps only the object."""
+    before = text[:start].rstrip()
+    for fence in ('```json', '```'):
+        if before.endswith(fence):
+            after_start = len(text) - len(text[end:].lstrip())
+            if text.startswith('```', after_start):
+                return len(before) - len(fence), after_start + 3
+            break
+    return start, end
+
+def extract_actions(ai_content):
+    """Find every top-level JSON object with an action_type in an AI response.
     
-    elif action_type == 'update_milestone':
-        # Update a milestone
-        try:
-            goal_id = data.get('goal_id') or related_goal_id
-            if not goal_id:
-                raise ValueError("Goal ID is required for updating a milestone")
-            
-            milestone_id = data.get('milestone_id')
-            if not milestone_id:
-                raise ValueError("Milestone ID is required")
-            
-            # Verify goal exists and belongs to user
-            goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
-            if not goal:
-                raise ValueError(f"Goal not found: {goal_id}")
-            
-            # Verify milestone exists and belongs to goal
-            milestone = Milestone.query.filter_by(id=milestone_id, goal_id=goal_id).first()
-            if not milestone:
-                raise ValueError(f"Milestone not found: {milestone_id}")
-            
-            # Update milestone fields
-            if 'status' in data:
-                valid_statuses = ['pending', 'completed', 'missed']
-                if data['status'] in valid_statuses:
-                    milestone.status = data['status']
-                else:
-                    raise ValueError(f"Invalid status: {data['status']}. Must be one of: {', '.join(valid_statuses)}")
-            
-            if 'completion_status' in data:
-                try:
-                    completion_status = float(data['completion_status'])
-                    if 0 <= completion_status <= 100:
-                        milestone.completion_status = completion_status
-                    else:
-                        raise ValueError("Completion status must be between 0 and 100")
-                except (ValueError, TypeError):
-                    raise ValueError("Invalid completion_status format. Must be a number between 0 and 100")
-            
-            db.session.commit()
-            
-            logger.info(f"Updated milestone ID {milestone_id} for goal ID {goal_id}")
-            
-            # Return the milestone info
-            display_content = action_data.get('display_message')
-            
-            result = {
-                'action': 'update_milestone',
-                'milestone': {
-                    'id': milestone.id,
-                    'goal_id': goal_id,
-                    'status': milestone.status,
-                    'completion_status': milestone.completion_status
-                }
-            }
-            logger.debug(f"update_milestone action completed successfully: {json.dumps({'goal_id': goal_id, 'milestone_id': milestone.id, 'status': milestone.status})}")
-            return result, display_content
-            
-        except Exception as e:
-            logger.error(f"Failed to update milestone: {str(e)}", exc_info=True)
-            return {
-                'action': 'update_milestone',
-                'error': str(e)
-            }, None
+    Walks the text once from one possible object start ('{' followed by a
+    quoted key) to the next, decoding each candidate in place with the C
+    JSON scanner, which handles braces and quotes inside strings. A decoded
+    object is skipped as a whole, so nested objects are never parsed again;
+    braces in prose such as "{goal}" are not candidates at all, and a
+    candidate that is not valid JSON fails at its first bad character.
     
-    elif action_type == 'save_reflections':
-        # Save multiple reflections on a goal
-        try:
-            goal_id = data.get('goal_id') or related_goal_id
-            if not goal_id:
-                raise ValueError("Goal ID is required for saving reflections")
-            
-            reflections = data.get('reflections', [])
-            if not reflections or not isinstance(reflections, list):
-                raise ValueError("Reflections data is required and must be a list")
-            
-            # Verify goal exists and belongs to user
-            goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
-            if not goal:
-                raise ValueError(f"Goal not found: {goal_id}")
-            
-            saved_reflections = []
-            
-            # Process each reflection
-            for reflection_data in reflections:
-                reflection_type = reflection_data.get('type')
-                content = reflection_data.get('content')
-                
-                if not reflection_type or not content:
-                    logger.warning(f"Skipping reflection with missing type or content: {reflection_data}")
-                    continue
-                
-                # Check if reflection type already exists
-                existing_reflection = Reflection.query.filter_by(
-                    goal_id=goal_id, 
-                    reflection_type=reflection_type
-                ).first()
-                
-                if existing_reflection:
-                    # Update existing reflection
-                    existing_reflection.content = content
-                    existing_reflection.updated_at = datetime.utcnow()
-                    reflection_id = existing_reflection.id
-                    logger.info(f"Updated existing reflection ID: {reflection_id}")
-                else:
-                    # Create new reflection
-                    reflection = Reflection(
-                        goal_id=goal_id,
-                        reflection_type=reflection_type,
-                        content=content
-                    )
-                    db.session.add(reflection)
-                    db.session.flush()  # To get the ID
-                    reflection_id = reflection.id
-                    logger.info(f"Created new reflection ID: {reflection_id}")
-                
-                saved_reflections.append({
-                    'id': reflection_id,
-                    'goal_id': goal_id,
-                    'reflection_type': reflection_type
-                })
-            
-            db.session.commit()
-            
-            # Return the reflections info
-            display_content = action_data.get('display_message')
-            
-            result = {
-                'action': 'save_reflections',
-                'reflections': saved_reflections
-            }
-            logger.debug(f"save_reflections action completed successfully: {json.dumps({'goal_id': goal_id, 'reflection_count': len(saved_reflections)})}")
-            return result, display_content
-            
-        except Exception as e:
-            logger.error(f"Failed to save reflections: {str(e)}", exc_info=True)
-            return {
-                'action': 'save_reflections',
-                'error': str(e)
-            }, None
+    Args:
+        ai_content (str): AI response text
     
-    elif action_type == 'update_goal':
-        # Update an existing goal
+    Returns:
+        list: One dict per action, in order of appearance, with the parsed
+              'data' and the 'start'/'end' span of the object in ai_content
+              (widened to a ```json fence that wraps only the object)
+    """
+    actions = []
+    match = _OBJECT_START.search(ai_content)
+    while match:
+        position = match.start()
         try:
-            goal_id = data.get('goal_id') or related_goal_id
-            if not goal_id:
-                raise ValueError("Goal ID is required for updating a goal")
-            
-            # Verify goal exists and belongs to user
-            goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
-            if not goal:
-                raise ValueError(f"Goal not found: {goal_id}")
-            
-            # Track changes
-            changes = []
-            
-            # Update title if provided
-            if 'title' in data and data['title'] != goal.title:
-                old_title = goal.title
-                goal.title = data['title']
-                changes.append(f"title from '{old_title}' to '{goal.title}'")
-            
-            # Update target_date if provided
-            if 'target_date' in data:
-                try:
-                    new_target_date = datetime.fromisoformat(data['target_date'])
-                    if new_target_date != goal.target_date:
-                        goal.target_date = new_target_date
-                        changes.append(f"target date to {goal.target_date.strftime('%Y-%m-%d')}")
-                except ValueError:
-                    raise ValueError("Invalid target_date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)")
-            
-            # Update status if provided
-            if 'status' in data and data['status'] != goal.status:
-                valid_statuses = ['active', 'completed', 'abandoned', 'deferred']
-                if data['status'] in valid_statuses:
-                    old_status = goal.status
-                    goal.status = data['status']
-                    changes.append(f"status from '{old_status}' to '{goal.status}'")
-                else:
-                    raise ValueError(f"Invalid status: {data['status']}. Must be one of: {', '.join(valid_statuses)}")
-            
-            # Update reflections if provided
-            if 'reflections' in data and isinstance(data['reflections'], dict):
-                for reflection_type, content in data['reflections'].items():
-                    if not content:
-                        continue
-                        
-                    # Find existing reflection of this type
-                    reflection = Reflection.query.filter_by(
-                        goal_id=goal_id, 
-                        reflection_type=reflection_type
-                    ).first()
-                    
-                    if reflection:
-                        # Update existing reflection if content changed
-                        if reflection.content != content:
-                            reflection.content = content
-                            reflection.updated_at = datetime.utcnow()
-                            changes.append(f"reflection on '{reflection_type}'")
-                    else:
-                        # Create new reflection
-                        reflection = Reflection(
-                            goal_id=goal_id,
-                            reflection_type=reflection_type,
-                            content=content
-                        )
-                        db.session.add(reflection)
-                        changes.append(f"added new reflection on '{reflection_type}'")
-            
-            db.session.commit()
-            
-            logger.info(f"Updated goal ID {goal_id}: {', '.join(changes)}")
-            
-            # Get updated goal data for response
-            # Get milestone data
-            milestones_data = []
-            for milestone in goal.milestones:
-                milestones_data.append({
-                    'id': milestone.id,
-                    'title': milestone.title,
-                    'target_date': milestone.target_date.isoformat(),
-                    'completion_status': milestone.completion_status,
-                    'status': milestone.status
-                })
-            
-            # Get reflection data
-            reflections_data = {}
-            for reflection in goal.reflections:
-                reflections_data[reflection.reflection_type] = {
-                    'id': reflection.id,
-                    'content': reflection.content,
-                    'created_at': reflection.created_at.isoformat(),
-                    'updated_at': reflection.updated_at.isoformat()
-                }
-            
-            # Return the goal info
-            display_content = action_data.get('display_message')
-            
-            result = {
-                'action': 'update_goal',
-                'goal': {
-                    'id': goal.id,
-                    'title': goal.title,
-                    'start_date': goal.start_date.isoformat(),
-                    'target_date': goal.target_date.isoformat(),
-                    'completion_status': goal.completion_status,
-                    'status': goal.status,
-                    'milestones': milestones_data,
-                    'reflections': reflections_data,
-                    'updated_at': goal.updated_at.isoformat()
-                }
-            }
-            logger.debug(f"update_goal action completed successfully: {json.dumps({'goal_id': goal.id, 'title': goal.title, 'changes': changes})}")
-            return result, display_content
-            
-        except Exception as e:
-            logger.error(f"Failed to update goal: {str(e)}", exc_info=True)
-            return {
-                'action': 'update_goal',
-                'error': str(e)
-            }, None
-    
-    else:
-        logger.warning(f"Unknown action type: {action_type}")
-        logger.debug(f"Unknown action JSON: {json.dumps(action_data)}")
-        return None, None
+            data, end = _json_decoder.raw_decode(ai_content, position)
+        except json.JSONDecodeError:
+            match = _OBJECT_START.search(ai_content, position + 1)
+            continue
+        
+        if isinstance(data, dict) and 'action_type' in data:
+            start, stop = _extend_to_code_fence(ai_content, position, end)
+            actions.append({'data': data, 'start': start, 'end': stop})
+        match = _OBJECT_START.search(ai_content, end)
+    
+    logger.debug(f"Found {len(actions)} action(s) in AI response")
+    return actions
+
+def strip_action_spans(ai_content, actions):
+    """Remove the spans of extracted actions from an AI response."""
+    parts = []
+    position = 0
+    for action in actions:
+        parts.append(ai_content[position:action['start']])
+        position = action['end']
+    parts.append(ai_content[position:])
+    
+    # Collapse the blank lines left where the JSON was
+    return re.sub(r'\n{3,}', '\n\n', ''.join(parts)).strip()
+
+def extract_action_json(ai_content):
+    """Extract the first action JSON from AI response text, or None."""
+    actions = extract_actions(ai_content)
+    if not actions:
+        logger.debug("No action JSON found in AI response")
+        return None
+    return actions[0]['data']
 
 def ensure_replica_exists(sensay_client, sensay_user_id):
     """Ensure the planning assistant replica exists for the user.
@@ -864,6 +428,11 @@ def ensure_replica_exists(sensay_client, sensay_user_id):
     2. If they do, return that replica ID
     3. If they don't, create a new replica and store its ID
     4. Train the replica with knowledge base entries
+    
+    Once a replica has been verified, its system message and knowledge base
+    hashes are stored in ReplicaState. Later calls return straight away
+    without contacting Sensay until either hash changes or REPLICA_VERIFY_TTL
+    expires.
     """
     from datetime import datetime
     
@@ -891,7 +460,14 @@ def ensure_replica_exists(sensay_client, sensay_user_id):
             # Instead of using a separate system message, append the Yoda instruction
             system_message = YODA_INSTRUCTION + STRATEGIST_SYSTEM_MESSAGE
             logger.info(f"Using Yoda mode for user: {user.id}")
-            
+        
+        # Skip remote verification if this configuration was verified recently
+        system_message_hash = hash_system_message(system_message)
+        kb_manifest_hash = get_knowledge_base_manifest_hash()
+        replica_state = ReplicaState.query.filter_by(user_id=user.id).first()
+        if is_replica_state_current(replica_state, user.replica_id, system_message_hash, kb_manifest_hash):
+            logger.debug(f"Replica {user.replica_id} verified at {replica_state.verified_at}, skipping remote checks")
+            return user.replica_id
             
         # Check if the user already has a replica_id stored
         if hasattr(user, 'replica_id') and user.replica_id:
@@ -948,6 +524,7 @@ def ensure_replica_exists(sensay_client, sensay_user_id):
                     logger.warning(f"Error checking knowledge base entries, will attempt to train replica: {str(e)}")
                     train_replica_with_knowledge_base(sensay_client, sensay_user_id, user.replica_id)
                 
+                record_replica_verified(user, user.replica_id, system_message_hash, kb_manifest_hash)
                 return user.replica_id
             except Exception as e:
                 logger.warning(f"Stored replica ID {user.replica_id} not found in Sensay: {str(e)}")
@@ -1004,7 +581,8 @@ def ensure_replica_exists(sensay_client, sensay_user_id):
                 except Exception as e:
                     db.session.rollback()
                     logger.error(f"Failed to update user with replica ID: {str(e)}")
-                    
+            
+            record_replica_verified(user, replica_id, system_message_hash, kb_manifest_hash)
             return replica_id
         
         # No replica found, create one with a static slug
@@ -1043,6 +621,7 @@ def ensure_replica_exists(sensay_client, sensay_user_id):
                 db.session.rollback()
                 logger.error(f"Failed to update user with new replica ID: {str(e)}")
         
+        record_replica_verified(user, replica_id, system_message_hash, kb_manifest_hash)
         return replica_id
         
     except Exception as e:
@@ -1050,6 +629,42 @@ def ensure_replica_exists(sensay_client, sensay_user_id):
         current_app.logger.error(f"Error ensuring replica exists: {str(e)}")
         raise
 
+def hash_system_message(system_message):
+    """Hash a system message, ignoring whitespace and formatting differences."""
+    normalized = ' '.join(system_message.split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def is_replica_state_current(replica_state, replica_id, system_message_hash, kb_manifest_hash):
+    """Check whether a stored verification still covers the replica's configuration."""
+    if not replica_state or not replica_id:
+        return False
+    if replica_state.replica_id != replica_id:
+        return False
+    if replica_state.system_message_hash != system_message_hash:
+        return False
+    if replica_state.kb_manifest_hash != kb_manifest_hash:
+        return False
+    return datetime.utcnow() - replica_state.verified_at < timedelta(seconds=REPLICA_VERIFY_TTL)
+
+def record_replica_verified(user, replica_id, system_message_hash, kb_manifest_hash):
+    """Persist that the user's replica was just verified against Sensay."""
+    replica_state = ReplicaState.query.filter_by(user_id=user.id).first()
+    if not replica_state:
+        replica_state = ReplicaState(user_id=user.id)
+        db.session.add(replica_state)
+    
+    replica_state.replica_id = replica_id
+    replica_state.system_message_hash = system_message_hash
+    replica_state.kb_manifest_hash = kb_manifest_hash
+    replica_state.verified_at = datetime.utcnow()
+    
+    try:
+        db.session.commit()
+        logger.debug(f"Recorded verified state for replica: {replica_id}")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failed to record replica state: {str(e)}")
+
 def train_replica_with_knowledge_base(sensay_client, sensay_user_id, replica_id):
     """Train a replica with predefined knowledge base entries.
     
@@ -1080,7 +695,7 @@ def train_replica_with_knowledge_base(sensay_client, sensay_user_id, replica_id)
         return False
 
 # Function to send system updates about UI changes to the replica
-def send_system_update(user_id, update_message, related_goal_id=None, save_message=True):
+def send_system_update(user_id, update_message, related_goal_id=None, save_message=True, context_goal_ids=None):
     """
     Send a system update message to the replica when the user makes changes through the UI.
     
@@ -1090,6 +705,8 @@ def send_system_update(user_id, update_message, related_goal_id=None, save_messa
         related_goal_id (int, optional): The ID of the related goal if applicable
         save_message (bool, optional): Whether to save the system message in chat history
                                       (default is True, but some updates may not need to be saved)
+        context_goal_ids (list, optional): IDs of the goals to include as context, for updates
+                                           covering several goals (defaults to related_goal_id)
     
     Returns:
         dict: The replica's response or None if an error occurred
@@ -1135,6 +752,9 @@ def send_system_update(user_id, update_message, related_goal_id=None, save_messa
         # Initialize Sensay client
         sensay_client = get_sensay_client()
         
+        # Make sure registration-time provisioning has finished (or run it now)
+        wait_for_provisioning(user.id)
+        
         # Get or create the replica
         try:
             replica_id = ensure_replica_exists(sensay_client, user.sensay_user_id)
@@ -1144,12 +764,15 @@ def send_system_update(user_id, update_message, related_goal_id=None, save_messa
             return None
         
         # Enhance message with goal context if related to a goal
-        content_to_send = system_message
-        if related_goal_id:
-            goal = Goal.query.get(related_goal_id)
-            if goal:
-                goal_context = get_goal_context(goal)
-                content_to_send = f"{goal_context}\n\n{content_to_send}"
+        if context_goal_ids is None:
+            context_goal_ids = [related_goal_id] if related_goal_id else []
+        goal_context_plans = []
+        if context_goal_ids:
+            goals = Goal.query.filter(Goal.id.in_(context_goal_ids), Goal.user_id == user.id).all()
+            goals.sort(key=lambda goal: context_goal_ids.index(goal.id))
+            goal_context_plans = [plan_goal_context(user.id, replica_id, goal) for goal in goals]
+        content_to_send, sent_goal_context_plans, prompt_report = build_prompt(system_message, goal_context_plans,
+                                                                               content_section='system_update')
         
         # Send the system update to Sensay
         logger.info(f"Sending system update to Sensay API, content: {content_to_send}")
@@ -1166,6 +789,9 @@ def send_system_update(user_id, update_message, related_goal_id=None, save_messa
             logger.error(f"Sensay API error: {str(e)}")
             return None
         
+        for plan in sent_goal_context_plans:
+            record_goal_context_sent(user.id, replica_id, plan)
+        
         # Get the AI response content
         ai_content = response.get('content', 'Noted the update.')
         logger.debug(f"AI response to system update: {ai_content}")
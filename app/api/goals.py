@@ -2,11 +2,15 @@ from datetime import datetime
 import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import desc
+from sqlalchemy import desc, func
+from sqlalchemy.orm import selectinload
 
 from app import db
 from app.models import Goal, Milestone, User, Reflection, ProgressUpdate
 from app.services.sensay import get_sensay_client
+from app.services.outbox import enqueue_system_update
+from app.goal_context import forget_goal_context
+from app.read_replica import use_read_replica
 
 # Get logger
 logger = logging.getLogger('strategist.goals')
@@ -15,6 +19,7 @@ goals_bp = Blueprint('goals', __name__)
 
 @goals_bp.route('/', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_goals():
     """Get all goals for the current user."""
     user_id = get_jwt_identity()
@@ -45,13 +50,31 @@ def get_goals():
             query = query.filter_by(parent_goal_id=parent_id)
             logger.debug(f"Filtering subgoals of parent: {parent_id}")
     
+    # Count progress updates and subgoals per goal with one grouped subquery each
+    goal_ids = query.with_entities(Goal.id)
+    progress_counts = (db.session.query(ProgressUpdate.goal_id, func.count(ProgressUpdate.id).label('count'))
+                       .filter(ProgressUpdate.goal_id.in_(goal_ids))
+                       .group_by(ProgressUpdate.goal_id)
+                       .subquery())
+    subgoal_counts = (db.session.query(Goal.parent_goal_id, func.count(Goal.id).label('count'))
+                      .filter(Goal.parent_goal_id.in_(goal_ids))
+                      .group_by(Goal.parent_goal_id)
+                      .subquery())
+    
     # Order by creation date (newest first)
-    goals = query.order_by(desc(Goal.created_at)).all()
-    logger.info(f"Retrieved {len(goals)} goals for user {user_id}")
+    # Milestones and reflections are loaded for all goals at once
+    rows = (query
+            .outerjoin(progress_counts, progress_counts.c.goal_id == Goal.id)
+            .outerjoin(subgoal_counts, subgoal_counts.c.parent_goal_id == Goal.id)
+            .add_columns(func.coalesce(progress_counts.c.count, 0), func.coalesce(subgoal_counts.c.count, 0))
+            .options(selectinload(Goal.milestones), selectinload(Goal.reflections))
+            .order_by(desc(Goal.created_at))
+            .all())
+    logger.info(f"Retrieved {len(rows)} goals for user {user_id}")
     
     # Format response
     goals_data = []
-    for goal in goals:
+    for goal, progress_updates_count, subgoals_count in rows:
         # Get milestones
         milestones_data = []
         for milestone in goal.milestones:
@@ -73,12 +96,6 @@ def get_goals():
                 'created_at': reflection.created_at.isoformat()
             }
         
-        # Calculate progress updates count
-        progress_updates_count = len(goal.progress_updates)
-        
-        # Calculate subgoals count
-        subgoals_count = Goal.query.filter_by(parent_goal_id=goal.id).count()
-        
         goals_data.append({
             'id': goal.id,
             'title': goal.title,
@@ -99,56 +116,52 @@ def get_goals():
 
 @goals_bp.route('/<int:goal_id>', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_goal(goal_id):
     """Get a specific goal with detailed information."""
     user_id = get_jwt_identity()
     logger.info(f"Getting goal details for ID: {goal_id}, user ID: {user_id}")
     
-    goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
+    # Fetch the goal together with its subgoals
+    goal = None
+    subgoals = []
+    for row in (Goal.query
+                .filter(Goal.user_id == user_id, db.or_(Goal.id == goal_id, Goal.parent_goal_id == goal_id))
+                .order_by(Goal.id)
+                .all()):
+        if row.id == goal_id:
+            goal = row
+        else:
+            subgoals.append({
+                'id': row.id,
+                'title': row.title,
+                'completion_status': row.completion_status,
+                'status': row.status
+            })
+    
     if not goal:
         logger.warning(f"Goal not found: {goal_id} for user: {user_id}")
         return jsonify({'error': 'Goal not found'}), 404
     
     logger.debug(f"Found goal: {goal.title}, status: {goal.status}")
     
-    # Get progress updates
+    # Get all progress updates in one query and split them by milestone (newest first)
     progress_updates = []
-    for update in ProgressUpdate.query.filter_by(goal_id=goal_id, milestone_id=None).order_by(desc(ProgressUpdate.created_at)).all():
-        progress_updates.append(update.to_dict())
+    milestone_updates = {}
+    for update in ProgressUpdate.query.filter_by(goal_id=goal_id).order_by(desc(ProgressUpdate.created_at)).all():
+        if update.milestone_id is None:
+            progress_updates.append(update.to_dict())
+        else:
+            milestone_updates.setdefault(update.milestone_id, []).append(update.to_dict())
     
     # Get milestones
     milestones_data = []
     for milestone in goal.milestones:
-        # Get real milestone progress updates
-        milestone_progress = []
-        for update in ProgressUpdate.query.filter_by(goal_id=goal_id, milestone_id=milestone.id).order_by(desc(ProgressUpdate.created_at)).all():
-            milestone_progress.append(update.to_dict())
+        created_at = milestone.created_at.isoformat()
+        updated_at = milestone.updated_at.isoformat()
         
-        # If no real updates exist, add simulated ones
-        if not milestone_progress:
-            # Initial progress entry at creation time
-            milestone_progress.append({
-                'id': -1,  # Simulated ID
-                'goal_id': goal_id,
-                'milestone_id': milestone.id,
-                'progress_value': 0,  # Initial progress
-                'type': 'progress',  # Add default type for milestone progress
-                'progress_notes': "Milestone created",
-                'created_at': milestone.created_at.isoformat()
-            })
-            
-            # Add an entry for status changes if milestone is not pending
-            if milestone.status != 'pending':
-                progress_value = 100 if milestone.status == 'completed' else milestone.completion_status
-                milestone_progress.append({
-                    'id': -2,  # Simulated ID
-                    'goal_id': goal_id,
-                    'milestone_id': milestone.id,
-                    'progress_value': progress_value,
-                    'type': 'progress',  # Add default type for milestone progress
-                    'progress_notes': f"Status changed to {milestone.status}",
-                    'created_at': milestone.updated_at.isoformat()
-                })
+        # Use the real milestone progress updates, or simulated ones if there are none
+        milestone_progress = milestone_updates.get(milestone.id) or simulate_milestone_progress(goal_id, milestone, created_at, updated_at)
         
         milestones_data.append({
             'id': milestone.id,
@@ -156,8 +169,8 @@ def get_goal(goal_id):
             'target_date': milestone.target_date.isoformat(),
             'completion_status': milestone.completion_status,
             'status': milestone.status,
-            'created_at': milestone.created_at.isoformat(),
-            'updated_at': milestone.updated_at.isoformat(),
+            'created_at': created_at,
+            'updated_at': updated_at,
             'progress_updates': milestone_progress
         })
     
@@ -171,16 +184,6 @@ def get_goal(goal_id):
             'updated_at': reflection.updated_at.isoformat()
         }
     
-    # Get subgoals
-    subgoals = []
-    for subgoal in Goal.query.filter_by(parent_goal_id=goal.id).all():
-        subgoals.append({
-            'id': subgoal.id,
-            'title': subgoal.title,
-            'completion_status': subgoal.completion_status,
-            'status': subgoal.status
-        })
-    
     # Assemble the full goal data
     goal_data = {
         'id': goal.id,
@@ -200,6 +203,42 @@ def get_goal(goal_id):
     
     return jsonify({'goal': goal_data}), 200
 
+def simulate_milestone_progress(goal_id, milestone, created_at, updated_at):
+    """Build progress entries for a milestone that has no real progress updates.
+    
+    Args:
+        goal_id: ID of the milestone's goal
+        milestone: The milestone
+        created_at: Milestone creation time, ISO formatted
+        updated_at: Milestone update time, ISO formatted
+    
+    Returns:
+        List with a creation entry and, unless the milestone is pending, a status change entry
+    """
+    entries = [{
+        'id': -1,  # Simulated ID
+        'goal_id': goal_id,
+        'milestone_id': milestone.id,
+        'progress_value': 0,  # Initial progress
+        'type': 'progress',  # Add default type for milestone progress
+        'progress_notes': "Milestone created",
+        'created_at': created_at
+    }]
+    
+    # Add an entry for status changes if milestone is not pending
+    if milestone.status != 'pending':
+        entries.append({
+            'id': -2,  # Simulated ID
+            'goal_id': goal_id,
+            'milestone_id': milestone.id,
+            'progress_value': 100 if milestone.status == 'completed' else milestone.completion_status,
+            'type': 'progress',  # Add default type for milestone progress
+            'progress_notes': f"Status changed to {milestone.status}",
+            'created_at': updated_at
+        })
+    
+    return entries
+
 @goals_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_goal():
@@ -224,8 +263,19 @@ def create_goal():
         logger.error(f"Error creating goal: {str(e)}", exc_info=True)
         return jsonify({'error': f'Failed to create goal: {str(e)}'}), 500
 
-def create_goal_internal(user_id, data):
-    """Create a new goal (internal function, can be called by other modules)."""
+def _as_datetime(value):
+    """Return a datetime for an ISO string, or the value itself if already parsed."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+def create_goal_internal(user_id, data, commit=True):
+    """Create a new goal (internal function, can be called by other modules).
+    
+    The goal, its milestones, reflections and initial progress updates are
+    written in a single transaction: one flush for the goal tree and one bulk
+    insert for the progress updates. With commit=True that transaction is
+    committed once at the end; with commit=False it is left open in the
+    caller's transaction.
+    """
     logger.info(f"Creating goal internally for user ID: {user_id}")
     
     # Validate required fields
@@ -237,8 +287,8 @@ def create_goal_internal(user_id, data):
     
     # Parse dates
     try:
-        start_date = datetime.fromisoformat(data.get('start_date', datetime.now().isoformat()))
-        target_date = datetime.fromisoformat(data['target_date'])
+        start_date = _as_datetime(data.get('start_date', datetime.now()))
+        target_date = _as_datetime(data['target_date'])
         logger.debug(f"Parsed dates - start: {start_date}, target: {target_date}")
     except ValueError:
         logger.warning("Invalid date format")
@@ -253,38 +303,10 @@ def create_goal_internal(user_id, data):
         status=data.get('status', 'active'),
         parent_goal_id=data.get('parent_goal_id')
     )
-    
     db.session.add(goal)
-    db.session.commit()
-    logger.debug(f"Goal created with ID: {goal.id}")
-    
-    # Create initial zero progress and effort updates
-    from app.models import ProgressUpdate
-    
-    # Initial progress update (0%)
-    initial_progress = ProgressUpdate(
-        goal_id=goal.id,
-        progress_value=0.0,
-        type='progress',
-        progress_notes='Goal created'
-    )
-    db.session.add(initial_progress)
-    
-    # Initial effort update (0%)
-    initial_effort = ProgressUpdate(
-        goal_id=goal.id,
-        progress_value=0.0,
-        type='effort',
-        effort_notes='Goal created'
-    )
-    db.session.add(initial_effort)
-    
-    # Commit initial progress updates
-    db.session.commit()
-    logger.debug(f"Created initial progress and effort updates for goal {goal.id}")
     
     # Create milestones if provided
-    milestones_data = []
+    milestones = []
     if 'milestones' in data and isinstance(data['milestones'], list):
         logger.debug(f"Processing {len(data['milestones'])} milestones")
         for milestone_data in data['milestones']:
@@ -293,52 +315,19 @@ def create_goal_internal(user_id, data):
                 continue
                 
             try:
-                milestone_target_date = datetime.fromisoformat(milestone_data['target_date'])
+                milestone_target_date = _as_datetime(milestone_data['target_date'])
             except ValueError:
                 logger.warning(f"Skipping milestone with invalid target date: {milestone_data['target_date']}")
                 continue
                 
             milestone = Milestone(
-                goal_id=goal.id,
                 title=milestone_data['title'],
                 target_date=milestone_target_date
             )
-            
-            db.session.add(milestone)
-            db.session.commit()  # Commit to get milestone ID
-            
-            # Create initial zero progress and effort updates for milestone
-            milestone_initial_progress = ProgressUpdate(
-                goal_id=goal.id,
-                milestone_id=milestone.id,
-                progress_value=0.0,
-                type='progress',
-                progress_notes='Milestone created'
-            )
-            db.session.add(milestone_initial_progress)
-            
-            milestone_initial_effort = ProgressUpdate(
-                goal_id=goal.id,
-                milestone_id=milestone.id,
-                progress_value=0.0,
-                type='effort',
-                effort_notes='Milestone created'
-            )
-            db.session.add(milestone_initial_effort)
-            db.session.commit()  # Commit milestone progress updates
-            logger.debug(f"Created initial progress and effort updates for milestone {milestone.id}")
-            
-            milestones_data.append({
-                'id': milestone.id,
-                'title': milestone.title,
-                'target_date': milestone.target_date.isoformat(),
-                'completion_status': milestone.completion_status,
-                'status': milestone.status
-            })
-            logger.debug(f"Milestone created: {milestone.title}")
+            goal.milestones.append(milestone)
+            milestones.append(milestone)
     
     # Create reflections if provided
-    reflections_data = {}
     if 'reflections' in data and isinstance(data['reflections'], dict):
         logger.debug(f"Processing {len(data['reflections'])} reflections")
         for reflection_type, content in data['reflections'].items():
@@ -346,16 +335,40 @@ def create_goal_internal(user_id, data):
                 logger.warning(f"Skipping empty reflection of type: {reflection_type}")
                 continue
                 
-            reflection = Reflection(
-                goal_id=goal.id,
+            goal.reflections.append(Reflection(
                 reflection_type=reflection_type,
                 content=content
-            )
-            
-            db.session.add(reflection)
+            ))
     
-    # Commit to ensure all objects have their timestamps set
-    db.session.commit()
+    # One flush assigns the IDs and timestamps of the goal, milestones and reflections
+    db.session.flush()
+    logger.debug(f"Goal created with ID: {goal.id}")
+    
+    # Initial zero progress and effort updates for the goal and each milestone, in one bulk insert
+    from app.models import ProgressUpdate
+    
+    initial_updates = [
+        {'goal_id': goal.id, 'progress_value': 0.0, 'type': 'progress', 'progress_notes': 'Goal created'},
+        {'goal_id': goal.id, 'progress_value': 0.0, 'type': 'effort', 'effort_notes': 'Goal created'}
+    ]
+    for milestone in milestones:
+        initial_updates.append({'goal_id': goal.id, 'milestone_id': milestone.id, 'progress_value': 0.0,
+                                'type': 'progress', 'progress_notes': 'Milestone created'})
+        initial_updates.append({'goal_id': goal.id, 'milestone_id': milestone.id, 'progress_value': 0.0,
+                                'type': 'effort', 'effort_notes': 'Milestone created'})
+    db.session.bulk_insert_mappings(ProgressUpdate, initial_updates)
+    logger.debug(f"Created initial progress and effort updates for goal {goal.id} and {len(milestones)} milestones")
+    
+    milestones_data = []
+    for milestone in milestones:
+        milestones_data.append({
+            'id': milestone.id,
+            'title': milestone.title,
+            'target_date': milestone.target_date.isoformat(),
+            'completion_status': milestone.completion_status,
+            'status': milestone.status
+        })
+        logger.debug(f"Milestone created: {milestone.title}")
     
     # Now build the reflections data for response
     reflections_data = {}
@@ -367,9 +380,8 @@ def create_goal_internal(user_id, data):
         }
         logger.debug(f"Reflection created: {reflection.reflection_type}")
     
-    logger.info(f"Goal creation completed - ID: {goal.id}, Title: {goal.title}")
-    
-    return {
+    # Built before committing, so the expired objects are not reloaded one by one
+    result = {
         'id': goal.id,
         'title': goal.title,
         'start_date': goal.start_date.isoformat(),
@@ -382,6 +394,13 @@ def create_goal_internal(user_id, data):
         'created_at': goal.created_at.isoformat(),
         'updated_at': goal.updated_at.isoformat()
     }
+    
+    if commit:
+        db.session.commit()
+    
+    logger.info(f"Goal creation completed - ID: {result['id']}, Title: {result['title']}")
+    
+    return result
 
 @goals_bp.route('/<int:goal_id>', methods=['PUT'])
 @jwt_required()
@@ -505,6 +524,18 @@ def update_goal(goal_id):
                 changes.append(f"added new reflection on '{reflection_type}'")
                 logger.debug(f"Created new reflection: {reflection_type}")
     
+    # Queue a system update for the replica in the same transaction if changes were made
+    if changes:
+        # Format the changes for the update message
+        if len(changes) == 1:
+            update_message = f"User updated {changes[0]} for goal '{goal.title}'"
+        else:
+            formatted_changes = ", ".join(changes[:-1]) + f" and {changes[-1]}"
+            update_message = f"User updated {formatted_changes} for goal '{goal.title}'"
+        
+        enqueue_system_update(user_id, update_message, goal.id)
+        logger.debug(f"System update queued for goal update: {goal.id}")
+    
     db.session.commit()
     logger.info(f"Goal updated successfully: {goal.id}")
     
@@ -537,22 +568,6 @@ def update_goal(goal_id):
     for update in ProgressUpdate.query.filter_by(goal_id=goal_id, milestone_id=None).order_by(desc(ProgressUpdate.created_at)).all():
         progress_updates.append(update.to_dict())
     
-    # Send system update to the replica if changes were made
-    if changes:
-        # Format the changes for the update message
-        if len(changes) == 1:
-            update_message = f"User updated {changes[0]} for goal '{goal.title}'"
-        else:
-            formatted_changes = ", ".join(changes[:-1]) + f" and {changes[-1]}"
-            update_message = f"User updated {formatted_changes} for goal '{goal.title}'"
-        
-        # Import here to avoid circular imports
-        from app.api.chat import send_system_update
-        
-        # Send the system update
-        system_update_result = send_system_update(user_id, update_message, goal.id)
-        logger.debug(f"System update sent for goal update: {goal.id}")
-    
     return jsonify({
         'message': 'Goal updated successfully',
         'goal': {
@@ -594,27 +609,23 @@ def delete_goal(goal_id):
         subgoal.parent_goal_id = None
     
     db.session.delete(goal)
+    forget_goal_context(goal.user_id, goal_id)
+    
+    # Queue a system update for the replica in the same transaction
+    # The goal row is gone, so the update is not linked to it
+    update_message = f"User deleted the goal '{goal_title}'"
+    enqueue_system_update(user_id, update_message)
+    
     db.session.commit()
     logger.info(f"Goal deleted successfully: {goal_id}")
     
-    # Send system update to the replica
-    try:
-        # Import here to avoid circular imports
-        from app.api.chat import send_system_update
-        
-        update_message = f"User deleted the goal '{goal_title}'"
-        system_update_result = send_system_update(user_id, update_message, goal_id)
-        logger.debug(f"System update sent for goal deletion: {goal_id}")
-    except Exception as e:
-        logger.error(f"Failed to send system update for goal deletion: {e}")
-        # Don't fail the deletion if system update fails
-    
     return jsonify({'message': 'Goal deleted successfully'}), 200
 
 # Milestone endpoints
 
 @goals_bp.route('/<int:goal_id>/milestones', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_milestones(goal_id):
     """Get all milestones for a specific goal."""
     user_id = get_jwt_identity()
@@ -784,9 +795,7 @@ def update_milestone(goal_id, milestone_id):
         else:
             return jsonify({'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}), 400
     
-    db.session.commit()
-    
-    # Send system update to the replica if changes were made
+    # Queue a system update for the replica in the same transaction if changes were made
     if changes:
         # Format the changes for the update message
         if len(changes) == 1:
@@ -795,12 +804,10 @@ def update_milestone(goal_id, milestone_id):
             formatted_changes = ", ".join(changes[:-1]) + f" and {changes[-1]}"
             update_message = f"User updated {formatted_changes} for milestone '{milestone.title}' in goal '{goal.title}'"
         
-        # Import here to avoid circular imports
-        from app.api.chat import send_system_update
-        
-        # Send the system update
-        system_update_result = send_system_update(user_id, update_message, goal.id)
-        logger.debug(f"System update sent for milestone update: {milestone.id}")
+        enqueue_system_update(user_id, update_message, goal.id)
+        logger.debug(f"System update queued for milestone update: {milestone.id}")
+    
+    db.session.commit()
     
     return jsonify({
         'message': 'Milestone updated successfully',
@@ -839,6 +846,7 @@ def delete_milestone(goal_id, milestone_id):
 
 @goals_bp.route('/<int:goal_id>/reflections', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_reflections(goal_id):
     """Get all reflections for a specific goal."""
     user_id = get_jwt_identity()
@@ -984,9 +992,8 @@ def create_milestone_progress(goal_id, milestone_id):
             milestone.status = 'completed'
     
     db.session.add(update)
-    db.session.commit()
     
-    # Send system update to the replica
+    # Queue a system update for the replica in the same transaction
     update_message = f"User updated {update_type} for milestone '{milestone.title}' in goal '{goal.title}' to {progress_value}%"
     
     # Add notes to message if present
@@ -995,11 +1002,12 @@ def create_milestone_progress(goal_id, milestone_id):
     elif update_type == 'effort' and update.effort_notes:
         update_message += f" with note: '{update.effort_notes}'"
     
-    # Import here to avoid circular imports
-    from app.api.chat import send_system_update
+    # Successive plain values (e.g. from a slider) supersede each other in a digest
+    has_notes = update.progress_notes or update.effort_notes
+    coalesce_key = None if has_notes else f"milestone:{milestone_id}:{update_type}"
     
-    # Send the system update
-    system_update_result = send_system_update(user_id, update_message, goal.id)
+    enqueue_system_update(user_id, update_message, goal.id, coalesce_key=coalesce_key)
+    db.session.commit()
     
     return jsonify({
         'message': f'Milestone {update_type} update created successfully',
@@ -1013,6 +1021,7 @@ def create_milestone_progress(goal_id, milestone_id):
 
 @goals_bp.route('/<int:goal_id>/milestones/<int:milestone_id>/progress', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_milestone_progress(goal_id, milestone_id):
     """Get all progress updates for a milestone."""
     user_id = get_jwt_identity()
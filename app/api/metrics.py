@@ -0,0 +1,37 @@
+import hmac
+import logging
+from flask import Blueprint, current_app, jsonify, request
+
+from app.metrics import metrics
+from app.services.sensay import get_circuit_breaker_states
+from app.services.outbox import get_outbox_stats
+
+# Get logger
+logger = logging.getLogger('strategist.metrics')
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/', methods=['GET'])
+def get_metrics():
+    """Get in-process metrics for the worker that serves the request.
+
+    The counters cover every user of the process, so they are only returned
+    to operators presenting METRICS_TOKEN in the X-Metrics-Token header. The
+    endpoint answers 404 when no token is configured.
+    """
+    expected = current_app.config.get('METRICS_TOKEN')
+    if not expected:
+        return jsonify({'error': 'Not found'}), 404
+
+    token = request.headers.get('X-Metrics-Token', '')
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        logger.warning("Metrics request with a missing or invalid token")
+        return jsonify({'error': 'Invalid metrics token'}), 403
+
+    logger.debug("Returning metrics snapshot")
+
+    snapshot = metrics.snapshot()
+    snapshot['sensay_circuit_breakers'] = get_circuit_breaker_states()
+    snapshot['system_update_outbox'] = get_outbox_stats()
+
+    return jsonify({'metrics': snapshot}), 200
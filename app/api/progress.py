@@ -1,15 +1,23 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import desc, and_, or_
+from sqlalchemy import desc, and_, or_, select, union_all, literal, null, cast
 
 from app import db
 from app.models import Goal, ProgressUpdate, User, Milestone, Reflection
+from app.services.outbox import enqueue_system_update
+from app.user_stats import get_user_stats, REVIEW_REFLECTION_TYPES
+from app.read_replica import use_read_replica
+from app.progress_series import (
+    bucketed_progress_series, downsampled_progress_series, BUCKET_INTERVALS,
+    PROGRESS_SERIES_DEFAULT_POINTS, PROGRESS_SERIES_MAX_POINTS
+)
 
 progress_bp = Blueprint('progress', __name__)
 
 @progress_bp.route('/goals/<int:goal_id>/updates', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_progress_updates(goal_id):
     """Get all progress updates for a specific goal."""
     user_id = get_jwt_identity()
@@ -95,9 +103,8 @@ def create_progress_update(goal_id):
             status_changed = True
     
     db.session.add(update)
-    db.session.commit()
     
-    # Send system update to the replica
+    # Queue a system update for the replica in the same transaction
     update_message = f"User updated {update_type} for goal '{goal.title}' to {progress_value}%"
     if status_changed:
         update_message += f" and status changed from '{old_status}' to '{goal.status}'"
@@ -108,11 +115,12 @@ def create_progress_update(goal_id):
     elif update_type == 'effort' and update.effort_notes:
         update_message += f" with note: '{update.effort_notes}'"
     
-    # Import here to avoid circular imports
-    from app.api.chat import send_system_update
+    # Successive plain values (e.g. from a slider) supersede each other in a digest
+    has_notes = update.progress_notes or update.effort_notes
+    coalesce_key = None if status_changed or has_notes else f"goal:{goal_id}:{update_type}"
     
-    # Send the system update
-    system_update_result = send_system_update(user_id, update_message, goal_id)
+    enqueue_system_update(user_id, update_message, goal_id, coalesce_key=coalesce_key)
+    db.session.commit()
     
     return jsonify({
         'message': f'{update_type.capitalize()} update created successfully',
@@ -177,51 +185,103 @@ def delete_progress_update(goal_id, update_id):
         }
     }), 200
 
+@progress_bp.route('/goals/<int:goal_id>/series', methods=['GET'])
+@jwt_required()
+@use_read_replica
+def get_progress_series(goal_id):
+    """
+    Get the progress and effort of a goal (or one of its milestones) as chart-sized time series.
+    
+    Query parameters:
+        mode: 'buckets' (default) for per-day/week/month aggregates, or 'lttb' for downsampled points
+        interval: 'day' (default), 'week' or 'month' in buckets mode
+        points: Maximum points per series in lttb mode
+        milestone_id: Series of this milestone instead of the goal's own updates
+        start, end: Only include updates created in [start, end) (ISO format)
+    """
+    user_id = get_jwt_identity()
+    
+    # Check if goal exists and belongs to user
+    goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
+    if not goal:
+        return jsonify({'error': 'Goal not found'}), 404
+    
+    milestone_id = request.args.get('milestone_id', type=int)
+    if milestone_id is not None and not Milestone.query.filter_by(id=milestone_id, goal_id=goal_id).first():
+        return jsonify({'error': 'Milestone not found'}), 404
+    
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        try:
+            bounds[name] = datetime.fromisoformat(value) if value else None
+        except ValueError:
+            return jsonify({'error': f'Invalid {name} format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
+    
+    result = {'goal_id': goal_id, 'milestone_id': milestone_id}
+    mode = request.args.get('mode', 'buckets')
+    if mode == 'buckets':
+        interval = request.args.get('interval', 'day')
+        if interval not in BUCKET_INTERVALS:
+            return jsonify({'error': f'Invalid interval. Must be one of: {", ".join(BUCKET_INTERVALS)}'}), 400
+        result.update(mode=mode, interval=interval,
+                      series=bucketed_progress_series(goal_id, milestone_id, interval, **bounds))
+    elif mode == 'lttb':
+        points = request.args.get('points', PROGRESS_SERIES_DEFAULT_POINTS, type=int)
+        if not 3 <= points <= PROGRESS_SERIES_MAX_POINTS:
+            return jsonify({'error': f'Invalid points. Must be a number between 3 and {PROGRESS_SERIES_MAX_POINTS}'}), 400
+        result.update(mode=mode, points=points,
+                      series=downsampled_progress_series(goal_id, milestone_id, points, **bounds))
+    else:
+        return jsonify({'error': 'Invalid mode. Must be one of: buckets, lttb'}), 400
+    
+    return jsonify(result), 200
+
 @progress_bp.route('/summary', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_progress_summary():
     """Get a summary of goal progress for the current user."""
     user_id = get_jwt_identity()
     
-    # Get all active goals
-    goals = Goal.query.filter_by(user_id=user_id, status='active').all()
-    
-    # Calculate overall progress
-    total_goals = len(goals)
-    completed_goals = Goal.query.filter_by(user_id=user_id, status='completed').count()
-    abandoned_goals = Goal.query.filter_by(user_id=user_id, status='abandoned').count()
+    # Goal counts and the completion sum come from the user's materialized stats row
+    stats = get_user_stats(user_id)
+    total_goals = stats['active_goals']
+    active_completion_sum = stats['active_completion_sum']
+    completed_goals = stats['completed_goals']
+    abandoned_goals = stats['abandoned_goals']
     
     # Calculate average completion percentage for active goals
     avg_completion = 0
     if total_goals > 0:
-        avg_completion = sum(goal.completion_status for goal in goals) / total_goals
+        avg_completion = active_completion_sum / total_goals
     
-    # Get goals that are almost due (within 7 days)
-    from datetime import timedelta
+    # Get active goals that are almost due (within 7 days)
     now = datetime.utcnow()
     soon_due = []
-    for goal in goals:
-        if now <= goal.target_date <= (now + timedelta(days=7)):
-            soon_due.append({
-                'id': goal.id,
-                'title': goal.title,
-                'target_date': goal.target_date.isoformat(),
-                'completion_status': goal.completion_status,
-                'days_remaining': (goal.target_date - now).days
-            })
+    for goal in (Goal.query
+                 .filter(Goal.user_id == user_id, Goal.status == 'active',
+                         Goal.target_date >= now, Goal.target_date <= now + timedelta(days=7))
+                 .order_by(Goal.id)
+                 .all()):
+        soon_due.append({
+            'id': goal.id,
+            'title': goal.title,
+            'target_date': goal.target_date.isoformat(),
+            'completion_status': goal.completion_status,
+            'days_remaining': (goal.target_date - now).days
+        })
     
-    # Get goals with recent progress updates
+    # Get goals with recent progress updates, with the goal titles joined in
     recently_updated = []
-    recent_updates = (ProgressUpdate.query
+    recent_updates = (db.session.query(ProgressUpdate, Goal.title)
                       .join(Goal, Goal.id == ProgressUpdate.goal_id)
                       .filter(Goal.user_id == user_id)
                       .order_by(desc(ProgressUpdate.created_at))
                       .limit(5)
                       .all())
     
-    for update in recent_updates:
-        goal = Goal.query.get(update.goal_id)
-        
+    for update, goal_title in recent_updates:
         # Get the appropriate notes field based on update type
         notes = None
         if update.type == 'progress' and update.progress_notes:
@@ -230,8 +290,8 @@ def get_progress_summary():
             notes = update.effort_notes
             
         recently_updated.append({
-            'goal_id': goal.id,
-            'goal_title': goal.title,
+            'goal_id': update.goal_id,
+            'goal_title': goal_title,
             'progress_value': update.progress_value,
             'type': update.type,
             'notes': notes,
@@ -252,6 +312,7 @@ def get_progress_summary():
 
 @progress_bp.route('/achievements', methods=['GET'])
 @jwt_required()
+@use_read_replica
 def get_user_achievements():
     """
     Get user achievements including completed goals, milestones, and positive reflections.
@@ -260,90 +321,97 @@ def get_user_achievements():
     user_id = get_jwt_identity()
     
     # Get query parameters
-    limit = request.args.get('limit', 20, type=int)
-    
-    # Get completed goals
-    completed_goals = Goal.query.filter_by(
-        user_id=user_id, 
-        status='completed'
-    ).order_by(desc(Goal.updated_at)).all()
-    
-    # Get completed milestones (even for goals that aren't fully completed)
-    completed_milestones = (Milestone.query
-                           .join(Goal, Goal.id == Milestone.goal_id)
-                           .filter(Goal.user_id == user_id, Milestone.status == 'completed')
-                           .order_by(desc(Milestone.updated_at))
-                           .all())
-    
-    # Get "learned lessons" (positive reflections and improvements)
-    positive_reflections = (Reflection.query
-                           .join(Goal, Goal.id == Reflection.goal_id)
-                           .filter(
-                               Goal.user_id == user_id,
-                               or_(
-                                   Reflection.reflection_type == 'review_positive',
-                                   Reflection.reflection_type == 'review_improve'
-                               )
-                           )
-                           .order_by(desc(Reflection.updated_at))
-                           .all())
-    
-    # Combine into chronologically ordered achievements
-    achievements = []
-    
-    # Add completed goals
-    for goal in completed_goals:
-        achievements.append({
-            'type': 'goal',
-            'id': goal.id,
-            'title': goal.title,
-            'completion_date': goal.updated_at.isoformat(),
-            'target_date': goal.target_date.isoformat()
-        })
-    
-    # Add completed milestones
-    for milestone in completed_milestones:
-        goal = Goal.query.get(milestone.goal_id)
-        achievements.append({
-            'type': 'milestone',
-            'id': milestone.id,
-            'goal_id': milestone.goal_id,
-            'goal_title': goal.title,
-            'title': milestone.title,
-            'completion_date': milestone.updated_at.isoformat(),
-            'target_date': milestone.target_date.isoformat()
-        })
-    
-    # Add positive reflections
-    for reflection in positive_reflections:
-        goal = Goal.query.get(reflection.goal_id)
-        reflection_type_display = {
-            'review_positive': 'Positive Reflection',
-            'review_improve': 'Lesson Learned'
-        }.get(reflection.reflection_type, reflection.reflection_type)
-        
-        achievements.append({
-            'type': 'reflection',
-            'id': reflection.id,
-            'goal_id': reflection.goal_id,
-            'goal_title': goal.title,
-            'reflection_type': reflection.reflection_type,
-            'reflection_type_display': reflection_type_display,
-            'content': reflection.content,
-            'date': reflection.updated_at.isoformat()
-        })
-    
-    # Sort all achievements by date (newest first)
-    achievements.sort(key=lambda x: x.get('completion_date') or x.get('date'), reverse=True)
+    limit = max(request.args.get('limit', 20, type=int), 0)
+    
+    # Completed goals, completed milestones (even for goals that aren't fully completed)
+    # and "learned lessons" (positive reflections and improvements) as one set of rows
+    achievement_rows = union_all(
+        select(
+            literal('goal').label('type'),
+            Goal.id.label('id'),
+            Goal.id.label('goal_id'),
+            Goal.title.label('goal_title'),
+            Goal.title.label('title'),
+            cast(null(), db.String(50)).label('reflection_type'),
+            cast(null(), db.Text).label('content'),
+            Goal.updated_at.label('date'),
+            Goal.target_date.label('target_date')
+        ).where(Goal.user_id == user_id, Goal.status == 'completed'),
+        select(
+            literal('milestone'),
+            Milestone.id,
+            Milestone.goal_id,
+            Goal.title,
+            Milestone.title,
+            cast(null(), db.String(50)),
+            cast(null(), db.Text),
+            Milestone.updated_at,
+            Milestone.target_date
+        ).join(Goal, Goal.id == Milestone.goal_id).where(Goal.user_id == user_id, Milestone.status == 'completed'),
+        select(
+            literal('reflection'),
+            Reflection.id,
+            Reflection.goal_id,
+            Goal.title,
+            cast(null(), db.String(200)),
+            Reflection.reflection_type,
+            Reflection.content,
+            Reflection.updated_at,
+            cast(null(), db.DateTime)
+        ).join(Goal, Goal.id == Reflection.goal_id).where(
+            Goal.user_id == user_id,
+            Reflection.reflection_type.in_(REVIEW_REFLECTION_TYPES)
+        )
+    ).subquery()
+    
+    # Newest first, ordered and limited in SQL
+    rows = db.session.execute(
+        select(achievement_rows).order_by(desc(achievement_rows.c.date)).limit(limit)
+    ).all()
     
-    # Apply limit
-    achievements = achievements[:limit]
+    achievements = []
+    for row in rows:
+        if row.type == 'goal':
+            achievements.append({
+                'type': 'goal',
+                'id': row.id,
+                'title': row.title,
+                'completion_date': row.date.isoformat(),
+                'target_date': row.target_date.isoformat()
+            })
+        elif row.type == 'milestone':
+            achievements.append({
+                'type': 'milestone',
+                'id': row.id,
+                'goal_id': row.goal_id,
+                'goal_title': row.goal_title,
+                'title': row.title,
+                'completion_date': row.date.isoformat(),
+                'target_date': row.target_date.isoformat()
+            })
+        else:
+            reflection_type_display = {
+                'review_positive': 'Positive Reflection',
+                'review_improve': 'Lesson Learned'
+            }.get(row.reflection_type, row.reflection_type)
+            
+            achievements.append({
+                'type': 'reflection',
+                'id': row.id,
+                'goal_id': row.goal_id,
+                'goal_title': row.goal_title,
+                'reflection_type': row.reflection_type,
+                'reflection_type_display': reflection_type_display,
+                'content': row.content,
+                'date': row.date.isoformat()
+            })
     
     # Get stats
+    user_stats = get_user_stats(user_id)
     stats = {
-        'total_completed_goals': len(completed_goals),
-        'total_completed_milestones': len(completed_milestones),
-        'total_reflections': len(positive_reflections)
+        'total_completed_goals': user_stats['completed_goals'],
+        'total_completed_milestones': user_stats['completed_milestones'],
+        'total_reflections': user_stats['review_reflections']
     }
     
     return jsonify({
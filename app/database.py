@@ -0,0 +1,152 @@
+"""
+Database engine profile.
+
+With the default 'production' profile every SQLite connection is set up for
+several processes (gunicorn workers, the outbox worker) sharing one database
+file: write-ahead logging so readers and the writer do not block each other,
+synchronous=NORMAL (safe with WAL, one fsync per checkpoint instead of per
+commit), a busy timeout so writers wait for the lock instead of failing with
+"database is locked", and a larger page cache, memory-mapped reads and
+in-memory temp tables. File-backed SQLite connections are also pooled so the
+pragmas and page cache outlive a request. The 'default' profile leaves the
+engine as Flask-SQLAlchemy configures it.
+
+engine_options() builds the SQLALCHEMY_ENGINE_OPTIONS for a database URL;
+set SQLALCHEMY_ENGINE_OPTIONS explicitly to override it. The pragmas travel
+in those options under 'sqlite_pragmas' and are applied by
+ProfiledSQLAlchemy to every engine it creates.
+
+ProfiledSQLAlchemy sessions also route the SELECTs of read-only requests to
+the 'replica' bind when one is configured (see app/read_replica.py).
+"""
+
+import os
+import logging
+from functools import partial
+
+from flask import g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger('strategist.database')
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+# 'production' (WAL and tuned pragmas, pooled connections) or 'default'
+DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'production')
+
+# SQLite pragmas of the production profile
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # Milliseconds to wait for a lock
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # Bytes
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # Pages, or KiB when negative
+SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))  # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'false').lower() == 'true'
+
+def sqlite_pragmas():
+    """Return the production pragmas in the order they are applied.
+
+    busy_timeout comes first so the others wait for a lock held by another
+    process instead of failing.
+    """
+    return {
+        'busy_timeout': SQLITE_BUSY_TIMEOUT,
+        'journal_mode': SQLITE_JOURNAL_MODE,
+        'synchronous': SQLITE_SYNCHRONOUS,
+        'cache_size': SQLITE_CACHE_SIZE,
+        'mmap_size': SQLITE_MMAP_SIZE,
+        'temp_store': SQLITE_TEMP_STORE
+    }
+
+def engine_options(database_uri, profile=None):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for a database URL and engine profile.
+
+    Args:
+        database_uri: SQLALCHEMY_DATABASE_URI of the app
+        profile: 'production' or 'default' (defaults to DB_ENGINE_PROFILE)
+
+    Returns:
+        dict: Keyword arguments for create_engine, plus 'sqlite_pragmas' for SQLite
+    """
+    profile = profile or DB_ENGINE_PROFILE
+    if profile == 'default':
+        return {}
+    if profile != 'production':
+        raise ValueError(f"Unknown database engine profile: {profile}")
+
+    pool_options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    }
+
+    url = make_url(database_uri)
+    if url.get_backend_name() != 'sqlite':
+        return pool_options
+
+    options = {'sqlite_pragmas': sqlite_pragmas()}
+    if url.database in (None, '', ':memory:'):
+        # Flask-SQLAlchemy keeps in-memory databases on a single static connection
+        return options
+
+    from sqlalchemy.pool import QueuePool
+    options.update(pool_options)
+    options['poolclass'] = QueuePool
+    options['connect_args'] = {
+        # Pooled connections are handed to whichever thread serves the next request
+        'check_same_thread': False,
+        'timeout': SQLITE_BUSY_TIMEOUT / 1000
+    }
+    return options
+
+def apply_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    """Set the pragmas on a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+class RoutingSession(SignallingSession):
+    """Session sending plain SELECTs to the read replica during read-only requests.
+
+    Flushes, DML and connections requested without a statement always use
+    the primary database.
+    """
+
+    def __init__(self, db, **options):
+        self._profiled_db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (clause is not None and getattr(clause, 'is_select', False) and not self._flushing
+                and has_request_context() and g.get('use_read_replica')):
+            return self._profiled_db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+class ProfiledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension applying the engine profile's SQLite pragmas
+    and routing read-only requests to the read replica."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        pragmas = engine_opts.pop('sqlite_pragmas', None)
+        engine = super().create_engine(sa_url, engine_opts)
+        if pragmas and engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', partial(apply_sqlite_pragmas, pragmas))
+            logger.debug(f"SQLite pragmas for {engine.url}: {pragmas}")
+        return engine
@@ -0,0 +1,410 @@
+"""
+Goal context sent to Sensay replicas with goal-related messages.
+
+The full goal context (details, milestones, reflections and recent progress)
+is only sent when the replica has not seen the goal yet or needs a refresh.
+After that, a GoalContextSnapshot row remembers what the replica was last
+told about each goal and later messages carry only what changed since then.
+
+A full refresh is sent when:
+    - the replica has never received the goal, or the replica was replaced
+    - GOAL_CONTEXT_MAX_DELTAS deltas were sent since the last full context
+    - the last full context is older than GOAL_CONTEXT_REFRESH_TTL seconds
+    - the delta would not be shorter than the full context
+
+Rendered contexts are kept in an in-process LRU keyed by goal ID and a
+version derived from the goal and its milestones, reflections and progress
+updates, so an unchanged goal costs one small aggregate query instead of
+reloading all of its children. Flushes that touch a goal evict its entry.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from itertools import chain
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import desc, event, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import GoalContextSnapshot, Goal, Milestone, Reflection, ProgressUpdate
+from app.metrics import metrics
+
+logger = logging.getLogger('strategist.goal_context')
+
+# Deltas sent before the full context is repeated
+GOAL_CONTEXT_MAX_DELTAS = int(os.environ.get('GOAL_CONTEXT_MAX_DELTAS', 10))
+# Seconds before the full context is repeated (older turns may have left the replica's context window)
+GOAL_CONTEXT_REFRESH_TTL = int(os.environ.get('GOAL_CONTEXT_REFRESH_TTL', 6 * 3600))
+# Goals whose rendered context is kept in memory per process
+GOAL_CONTEXT_CACHE_SIZE = int(os.environ.get('GOAL_CONTEXT_CACHE_SIZE', 1024))
+
+class GoalContextCache:
+    """Thread-safe LRU of rendered goal contexts, one entry per goal."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # goal_id -> (version, value)
+
+    def get(self, goal_id, version):
+        """Return the cached value for this version of the goal, or None."""
+        with self._lock:
+            entry = self._entries.get(goal_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(goal_id)
+            return entry[1]
+
+    def put(self, goal_id, version, value):
+        """Cache a value, evicting the least recently used goals if full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[goal_id] = (version, value)
+            self._entries.move_to_end(goal_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, goal_id):
+        """Drop the cached value of a goal."""
+        with self._lock:
+            self._entries.pop(goal_id, None)
+
+    def clear(self):
+        """Drop all cached values."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+# Process-wide cache
+goal_context_cache = GoalContextCache(GOAL_CONTEXT_CACHE_SIZE)
+
+def get_goal_version(goal):
+    """Return a version string that changes whenever the goal's context can change.
+
+    Combines the goal's updated_at with the count and latest timestamp of its
+    milestones and reflections and the count and newest ID of its progress
+    updates, read in a single query.
+    """
+    row = db.session.query(
+        select(func.count(Milestone.id)).where(Milestone.goal_id == goal.id).scalar_subquery(),
+        select(func.max(Milestone.updated_at)).where(Milestone.goal_id == goal.id).scalar_subquery(),
+        select(func.count(Reflection.id)).where(Reflection.goal_id == goal.id).scalar_subquery(),
+        select(func.max(Reflection.updated_at)).where(Reflection.goal_id == goal.id).scalar_subquery(),
+        select(func.count(ProgressUpdate.id)).where(ProgressUpdate.goal_id == goal.id).scalar_subquery(),
+        select(func.max(ProgressUpdate.id)).where(ProgressUpdate.goal_id == goal.id).scalar_subquery()
+    ).one()
+    return '|'.join(str(value) for value in (goal.updated_at,) + tuple(row))
+
+def get_goal_context_entry(goal):
+    """Return the goal's snapshot, its hash and its full rendered context, from the cache if current.
+
+    Returns:
+        dict: 'snapshot', 'content_hash' and 'text'. Treat it as read-only, it is shared.
+    """
+    version = get_goal_version(goal)
+    entry = goal_context_cache.get(goal.id, version)
+
+    if entry is None:
+        metrics.incr("goal_context.cache_misses")
+        snapshot = build_goal_snapshot(goal)
+        entry = {
+            'snapshot': snapshot,
+            'content_hash': hash_goal_snapshot(snapshot),
+            'text': render_goal_context(snapshot)
+        }
+        goal_context_cache.put(goal.id, version, entry)
+    else:
+        metrics.incr("goal_context.cache_hits")
+
+    hits = metrics.counter("goal_context.cache_hits")
+    metrics.set_gauge("goal_context.cache_hit_rate", round(hits / (hits + metrics.counter("goal_context.cache_misses")), 4))
+    metrics.set_gauge("goal_context.cache_size", len(goal_context_cache))
+
+    return entry
+
+@event.listens_for(db.session, 'after_flush')
+def _invalidate_flushed_goals(session, flush_context):
+    """Evict cached contexts of goals whose rows were written in this flush."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Goal):
+            goal_context_cache.invalidate(obj.id)
+        elif isinstance(obj, (Milestone, Reflection, ProgressUpdate)):
+            goal_context_cache.invalidate(obj.goal_id)
+
+def build_goal_snapshot(goal):
+    """Collect the lines of a goal's context, keyed so two snapshots can be diffed.
+
+    Args:
+        goal: Goal model instance
+
+    Returns:
+        dict: 'fields' (label -> value), 'milestones' and 'reflections'
+              (ID -> line), 'open_milestones' (IDs of milestones not completed)
+              and 'progress' (ID -> line of the 3 most recent updates)
+    """
+    fields = {
+        'Goal ID': str(goal.id),
+        'Title': goal.title,
+        'Start date': goal.start_date.strftime('%Y-%m-%d'),
+        'Target date': goal.target_date.strftime('%Y-%m-%d'),
+        'Current progress': f"{goal.completion_status}%",
+        'Status': goal.status
+    }
+
+    milestones = {
+        str(milestone.id): f"- ID: {milestone.id}, Title: {milestone.title}, Due: {milestone.target_date.strftime('%Y-%m-%d')}, Status: {milestone.status}, Progress: {milestone.completion_status}%"
+        for milestone in goal.milestones
+    }
+
+    reflections = {
+        str(reflection.id): f"- Type: {reflection.reflection_type}, Created: {reflection.created_at.strftime('%Y-%m-%d')}"
+        for reflection in goal.reflections
+    }
+
+    progress = {}
+    for update in ProgressUpdate.query.filter_by(goal_id=goal.id).order_by(desc(ProgressUpdate.created_at)).limit(3).all():
+        note_text = "No notes"
+        if update.type == 'progress' and update.progress_notes:
+            note_text = update.progress_notes
+        elif update.type == 'effort' and update.effort_notes:
+            note_text = update.effort_notes
+        progress[str(update.id)] = f"- Date: {update.created_at.strftime('%Y-%m-%d')}, Progress: {update.progress_value}%, Notes: {note_text}"
+
+    return {
+        'fields': fields,
+        'milestones': milestones,
+        'open_milestones': [str(milestone.id) for milestone in goal.milestones if milestone.status != 'completed'],
+        'reflections': reflections,
+        'progress': progress
+    }
+
+def hash_goal_snapshot(snapshot):
+    """Hash a goal snapshot."""
+    return hashlib.sha256(json.dumps(snapshot, sort_keys=True).encode('utf-8')).hexdigest()
+
+def render_goal_context_sections(snapshot):
+    """Render the full goal context as its sections, in prompt order.
+
+    Returns:
+        List of (section, text) pairs; sections without content are omitted
+    """
+    sections = [('details', "[GOAL CONTEXT]\n" + "".join(f"{label}: {value}\n" for label, value in snapshot['fields'].items()))]
+
+    if snapshot['milestones']:
+        sections.append(('milestones', "\nMilestones:\n" + "".join(f"{line}\n" for line in snapshot['milestones'].values())))
+
+    if snapshot['reflections']:
+        sections.append(('reflections', "\nReflections:\n" + "".join(f"{line}\n" for line in snapshot['reflections'].values())))
+
+    if snapshot['progress']:
+        sections.append(('progress', "\nRecent Progress Updates:\n" + "".join(f"{line}\n" for line in snapshot['progress'].values())))
+
+    sections.append(('end', "\n[END GOAL CONTEXT]\n\n"))
+    return sections
+
+def render_goal_context(snapshot):
+    """Render the full goal context for the AI."""
+    return "".join(text for _, text in render_goal_context_sections(snapshot))
+
+def summarize_goal_context_section(snapshot, section):
+    """Return a shorter version of a goal context section, or None if it cannot be shortened."""
+    if section == 'milestones':
+        open_lines = [snapshot['milestones'][milestone_id] for milestone_id in snapshot['open_milestones']]
+        completed = len(snapshot['milestones']) - len(open_lines)
+        summary = f"\nMilestones ({completed} completed not shown):\n" + "".join(f"{line}\n" for line in open_lines)
+        return summary if completed else None
+    if section == 'reflections':
+        return f"\nReflections: {len(snapshot['reflections'])} recorded\n"
+    if section == 'progress':
+        latest = next(iter(snapshot['progress'].values()))
+        return f"\nLatest Progress Update:\n{latest}\n"
+    return None
+
+def render_goal_context_delta(previous, snapshot):
+    """Render what changed between two snapshots of the same goal.
+
+    Args:
+        previous: Snapshot the replica has already seen
+        snapshot: Current snapshot
+
+    Returns:
+        str: Compact context update for the AI
+    """
+    goal_id = snapshot['fields']['Goal ID']
+    lines = []
+
+    for label, value in snapshot['fields'].items():
+        if previous['fields'].get(label) != value:
+            lines.append(f"{label}: {value}")
+
+    for section, name in (('milestones', 'Milestone'), ('reflections', 'Reflection')):
+        old_items, new_items = previous[section], snapshot[section]
+        for item_id, line in new_items.items():
+            if item_id not in old_items:
+                lines.append(f"{name} added {line}")
+            elif old_items[item_id] != line:
+                lines.append(f"{name} changed {line}")
+        for item_id in old_items:
+            if item_id not in new_items:
+                lines.append(f"{name} removed - ID: {item_id}")
+
+    new_progress = [line for update_id, line in snapshot['progress'].items() if update_id not in previous['progress']]
+    if new_progress:
+        lines.append("New progress updates:")
+        lines.extend(new_progress)
+
+    if not lines:
+        return f"[GOAL CONTEXT] Goal ID: {goal_id}, unchanged since the last goal context [END GOAL CONTEXT]\n\n"
+
+    return (
+        f"[GOAL CONTEXT UPDATE]\n"
+        f"Goal ID: {goal_id} (changes since the last goal context)\n"
+        + "\n".join(lines) +
+        f"\n[END GOAL CONTEXT UPDATE]\n\n"
+    )
+
+def plan_goal_context(user_id, replica_id, goal):
+    """Work out the goal context to send with a message.
+
+    Nothing is stored until record_goal_context_sent() is called once the
+    message has reached the replica.
+
+    Args:
+        user_id: ID of the user
+        replica_id: ID of the replica the message is sent to
+        goal: Goal model instance
+
+    Returns:
+        dict: 'text' to prepend to the message, whether it is a 'full'
+              context, and the data needed to record it
+    """
+    entry = get_goal_context_entry(goal)
+    snapshot, content_hash, full_text = entry['snapshot'], entry['content_hash'], entry['text']
+
+    state = GoalContextSnapshot.query.filter_by(user_id=user_id, goal_id=goal.id).first()
+
+    text, full = full_text, True
+    if state and is_goal_context_state_current(state, replica_id):
+        if state.content_hash == content_hash:
+            text, full = render_goal_context_delta(snapshot, snapshot), False
+        else:
+            delta_text = render_goal_context_delta(json.loads(state.snapshot), snapshot)
+            if len(delta_text) < len(full_text):
+                text, full = delta_text, False
+
+    metrics.incr("goal_context.full" if full else "goal_context.delta")
+    metrics.incr("goal_context.chars_saved", len(full_text) - len(text))
+    logger.debug(f"Goal context for goal {goal.id}: {'full' if full else 'delta'}, {len(text)} of {len(full_text)} chars")
+
+    return {
+        'goal_id': goal.id,
+        'text': text,
+        'full': full,
+        'snapshot': snapshot,
+        'content_hash': content_hash
+    }
+
+# Trim order of goal context sections in a prompt (higher is trimmed first)
+GOAL_CONTEXT_SECTION_PRIORITIES = {
+    'delta': 1,
+    'milestones': 2,
+    'progress': 3,
+    'reflections': 4
+}
+
+def add_goal_context_sections(builder, plan):
+    """Add a planned goal context to a PromptBuilder.
+
+    The goal's details and the context markers are required; milestones,
+    progress updates and reflections can be summarized or dropped to fit
+    the budget.
+
+    Args:
+        builder: PromptBuilder for the message
+        plan: Result of plan_goal_context()
+
+    Returns:
+        List of the section names added
+    """
+    prefix = f"goal:{plan['goal_id']}"
+
+    if not plan['full']:
+        name = f"{prefix}:delta"
+        builder.add_section(name, plan['text'], priority=GOAL_CONTEXT_SECTION_PRIORITIES['delta'], kind='goal_context_delta')
+        return [name]
+
+    names = []
+    snapshot = plan['snapshot']
+    for section, text in render_goal_context_sections(snapshot):
+        name = f"{prefix}:{section}"
+        priority = GOAL_CONTEXT_SECTION_PRIORITIES.get(section)
+        builder.add_section(
+            name,
+            text,
+            priority=priority or 0,
+            summary=summarize_goal_context_section(snapshot, section) if priority else None,
+            required=priority is None,
+            kind=f"goal_{section}"
+        )
+        names.append(name)
+    return names
+
+def is_goal_context_trimmed(report, section_names):
+    """Check whether any of a goal's sections were summarized or dropped from the prompt."""
+    return any(report['sections'][name]['action'] != 'kept' for name in section_names if name in report['sections'])
+
+def is_goal_context_state_current(state, replica_id):
+    """Check whether the replica can be sent a delta against the stored snapshot."""
+    if state.replica_id != replica_id:
+        return False
+    if state.deltas_since_full >= GOAL_CONTEXT_MAX_DELTAS:
+        return False
+    return datetime.utcnow() - state.full_sent_at < timedelta(seconds=GOAL_CONTEXT_REFRESH_TTL)
+
+def record_goal_context_sent(user_id, replica_id, plan):
+    """Remember the goal context the replica has now seen.
+
+    Args:
+        user_id: ID of the user
+        replica_id: ID of the replica the message was sent to
+        plan: Result of plan_goal_context()
+    """
+    state = GoalContextSnapshot.query.filter_by(user_id=user_id, goal_id=plan['goal_id']).first()
+    if not state:
+        state = GoalContextSnapshot(user_id=user_id, goal_id=plan['goal_id'], version=0)
+        db.session.add(state)
+
+    if state.content_hash != plan['content_hash']:
+        state.version = (state.version or 0) + 1
+    state.replica_id = replica_id
+    state.content_hash = plan['content_hash']
+    state.snapshot = json.dumps(plan['snapshot'])
+    if plan['full']:
+        state.deltas_since_full = 0
+        state.full_sent_at = datetime.utcnow()
+    else:
+        state.deltas_since_full = (state.deltas_since_full or 0) + 1
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request recorded the same goal first; the next message sends a full context
+        db.session.rollback()
+        GoalContextSnapshot.query.filter_by(user_id=user_id, goal_id=plan['goal_id']).delete()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failed to record goal context for goal {plan['goal_id']}: {str(e)}")
+
+def forget_goal_context(user_id, goal_id):
+    """Drop the stored goal context of a user's goal (not committed)."""
+    GoalContextSnapshot.query.filter_by(user_id=user_id, goal_id=goal_id).delete()
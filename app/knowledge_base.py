@@ -5,6 +5,8 @@ This file contains the knowledge base entries used to train Sensay replicas
 with strategic planning and goal-setting information.
 """
 
+import json
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
@@ -559,4 +561,23 @@ def get_knowledge_base_entries():
     Returns:
         List[Dict]: List of knowledge base entry dictionaries
     """
-    return STRATEGIC_PLANNING_ENTRIES 
\ No newline at end of file
+    return STRATEGIC_PLANNING_ENTRIES
+
+# Cached manifest hash (entries are static for the life of the process)
+_manifest_hash = None
+
+def get_knowledge_base_manifest_hash():
+    """
+    Get a hash identifying the current set of knowledge base entries.
+    
+    Changes whenever an entry is added, removed or edited, so stored replica
+    state can tell whether it was verified against the same knowledge base.
+    
+    Returns:
+        str: Hex SHA-256 digest of the entries
+    """
+    global _manifest_hash
+    if _manifest_hash is None:
+        manifest = json.dumps(get_knowledge_base_entries(), sort_keys=True)
+        _manifest_hash = hashlib.sha256(manifest.encode('utf-8')).hexdigest()
+    return _manifest_hash
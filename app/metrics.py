@@ -0,0 +1,71 @@
+"""
+In-process metrics for the Strategist application.
+
+Counters, gauges and timings are kept per worker process and exposed through
+the /api/metrics endpoint. Metric names use a dotted prefix with an optional
+label in brackets, e.g. "sensay.retries[GET /v1/replicas/{id}]".
+"""
+
+import threading
+from collections import defaultdict
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._timings = {}
+
+    def incr(self, name, value=1):
+        """Increment a counter."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        """Record a duration in seconds."""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def counter(self, name):
+        """Return the current value of a counter."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """Return a copy of all metrics."""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': {
+                    name: {
+                        'count': timing['count'],
+                        'total': round(timing['total'], 6),
+                        'avg': round(timing['total'] / timing['count'], 6) if timing['count'] else 0.0,
+                        'max': round(timing['max'], 6)
+                    }
+                    for name, timing in self._timings.items()
+                }
+            }
+
+    def reset(self):
+        """Clear all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+# Process-wide registry
+metrics = Metrics()
@@ -19,6 +19,11 @@ class User(db.Model):
     goals = db.relationship('Goal', backref='user', lazy=True, cascade='all, delete-orphan') 
     preferences = db.relationship('UserPreference', backref='user', uselist=False, cascade='all, delete-orphan')
     chat_history = db.relationship('ChatMessage', backref='user', lazy=True, cascade='all, delete-orphan')
+    replica_state = db.relationship('ReplicaState', backref='user', uselist=False, cascade='all, delete-orphan')
+    provisioning_job = db.relationship('ProvisioningJob', backref='user', uselist=False, cascade='all, delete-orphan')
+    system_updates = db.relationship('SystemUpdate', backref='user', lazy=True, cascade='all, delete-orphan')
+    goal_context_snapshots = db.relationship('GoalContextSnapshot', backref='user', lazy=True, cascade='all, delete-orphan')
+    stats = db.relationship('UserStats', backref='user', uselist=False, cascade='all, delete-orphan')
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -34,7 +39,7 @@ class UserPreference(db.Model):
     __tablename__ = 'user_preferences'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     reminder_frequency = db.Column(db.String(20), default='weekly')  # daily, weekly, monthly
     reminder_day = db.Column(db.Integer, nullable=True)  # Day of week or month
     reminder_time = db.Column(db.String(5), default="09:00")  # HH:MM format
@@ -47,9 +52,134 @@ class UserPreference(db.Model):
     def __repr__(self):
         return f'<UserPreference for user_id {self.user_id}>'
 
+class ReplicaState(db.Model):
+    """Last verified configuration of a user's Sensay replica.
+    
+    Lets the chat path skip remote replica checks while the replica, its
+    system message and its knowledge base are known to be up to date.
+    """
+    __tablename__ = 'replica_states'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    replica_id = db.Column(db.String(120), nullable=False)
+    system_message_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the normalized system message
+    kb_manifest_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the knowledge base entries
+    verified_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ReplicaState {self.replica_id} for user_id {self.user_id}>'
+
+class GoalContextSnapshot(db.Model):
+    """Goal context last sent to a user's replica for one goal.
+    
+    Lets chat prompts carry only what changed since the replica last saw
+    the goal instead of the full goal context every time.
+    """
+    __tablename__ = 'goal_context_snapshots'
+    __table_args__ = (db.UniqueConstraint('user_id', 'goal_id', name='uq_goal_context_snapshot_user_goal'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    goal_id = db.Column(db.Integer, nullable=False)  # Not a foreign key: removed together with the goal
+    replica_id = db.Column(db.String(120), nullable=False)  # Replica that received the context
+    version = db.Column(db.Integer, nullable=False, default=1)  # Incremented whenever the context changes
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the snapshot
+    snapshot = db.Column(db.Text, nullable=False)  # JSON sections of the context, see app/goal_context.py
+    deltas_since_full = db.Column(db.Integer, nullable=False, default=0)
+    full_sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<GoalContextSnapshot v{self.version} for goal_id {self.goal_id}>'
+
+class ProvisioningJob(db.Model):
+    """Background job that sets up a new user's Sensay user and replica."""
+    __tablename__ = 'provisioning_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)  # When a failed job may be retried, None once attempts run out
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert to dictionary for API responses"""
+        return {
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'will_retry': self.status == 'failed' and self.next_attempt_at is not None,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ProvisioningJob {self.status} for user_id {self.user_id}>'
+
+class UserStats(db.Model):
+    """Running goal, milestone and reflection totals for a user.
+    
+    Kept up to date by the mapper events in app/user_stats.py, in the same
+    transaction as the change, so summaries read one row instead of
+    scanning the user's goals.
+    """
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    active_goals = db.Column(db.Integer, nullable=False, default=0)
+    completed_goals = db.Column(db.Integer, nullable=False, default=0)
+    abandoned_goals = db.Column(db.Integer, nullable=False, default=0)
+    active_completion_sum = db.Column(db.Float, nullable=False, default=0.0)  # Sum of completion_status over active goals
+    completed_milestones = db.Column(db.Integer, nullable=False, default=0)
+    review_reflections = db.Column(db.Integer, nullable=False, default=0)  # review_positive and review_improve reflections
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<UserStats for user_id {self.user_id}>'
+
+class SystemUpdate(db.Model):
+    """Outbox of system updates waiting to be delivered to the user's replica.
+    
+    Rows are written in the same transaction as the change they describe and
+    delivered by the outbox worker (`python app.py drain_outbox`) in id order
+    per user. Rows queued close together are merged into one digest update
+    and all but the first are marked 'coalesced'.
+    """
+    __tablename__ = 'system_update_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    update_message = db.Column(db.Text, nullable=False)
+    related_goal_id = db.Column(db.Integer, nullable=True)  # Not a foreign key: the goal may already be deleted
+    coalesce_key = db.Column(db.String(100), nullable=True)  # Later updates with the same key supersede this one
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, sent, coalesced, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Earliest time of the next attempt
+    locked_until = db.Column(db.DateTime, nullable=True)  # Lease held by the worker delivering it
+    sent_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SystemUpdate {self.id} {self.status} for user_id {self.user_id}>'
+
 class Goal(db.Model):
     """Strategic goals defined by users."""
     __tablename__ = 'goals'
+    __table_args__ = (
+        db.Index('ix_goals_user_status_parent', 'user_id', 'status', 'parent_goal_id'),
+        db.Index('ix_goals_parent_goal_id', 'parent_goal_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -74,6 +204,7 @@ class Goal(db.Model):
 class Milestone(db.Model):
     """Key milestones within a goal."""
     __tablename__ = 'milestones'
+    __table_args__ = (db.Index('ix_milestones_goal_id', 'goal_id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     goal_id = db.Column(db.Integer, db.ForeignKey('goals.id'), nullable=False)
@@ -90,6 +221,9 @@ class Milestone(db.Model):
 class ProgressUpdate(db.Model):
     """User progress updates for goals."""
     __tablename__ = 'progress_updates'
+    __table_args__ = (
+        db.Index('ix_progress_updates_goal_milestone_type_created', 'goal_id', 'milestone_id', 'type', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     goal_id = db.Column(db.Integer, db.ForeignKey('goals.id'), nullable=False)
@@ -128,6 +262,10 @@ class ProgressUpdate(db.Model):
 class Reflection(db.Model):
     """User reflections on goals, prompted by the replica."""
     __tablename__ = 'reflections'
+    __table_args__ = (
+        # One reflection of each type per goal
+        db.Index('uq_reflections_goal_type', 'goal_id', 'reflection_type', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     goal_id = db.Column(db.Integer, db.ForeignKey('goals.id'), nullable=False)
@@ -142,6 +280,13 @@ class Reflection(db.Model):
 class ChatMessage(db.Model):
     """Message history between user and replica."""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_user_goal_created', 'user_id', 'related_goal_id', 'created_at'),
+        db.Index('ix_chat_messages_user_created', 'user_id', 'created_at'),
+        # Keyset pagination of the history (before_id/after_id)
+        db.Index('ix_chat_messages_user_id_id', 'user_id', 'id'),
+        db.Index('ix_chat_messages_user_goal_id', 'user_id', 'related_goal_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -151,4 +296,4 @@ class ChatMessage(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f'<ChatMessage from {self.sender} at {self.created_at}>' 
\ No newline at end of file
+        return f'<ChatMessage from {self.sender} at {self.created_at}>'
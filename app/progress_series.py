@@ -0,0 +1,190 @@
+"""
+Progress and effort time series for charts.
+
+Goals updated every day collect progress updates without bound, so charts
+are drawn from one of two bounded views of a goal's (or milestone's)
+updates instead of the full list:
+
+    - buckets: one row per day, week (starting Monday) or month with the
+      count, average, minimum, maximum and last value of each series,
+      aggregated by the database with GROUP BY
+    - lttb: at most N points per series picked with Largest-Triangle-
+      Three-Buckets downsampling, which keeps the first and last update and
+      the points that shape the curve (jumps, dips, plateaus ending)
+
+Both return the progress and effort series side by side. Only the
+timestamps and values are loaded, walking the
+ix_progress_updates_goal_milestone_type_created index.
+"""
+
+import os
+import logging
+from datetime import datetime
+
+from sqlalchemy import Date, and_, case, cast, func, select
+
+from app import db
+from app.models import ProgressUpdate
+
+logger = logging.getLogger('strategist.progress_series')
+
+SERIES_TYPES = ('progress', 'effort')
+
+BUCKET_INTERVALS = ('day', 'week', 'month')
+
+# Points per series returned by the lttb mode when none are requested
+PROGRESS_SERIES_DEFAULT_POINTS = 100
+
+# Upper limit on the points per series a client can request
+PROGRESS_SERIES_MAX_POINTS = int(os.environ.get('PROGRESS_SERIES_MAX_POINTS', 1000))
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _bucket_start(interval, column, dialect):
+    """SQL expression for the first day of the bucket containing column.
+
+    SQLite has no date_trunc, so its buckets are built with date modifiers;
+    other databases (PostgreSQL) truncate with date_trunc.
+    """
+    if dialect == 'sqlite':
+        if interval == 'day':
+            return func.date(column)
+        if interval == 'week':
+            # The Monday on or before the day
+            return func.date(column, '-6 days', 'weekday 1')
+        return func.strftime('%Y-%m-01', column)
+    return cast(func.date_trunc(interval, column), Date)
+
+def _bucket_label(value):
+    return value if isinstance(value, str) else value.isoformat()[:10]
+
+def _updates_filter(goal_id, milestone_id, start, end):
+    conditions = [ProgressUpdate.goal_id == goal_id, ProgressUpdate.milestone_id == milestone_id]
+    if start is not None:
+        conditions.append(ProgressUpdate.created_at >= start)
+    if end is not None:
+        conditions.append(ProgressUpdate.created_at < end)
+    return and_(*conditions)
+
+def bucket_query(goal_id, milestone_id, interval, start=None, end=None, dialect='sqlite'):
+    """Build the GROUP BY query of bucketed_progress_series for a database dialect."""
+    bucket = _bucket_start(interval, ProgressUpdate.created_at, dialect)
+    # Rank the updates of each bucket newest first, so the aggregate can pick the last value
+    ranked = (select(
+                  bucket.label('bucket'),
+                  ProgressUpdate.type.label('type'),
+                  ProgressUpdate.progress_value.label('value'),
+                  func.row_number().over(
+                      partition_by=(bucket, ProgressUpdate.type),
+                      order_by=(ProgressUpdate.created_at.desc(), ProgressUpdate.id.desc())
+                  ).label('recency'))
+              .where(_updates_filter(goal_id, milestone_id, start, end),
+                     ProgressUpdate.type.in_(SERIES_TYPES))
+              .subquery())
+
+    return (select(ranked.c.bucket, ranked.c.type, func.count(), func.avg(ranked.c.value),
+                   func.min(ranked.c.value), func.max(ranked.c.value),
+                   func.max(case((ranked.c.recency == 1, ranked.c.value))))
+            .group_by(ranked.c.bucket, ranked.c.type)
+            .order_by(ranked.c.bucket))
+
+def bucketed_progress_series(goal_id, milestone_id=None, interval='day', start=None, end=None):
+    """Aggregate the progress and effort updates of a goal or milestone per time bucket.
+
+    Args:
+        goal_id: ID of the goal
+        milestone_id: ID of one of its milestones, or None for the goal's own updates
+        interval: 'day', 'week' or 'month'
+        start: Only include updates created at or after this datetime
+        end: Only include updates created before this datetime
+
+    Returns:
+        list: Buckets in chronological order, each {'bucket': 'YYYY-MM-DD',
+        'progress': stats or None, 'effort': stats or None}
+    """
+    if interval not in BUCKET_INTERVALS:
+        raise ValueError(f"Unknown bucket interval: {interval}")
+
+    dialect = db.session.get_bind().dialect.name
+    rows = db.session.execute(bucket_query(goal_id, milestone_id, interval, start, end, dialect)).all()
+
+    buckets = {}
+    for bucket_start, update_type, count, average, minimum, maximum, last in rows:
+        label = _bucket_label(bucket_start)
+        entry = buckets.setdefault(label, {'bucket': label, 'progress': None, 'effort': None})
+        entry[update_type] = {'count': count, 'avg': average, 'min': minimum, 'max': maximum, 'last': last}
+    return list(buckets.values())
+
+def lttb_indices(xs, ys, threshold):
+    """Pick the indices of at most threshold points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points between them are
+    split into threshold - 2 buckets, and from each bucket the point forming
+    the largest triangle with the previously kept point and the average of
+    the next bucket is kept.
+
+    Args:
+        xs: X coordinates in ascending order
+        ys: Y coordinates
+        threshold: Maximum number of points to keep (at least 3)
+
+    Returns:
+        list: Indices of the kept points in ascending order
+    """
+    count = len(xs)
+    if threshold >= count or threshold < 3:
+        return list(range(count))
+
+    every = (count - 2) / (threshold - 2)
+    kept = [0]
+    previous = 0
+    for index in range(threshold - 2):
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = int((index + 1) * every) + 1
+        next_end = min(int((index + 2) * every) + 1, count)
+        span = next_end - next_start
+        average_x = sum(xs[next_start:next_end]) / span
+        average_y = sum(ys[next_start:next_end]) / span
+
+        # The point of this bucket with the largest triangle area
+        previous_x, previous_y = xs[previous], ys[previous]
+        best, best_area = None, -1.0
+        for candidate in range(int(index * every) + 1, int((index + 1) * every) + 1):
+            area = abs((previous_x - average_x) * (ys[candidate] - previous_y)
+                       - (previous_x - xs[candidate]) * (average_y - previous_y))
+            if area > best_area:
+                best, best_area = candidate, area
+        kept.append(best)
+        previous = best
+    kept.append(count - 1)
+    return kept
+
+def downsampled_progress_series(goal_id, milestone_id=None, points=PROGRESS_SERIES_DEFAULT_POINTS, start=None, end=None):
+    """Downsample the progress and effort updates of a goal or milestone with LTTB.
+
+    Args:
+        goal_id: ID of the goal
+        milestone_id: ID of one of its milestones, or None for the goal's own updates
+        points: Maximum number of points per series
+        start: Only include updates created at or after this datetime
+        end: Only include updates created before this datetime
+
+    Returns:
+        dict: Series type -> {'total': updates in the range, 'points': [{'id',
+        'created_at', 'value'}, ...] in chronological order}
+    """
+    series = {}
+    for update_type in SERIES_TYPES:
+        rows = db.session.execute(
+            select(ProgressUpdate.id, ProgressUpdate.created_at, ProgressUpdate.progress_value)
+            .where(_updates_filter(goal_id, milestone_id, start, end), ProgressUpdate.type == update_type)
+            .order_by(ProgressUpdate.created_at, ProgressUpdate.id)
+        ).all()
+        xs = [(created_at - _EPOCH).total_seconds() for _, created_at, _ in rows]
+        ys = [value for _, _, value in rows]
+        series[update_type] = {
+            'total': len(rows),
+            'points': [{'id': rows[index].id, 'created_at': rows[index].created_at.isoformat(), 'value': ys[index]}
+                       for index in lttb_indices(xs, ys, points)]
+        }
+    return series
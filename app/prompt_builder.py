@@ -0,0 +1,132 @@
+"""
+Token-budgeted prompt assembly for messages sent to Sensay replicas.
+
+A prompt is built from named sections (goal context parts, the user's
+message, ...) kept in the order they were added. When the estimated size
+exceeds the budget, sections are trimmed lowest priority first: a section
+is replaced by its summary if it has one, then dropped. Required sections
+are never trimmed. build() returns the prompt along with per-section size
+accounting, and record_prompt_report() adds it to the metrics registry.
+"""
+
+import os
+import math
+import logging
+
+from app.metrics import metrics
+
+logger = logging.getLogger('strategist.prompt_builder')
+
+# Estimated tokens per prompt (message included) before sections are trimmed
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 2000))
+# Characters per token used for local estimates (close to the average for English text)
+PROMPT_CHARS_PER_TOKEN = float(os.environ.get('PROMPT_CHARS_PER_TOKEN', 4))
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a text without calling a tokenizer."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN)
+
+class PromptBuilder:
+    """Assembles a prompt from prioritized sections within a token budget.
+
+    Priorities are integers; sections with higher numbers are trimmed first.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+        self._sections = []
+
+    def add_section(self, name, text, priority=0, summary=None, required=False, kind=None):
+        """Add a section to the prompt.
+
+        Args:
+            name: Unique section name, used in the accounting
+            text: Section text
+            priority: Trim order, highest first
+            summary: Shorter text to use before dropping the section
+            required: Never trim this section
+            kind: Section type for metrics (defaults to name)
+        """
+        if not text:
+            return
+        self._sections.append({
+            'name': name,
+            'kind': kind or name,
+            'text': text,
+            'summary': summary,
+            'priority': priority,
+            'required': required,
+            'action': 'kept',
+            'original_tokens': estimate_tokens(text)
+        })
+
+    def build(self):
+        """Fit the sections into the budget and join them.
+
+        Returns:
+            Tuple of (prompt, report). The report has the 'budget', the
+            estimated 'total_tokens' and 'original_tokens', and per-section
+            'sections' accounting: name -> {'kind', 'action', 'tokens',
+            'original_tokens', 'chars'}, where action is kept, summarized or
+            dropped.
+        """
+        total = sum(section['original_tokens'] for section in self._sections)
+        original_total = total
+
+        # Trim lowest priority first; later sections first within a priority
+        trimmable = [section for section in self._sections if not section['required']]
+        trimmable.sort(key=lambda section: (-section['priority'], -self._sections.index(section)))
+
+        # Summarize first, then drop
+        for section in trimmable:
+            if total <= self.budget:
+                break
+            if section['summary'] is not None:
+                summary_tokens = estimate_tokens(section['summary'])
+                if summary_tokens < section['original_tokens']:
+                    total -= section['original_tokens'] - summary_tokens
+                    section['text'] = section['summary']
+                    section['action'] = 'summarized'
+
+        for section in trimmable:
+            if total <= self.budget:
+                break
+            total -= estimate_tokens(section['text'])
+            section['text'] = ''
+            section['action'] = 'dropped'
+
+        report = {
+            'budget': self.budget,
+            'total_tokens': total,
+            'original_tokens': original_total,
+            'sections': {}
+        }
+        for section in self._sections:
+            report['sections'][section['name']] = {
+                'kind': section['kind'],
+                'action': section['action'],
+                'tokens': estimate_tokens(section['text']),
+                'original_tokens': section['original_tokens'],
+                'chars': len(section['text'])
+            }
+
+        if total > self.budget:
+            logger.warning(f"Prompt exceeds token budget after trimming: {total} > {self.budget}")
+        elif total < original_total:
+            logger.debug(f"Trimmed prompt from {original_total} to {total} estimated tokens")
+
+        return ''.join(section['text'] for section in self._sections), report
+
+def record_prompt_report(report):
+    """Add a prompt's size accounting to the metrics registry."""
+    metrics.incr("prompt.builds")
+    metrics.incr("prompt.tokens", report['total_tokens'])
+    if report['total_tokens'] < report['original_tokens']:
+        metrics.incr("prompt.trimmed")
+        metrics.incr("prompt.tokens_trimmed", report['original_tokens'] - report['total_tokens'])
+    for section in report['sections'].values():
+        metrics.incr(f"prompt.section_tokens[{section['kind']}]", section['tokens'])
+        if section['action'] != 'kept':
+            metrics.incr(f"prompt.section_{section['action']}[{section['kind']}]")
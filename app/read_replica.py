@@ -0,0 +1,153 @@
+"""
+Read replica routing for read-only endpoints.
+
+When DATABASE_REPLICA_URL is set, it is configured as the 'replica' bind
+and views decorated with @use_read_replica send their SELECTs there (see
+RoutingSession in app/database.py); everything else, and every write, uses
+the primary database.
+
+Replicas lag behind the primary, so a user's reads stay on the primary for
+READ_YOUR_WRITES_WINDOW seconds after a request of theirs wrote to the
+database. Each worker process remembers its users' recent writes, and the
+response to a writing request carries the end of the window in the
+X-Read-Primary-Until header. Clients send the header back on later
+requests (the frontend does this in main.tsx), which keeps the window
+across gunicorn workers.
+"""
+
+import os
+import time
+import logging
+import threading
+from functools import wraps
+
+from flask import current_app, g, request, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+
+from app import db
+from app.database import REPLICA_BIND
+from app.metrics import metrics
+
+logger = logging.getLogger('strategist.read_replica')
+
+# Seconds a user's reads stay on the primary after one of their requests wrote
+READ_YOUR_WRITES_WINDOW = float(os.environ.get('READ_YOUR_WRITES_WINDOW', 5))
+
+# Response and request header carrying the end of the read-your-writes window (Unix time)
+READ_PRIMARY_UNTIL_HEADER = 'X-Read-Primary-Until'
+
+class RecentWrites:
+    """Thread-safe map of user ID -> end of their read-your-writes window."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = {}
+
+    def record(self, user_id, until):
+        with self._lock:
+            self._until[str(user_id)] = max(until, self._until.get(str(user_id), 0))
+            if len(self._until) > 1000:
+                now = time.time()
+                self._until = {key: value for key, value in self._until.items() if value > now}
+
+    def active(self, user_id, now=None):
+        with self._lock:
+            return self._until.get(str(user_id), 0) > (now or time.time())
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+recent_writes = RecentWrites()
+
+def replica_enabled(app=None):
+    app = app or current_app
+    return REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+def _header_window_active(now):
+    try:
+        return float(request.headers.get(READ_PRIMARY_UNTIL_HEADER, 0)) > now
+    except ValueError:
+        return False
+
+def use_read_replica(view):
+    """Route the view's SELECTs to the read replica, outside the user's read-your-writes window.
+
+    Apply below @jwt_required() so the user is known.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_enabled():
+            now = time.time()
+            user_id = get_jwt_identity()
+            if recent_writes.active(user_id, now) or _header_window_active(now):
+                metrics.incr('read_replica.primary_reads')
+            else:
+                g.use_read_replica = True
+                metrics.incr('read_replica.replica_reads')
+        return view(*args, **kwargs)
+    return wrapper
+
+def record_user_write(user_id):
+    """Keep the user's reads on the primary for the read-your-writes window.
+
+    Returns:
+        float: End of the window (Unix time)
+    """
+    until = time.time() + READ_YOUR_WRITES_WINDOW
+    recent_writes.record(user_id, until)
+    g.read_primary_until = until
+    return until
+
+@event.listens_for(db.session, 'after_flush')
+def _note_flush(session, flush_context):
+    session.info['uncommitted_write'] = True
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _note_statement_write(orm_execute_state):
+    # Query.update()/delete() and session.execute() of DML statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['uncommitted_write'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _note_request_write(session):
+    if session.info.pop('uncommitted_write', False) and has_request_context():
+        g.database_written = True
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_uncommitted_write(session, previous_transaction):
+    # Rolling back a savepoint keeps the writes of the enclosing transaction
+    if previous_transaction.parent is None:
+        session.info.pop('uncommitted_write', None)
+
+def _stamp_write_window(response):
+    """Start the read-your-writes window of a user whose request committed a write.
+
+    Failed requests count too: their committed writes (a partial account
+    deletion, say) are just as invisible on a lagging replica.
+    """
+    if not replica_enabled():
+        return response
+    until = g.get('read_primary_until')
+    if until is None and g.get('database_written'):
+        try:
+            user_id = get_jwt_identity()
+        except RuntimeError:
+            # No JWT was verified for this request
+            user_id = None
+        if user_id is not None:
+            until = record_user_write(user_id)
+    if until is not None:
+        response.headers[READ_PRIMARY_UNTIL_HEADER] = f"{until:.3f}"
+    return response
+
+def init_read_replica(app):
+    """Configure the replica bind from DATABASE_REPLICA_URL and the write tracking."""
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA_BIND, replica_url)
+        app.config['SQLALCHEMY_BINDS'] = binds
+        logger.info("Read-only endpoints use the read replica")
+    app.after_request(_stamp_write_window)
@@ -0,0 +1,131 @@
+"""
+Marshmallow schemas for the actions the AI can request.
+
+Each schema validates and coerces an action's 'data' payload once, before
+its handler in app/actions.py runs. Dates are accepted in ISO format or any
+format dateutil understands, and are loaded as datetime objects. Unknown
+keys in a payload are ignored.
+"""
+
+from datetime import datetime, timedelta
+
+from dateutil import parser as date_parser
+from marshmallow import Schema, fields, validate, pre_load, post_load, ValidationError, EXCLUDE
+
+# Days from now used as the goal target date when the AI sends one that cannot be parsed
+DEFAULT_GOAL_TARGET_DAYS = 90
+
+GOAL_STATUSES = ['active', 'completed', 'abandoned', 'deferred']
+MILESTONE_STATUSES = ['pending', 'completed', 'missed']
+PROGRESS_TYPES = ['progress', 'effort']
+
+def parse_date(value):
+    """Parse a date in ISO format, falling back to dateutil.
+
+    Raises:
+        ValueError: If the value is not a date
+    """
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"Not a date: {value!r}")
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            return date_parser.parse(value)
+        except (ValueError, OverflowError):
+            raise ValueError(f"Not a date: {value!r}")
+
+class FlexibleDateTime(fields.Field):
+    """Date/time field accepting ISO or dateutil-parsable strings.
+
+    With lenient=True a value that cannot be parsed loads as None, so the
+    schema can substitute a default instead of rejecting the action.
+    """
+
+    def __init__(self, lenient=False, **kwargs):
+        super().__init__(**kwargs)
+        self.lenient = lenient
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            return parse_date(value)
+        except ValueError:
+            if self.lenient:
+                return None
+            raise ValidationError("Not a valid date. Use ISO format (YYYY-MM-DDTHH:MM:SS).")
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        return value.isoformat() if value is not None else None
+
+class ActionSchema(Schema):
+    """Base schema for action payloads."""
+
+    class Meta:
+        unknown = EXCLUDE
+
+class MilestoneSchema(ActionSchema):
+    # Incomplete milestones are skipped by create_goal_internal rather than rejected
+    title = fields.Str()
+    target_date = FlexibleDateTime(lenient=True, allow_none=True)
+
+class CreateGoalSchema(ActionSchema):
+    title = fields.Str(required=True)
+    target_date = FlexibleDateTime(required=True, lenient=True, allow_none=True)
+    start_date = FlexibleDateTime()
+    status = fields.Str(validate=validate.OneOf(GOAL_STATUSES))
+    parent_goal_id = fields.Int(allow_none=True)
+    milestones = fields.List(fields.Nested(MilestoneSchema), load_default=list)
+    reflections = fields.Dict(keys=fields.Str(), values=fields.Str(allow_none=True), load_default=dict)
+
+    @pre_load
+    def drop_non_list_milestones(self, data, **kwargs):
+        if isinstance(data, dict) and 'milestones' in data and not isinstance(data['milestones'], list):
+            data = dict(data)
+            del data['milestones']
+        return data
+
+    @post_load
+    def fill_default_dates(self, data, **kwargs):
+        """Replace unparseable dates: 3 months out for the goal, halfway there for milestones."""
+        now = datetime.utcnow()
+        if data['target_date'] is None:
+            data['target_date'] = now + timedelta(days=DEFAULT_GOAL_TARGET_DAYS)
+        for milestone in data['milestones']:
+            if 'target_date' in milestone and milestone['target_date'] is None:
+                milestone['target_date'] = now + (data['target_date'] - now) / 2
+        return data
+
+class SaveReflectionSchema(ActionSchema):
+    goal_id = fields.Int(allow_none=True)
+    reflection_type = fields.Str(required=True, validate=validate.Length(min=1))
+    content = fields.Str(required=True, validate=validate.Length(min=1))
+
+class ReflectionItemSchema(ActionSchema):
+    # Items without a type or content are skipped by the handler
+    type = fields.Str(allow_none=True)
+    content = fields.Str(allow_none=True)
+
+class SaveReflectionsSchema(ActionSchema):
+    goal_id = fields.Int(allow_none=True)
+    reflections = fields.List(fields.Nested(ReflectionItemSchema), required=True, validate=validate.Length(min=1))
+
+class UpdateProgressSchema(ActionSchema):
+    goal_id = fields.Int(allow_none=True)
+    progress_value = fields.Float(required=True)
+    notes = fields.Str(load_default='', allow_none=True)
+    type = fields.Str(load_default='progress', validate=validate.OneOf(PROGRESS_TYPES))
+
+class UpdateMilestoneSchema(ActionSchema):
+    goal_id = fields.Int(allow_none=True)
+    milestone_id = fields.Int(required=True)
+    status = fields.Str(validate=validate.OneOf(MILESTONE_STATUSES))
+    completion_status = fields.Float(validate=validate.Range(min=0, max=100))
+
+class UpdateGoalSchema(ActionSchema):
+    goal_id = fields.Int(allow_none=True)
+    title = fields.Str()
+    target_date = FlexibleDateTime()
+    status = fields.Str(validate=validate.OneOf(GOAL_STATUSES))
+    reflections = fields.Dict(keys=fields.Str(), values=fields.Str(allow_none=True))
@@ -0,0 +1,93 @@
+"""
+Deletion of a user's local data.
+
+delete_user_data() removes the rows a user owns with set-based DELETE
+statements on `goal_id IN (SELECT id FROM goals WHERE user_id = ?)` and
+similar subqueries, a chunk of ACCOUNT_DELETE_CHUNK_SIZE goals (or messages)
+per transaction. Each chunk commits on its own, so the write lock is held for
+a short time however much data the user has, and an interrupted deletion
+can simply be run again. The user row itself is left for the caller to
+delete once the Sensay user is gone too; a caller deleting the Sensay user
+at the same time passes keep_going to stop before the next chunk if that
+fails.
+"""
+
+import os
+import time
+import logging
+
+from sqlalchemy import select, delete, update
+
+from app import db
+from app.models import ChatMessage, Goal, Milestone, ProgressUpdate, Reflection, SystemUpdate, GoalContextSnapshot
+from app.metrics import metrics
+
+logger = logging.getLogger('strategist.accounts')
+
+# Goals (with their milestones, reflections and progress) or messages deleted per transaction
+ACCOUNT_DELETE_CHUNK_SIZE = int(os.environ.get('ACCOUNT_DELETE_CHUNK_SIZE', 200))
+
+def _delete_rows_in_chunks(model, condition, chunk_size, keep_going):
+    """Delete the rows of model matching condition, chunk_size rows per transaction."""
+    deleted = 0
+    while keep_going():
+        chunk = select(model.id).where(condition).limit(chunk_size).scalar_subquery()
+        count = db.session.execute(delete(model).where(model.id.in_(chunk)),
+                                   execution_options={'synchronize_session': False}).rowcount
+        db.session.commit()
+        deleted += count
+        if count < chunk_size:
+            break
+    return deleted
+
+def _delete_goals_in_chunks(user_id, chunk_size, keep_going):
+    """Delete the user's goals and their children, chunk_size goals per transaction."""
+    if not keep_going():
+        return 0
+
+    # Subgoals may sit in a later chunk than their parent goal
+    db.session.execute(update(Goal).where(Goal.user_id == user_id, Goal.parent_goal_id.isnot(None))
+                       .values(parent_goal_id=None), execution_options={'synchronize_session': False})
+    db.session.commit()
+
+    deleted = 0
+    while keep_going():
+        goal_ids = select(Goal.id).where(Goal.user_id == user_id).order_by(Goal.id).limit(chunk_size).scalar_subquery()
+        for model in (Reflection, ProgressUpdate, Milestone):
+            db.session.execute(delete(model).where(model.goal_id.in_(goal_ids)),
+                               execution_options={'synchronize_session': False})
+        count = db.session.execute(delete(Goal).where(Goal.id.in_(goal_ids)),
+                                   execution_options={'synchronize_session': False}).rowcount
+        db.session.commit()
+        deleted += count
+        if count < chunk_size:
+            break
+    return deleted
+
+def delete_user_data(user_id, chunk_size=None, keep_going=None):
+    """Delete the chat history, goals and queued updates of a user.
+
+    Args:
+        user_id: ID of the user whose data is deleted
+        chunk_size: Rows (goals for the goal tree) deleted per transaction
+        keep_going: Called before each chunk; deletion stops once it returns False
+
+    Returns:
+        dict: Number of deleted rows per kind
+    """
+    chunk_size = chunk_size or ACCOUNT_DELETE_CHUNK_SIZE
+    keep_going = keep_going or (lambda: True)
+    start = time.perf_counter()
+
+    deleted = {
+        'chat_messages': _delete_rows_in_chunks(ChatMessage, ChatMessage.user_id == user_id, chunk_size, keep_going),
+        'goals': _delete_goals_in_chunks(user_id, chunk_size, keep_going),
+        'system_updates': _delete_rows_in_chunks(SystemUpdate, SystemUpdate.user_id == user_id, chunk_size, keep_going),
+        'goal_context_snapshots': _delete_rows_in_chunks(
+            GoalContextSnapshot, GoalContextSnapshot.user_id == user_id, chunk_size, keep_going)
+    }
+
+    elapsed = time.perf_counter() - start
+    metrics.observe('accounts.delete_user_data', elapsed)
+    logger.info(f"Deleted data of user {user_id} in {elapsed:.2f}s: {deleted}")
+    return deleted
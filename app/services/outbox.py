@@ -0,0 +1,305 @@
+"""
+Transactional outbox for system updates sent to the user's replica.
+
+Mutation endpoints call enqueue_system_update() before committing, so the
+SYSTEM_UPDATE chat message and its outbox row are stored atomically with the
+change they describe and the request returns without waiting on Sensay. The
+outbox worker (`python app.py drain_outbox`) delivers pending rows with
+send_system_update(). Only the oldest pending row of each user is ever
+claimed, so updates reach the replica in the order they were made, and a row
+is marked sent only after Sensay has answered (at-least-once delivery).
+Failed deliveries are retried with exponential backoff and parked as
+'failed' after OUTBOX_MAX_ATTEMPTS.
+
+Updates are debounced per user: a user's updates are held until none has
+been queued for OUTBOX_COALESCE_WINDOW seconds (or the oldest has waited
+OUTBOX_COALESCE_MAX_DELAY), then everything pending is merged into a single
+digest SYSTEM_UPDATE and sent with one completion. Updates with the same
+coalesce_key (e.g. successive positions of a progress slider) collapse to
+the latest one.
+"""
+
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+from app import db
+from app.models import ChatMessage, SystemUpdate
+from app.metrics import metrics
+
+logger = logging.getLogger('strategist.outbox')
+
+# Outbox worker settings
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 20))
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', 4))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 1))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+OUTBOX_RETRY_DELAY = float(os.environ.get('OUTBOX_RETRY_DELAY', 5))  # Seconds, doubled after each failed attempt
+OUTBOX_RETRY_DELAY_MAX = float(os.environ.get('OUTBOX_RETRY_DELAY_MAX', 300))
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 600))  # Before a claimed row may be re-claimed
+OUTBOX_COALESCE_WINDOW = float(os.environ.get('OUTBOX_COALESCE_WINDOW', 3))  # Quiet seconds before a user's updates are sent
+OUTBOX_COALESCE_MAX_DELAY = float(os.environ.get('OUTBOX_COALESCE_MAX_DELAY', 30))
+OUTBOX_COALESCE_MAX_UPDATES = int(os.environ.get('OUTBOX_COALESCE_MAX_UPDATES', 20))  # Per digest
+OUTBOX_DIGEST_GOAL_CONTEXT = os.environ.get('OUTBOX_DIGEST_GOAL_CONTEXT', 'true').lower() == 'true'
+
+def enqueue_system_update(user_id, update_message, related_goal_id=None, save_message=True, coalesce_key=None):
+    """Queue a system update for the user's replica in the current transaction.
+
+    The caller commits. Nothing is sent to Sensay until the outbox worker
+    picks the row up.
+
+    Args:
+        user_id (int): The ID of the user
+        update_message (str): The system update message (without the prefix)
+        related_goal_id (int, optional): The ID of the related goal if applicable
+        save_message (bool, optional): Whether to save the system message in chat history
+        coalesce_key (str, optional): Updates with the same key replace each other in a digest,
+                                      e.g. "goal:3:progress" for a goal's progress value
+
+    Returns:
+        SystemUpdate: The pending outbox row
+    """
+    if save_message:
+        # Import here to avoid circular imports
+        from app.api.chat import SYSTEM_UPDATE_PREFIX
+        
+        db.session.add(ChatMessage(
+            user_id=user_id,
+            sender='system',
+            content=f"{SYSTEM_UPDATE_PREFIX} {update_message}",
+            related_goal_id=related_goal_id
+        ))
+
+    update = SystemUpdate(
+        user_id=user_id,
+        update_message=update_message,
+        related_goal_id=related_goal_id,
+        coalesce_key=coalesce_key
+    )
+    db.session.add(update)
+    logger.debug(f"Queued system update for user {user_id}: {update_message}")
+    return update
+
+def claim_system_updates(limit=None):
+    """Claim the next deliverable update of up to `limit` users.
+
+    A row is deliverable when it is the user's oldest pending update, the
+    user's coalescing window has closed, its retry delay has passed and no
+    other worker holds a live lease on it. Claiming sets a lease and counts
+    the attempt with a conditional UPDATE, so concurrent workers never
+    deliver the same row twice.
+
+    Returns:
+        List of claimed SystemUpdate IDs
+    """
+    limit = limit or OUTBOX_BATCH_SIZE
+    now = datetime.utcnow()
+    quiet_since = now - timedelta(seconds=OUTBOX_COALESCE_WINDOW)
+    waiting_since = now - timedelta(seconds=OUTBOX_COALESCE_MAX_DELAY)
+
+    heads = db.session.query(func.min(SystemUpdate.id)).filter(
+        SystemUpdate.status == 'pending'
+    ).group_by(SystemUpdate.user_id).having(db.or_(
+        func.max(SystemUpdate.created_at) <= quiet_since,
+        func.min(SystemUpdate.created_at) <= waiting_since
+    ))
+
+    candidates = [row.id for row in db.session.query(SystemUpdate.id).filter(
+        SystemUpdate.id.in_(heads),
+        SystemUpdate.available_at <= now,
+        db.or_(SystemUpdate.locked_until.is_(None), SystemUpdate.locked_until < now)
+    ).order_by(SystemUpdate.id).limit(limit)]
+
+    claimed = []
+    for update_id in candidates:
+        count = SystemUpdate.query.filter(
+            SystemUpdate.id == update_id,
+            SystemUpdate.status == 'pending',
+            db.or_(SystemUpdate.locked_until.is_(None), SystemUpdate.locked_until < now)
+        ).update({
+            SystemUpdate.locked_until: now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+            SystemUpdate.attempts: SystemUpdate.attempts + 1
+        }, synchronize_session=False)
+        if count == 1:
+            claimed.append(update_id)
+    db.session.commit()
+
+    return claimed
+
+def build_digest(updates):
+    """Merge a user's pending updates into a single system update.
+
+    Args:
+        updates: Pending SystemUpdate rows of one user, oldest first
+
+    Returns:
+        Tuple of (update_message, related_goal_id, context_goal_ids)
+    """
+    # Keep only the latest update for each coalesce key
+    latest = {update.coalesce_key: update.id for update in updates if update.coalesce_key}
+    kept = [update for update in updates if not update.coalesce_key or latest[update.coalesce_key] == update.id]
+
+    goal_ids = []
+    for update in kept:
+        if update.related_goal_id and update.related_goal_id not in goal_ids:
+            goal_ids.append(update.related_goal_id)
+
+    if len(kept) == 1:
+        return kept[0].update_message, kept[0].related_goal_id, None
+
+    update_message = f"User made {len(kept)} changes: " + "; ".join(
+        f"({number}) {update.update_message}" for number, update in enumerate(kept, 1)
+    )
+    related_goal_id = goal_ids[0] if len(goal_ids) == 1 else None
+    context_goal_ids = goal_ids if OUTBOX_DIGEST_GOAL_CONTEXT else []
+
+    return update_message, related_goal_id, context_goal_ids
+
+def deliver_system_update(update_id):
+    """Send a claimed outbox row, merged with the user's later pending rows, to the replica.
+
+    Returns:
+        True if the update was delivered
+    """
+    # Import here to avoid circular imports
+    from app.api.chat import send_system_update
+
+    head = SystemUpdate.query.get(update_id)
+    if not head or head.status != 'pending':
+        return False
+
+    updates = SystemUpdate.query.filter(
+        SystemUpdate.user_id == head.user_id,
+        SystemUpdate.status == 'pending',
+        SystemUpdate.id >= head.id
+    ).order_by(SystemUpdate.id).limit(OUTBOX_COALESCE_MAX_UPDATES).all()
+    update_ids = [update.id for update in updates]
+    user_id = head.user_id
+    update_message, related_goal_id, context_goal_ids = build_digest(updates)
+
+    start = time.monotonic()
+    try:
+        # The chat messages were saved when the updates were queued
+        result = send_system_update(user_id, update_message, related_goal_id, save_message=False,
+                                    context_goal_ids=context_goal_ids)
+        error = None if result else 'System update was not delivered'
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Unexpected error delivering system update {update_id}: {str(e)}", exc_info=True)
+        result, error = None, str(e)
+    metrics.observe("outbox.delivery_seconds", time.monotonic() - start)
+
+    head = SystemUpdate.query.get(update_id)
+    if not head:
+        # User deleted while the update was in flight
+        return False
+
+    head.locked_until = None
+    if result:
+        now = datetime.utcnow()
+        head.status = 'sent'
+        head.sent_at = now
+        head.last_error = None
+        if len(update_ids) > 1:
+            SystemUpdate.query.filter(
+                SystemUpdate.id.in_(update_ids[1:]),
+                SystemUpdate.status == 'pending'
+            ).update({SystemUpdate.status: 'coalesced', SystemUpdate.sent_at: now}, synchronize_session=False)
+        metrics.incr("outbox.sent")
+        metrics.incr("outbox.completions_saved", len(update_ids) - 1)
+        logger.info(f"Delivered {len(update_ids)} system update(s) from {update_id} for user {user_id} "
+                    f"(attempt {head.attempts})")
+    elif head.attempts >= OUTBOX_MAX_ATTEMPTS:
+        SystemUpdate.query.filter(
+            SystemUpdate.id.in_(update_ids),
+            SystemUpdate.status == 'pending'
+        ).update({SystemUpdate.status: 'failed', SystemUpdate.last_error: error}, synchronize_session=False)
+        metrics.incr("outbox.failed", len(update_ids))
+        logger.error(f"Giving up on {len(update_ids)} system update(s) from {update_id} for user {user_id} "
+                     f"after {head.attempts} attempts: {error}")
+    else:
+        delay = min(OUTBOX_RETRY_DELAY * 2 ** (head.attempts - 1), OUTBOX_RETRY_DELAY_MAX)
+        head.available_at = datetime.utcnow() + timedelta(seconds=delay)
+        head.last_error = error
+        metrics.incr("outbox.retries")
+        logger.warning(f"System update {update_id} for user {user_id} failed, retrying in {delay:.0f}s: {error}")
+    db.session.commit()
+
+    return bool(result)
+
+def _deliver_in_app_context(app, update_id):
+    with app.app_context():
+        try:
+            return deliver_system_update(update_id)
+        finally:
+            db.session.remove()
+
+def drain_outbox(app, batch_size=None, workers=None):
+    """Claim one batch of system updates and deliver them concurrently.
+
+    Each claimed row belongs to a different user, so delivering the batch in
+    parallel keeps the per-user order.
+
+    Args:
+        app: Flask application, used to push an app context in worker threads
+        batch_size: Maximum rows to claim. Defaults to OUTBOX_BATCH_SIZE.
+        workers: Maximum concurrent deliveries. Defaults to OUTBOX_WORKERS.
+
+    Returns:
+        Number of rows claimed
+    """
+    with app.app_context():
+        try:
+            claimed = claim_system_updates(batch_size)
+        finally:
+            db.session.remove()
+
+    if not claimed:
+        return 0
+
+    logger.debug(f"Claimed {len(claimed)} system updates")
+    with ThreadPoolExecutor(max_workers=min(workers or OUTBOX_WORKERS, len(claimed)),
+                            thread_name_prefix='outbox') as executor:
+        list(executor.map(lambda update_id: _deliver_in_app_context(app, update_id), claimed))
+
+    return len(claimed)
+
+def run_outbox_worker(app, once=False, batch_size=None, workers=None, poll_interval=None):
+    """Deliver system updates until interrupted.
+
+    Args:
+        app: Flask application
+        once: Stop as soon as there is nothing left to claim
+        batch_size: Maximum rows to claim per batch
+        workers: Maximum concurrent deliveries
+        poll_interval: Seconds to sleep when the outbox is empty. Defaults to OUTBOX_POLL_INTERVAL.
+
+    Returns:
+        Total number of rows processed
+    """
+    poll_interval = OUTBOX_POLL_INTERVAL if poll_interval is None else poll_interval
+    processed = 0
+
+    logger.info("Outbox worker started")
+    while True:
+        count = drain_outbox(app, batch_size, workers)
+        processed += count
+        if count == 0:
+            if once:
+                break
+            time.sleep(poll_interval)
+    logger.info(f"Outbox worker stopped after {processed} deliveries")
+
+    return processed
+
+def get_outbox_stats():
+    """Return the number of outbox rows per status.
+
+    The 'coalesced' count is the number of completions saved by digests.
+    """
+    rows = db.session.query(SystemUpdate.status, func.count(SystemUpdate.id)).group_by(SystemUpdate.status).all()
+    return {status: count for status, count in rows}
@@ -0,0 +1,272 @@
+"""
+Background provisioning of Sensay users and replicas for new accounts.
+
+Registration only commits the local user and a pending ProvisioningJob, then
+hands the slow Sensay work (create the Sensay user, create and train the
+replica, send the initial "Hello") to a thread pool. The job row tracks
+progress so any worker can report status, and chat endpoints call
+wait_for_provisioning() to wait on a running job or run one that is pending.
+
+A failed job is retried in the background, after an exponential backoff
+(PROVISIONING_RETRY_BACKOFF seconds, doubled after every failed attempt),
+until it has been attempted PROVISIONING_MAX_ATTEMPTS times. The job's
+next_attempt_at records when the next retry is due, or None once no retry
+is left, so chat turns never block on a retry.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import User, ProvisioningJob
+from app.services.sensay import get_sensay_client
+
+logger = logging.getLogger('strategist.provisioning')
+
+# Provisioning settings
+PROVISIONING_WORKERS = int(os.environ.get('PROVISIONING_WORKERS', 4))
+PROVISIONING_WAIT_TIMEOUT = float(os.environ.get('PROVISIONING_WAIT_TIMEOUT', 60))
+PROVISIONING_STALE_AFTER = int(os.environ.get('PROVISIONING_STALE_AFTER', 300))  # Seconds before a running job is presumed dead
+PROVISIONING_MAX_ATTEMPTS = int(os.environ.get('PROVISIONING_MAX_ATTEMPTS', 5))
+PROVISIONING_RETRY_BACKOFF = float(os.environ.get('PROVISIONING_RETRY_BACKOFF', 30))  # Seconds before the first retry, doubled after each failure
+PROVISIONING_POLL_INTERVAL = 0.5
+
+_executor = None
+_executor_lock = threading.Lock()
+_futures_lock = threading.Lock()
+_futures = {}  # user_id -> Future for jobs submitted by this process
+_running = threading.local()  # Marks the user being provisioned on the current thread
+
+def _get_executor():
+    """Return the process-wide provisioning thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PROVISIONING_WORKERS,
+                                               thread_name_prefix='provisioning')
+    return _executor
+
+def create_provisioning_job(user):
+    """Add a pending provisioning job for a new user to the session (not committed)."""
+    job = ProvisioningJob(user=user, status='pending')
+    db.session.add(job)
+    return job
+
+def submit_provisioning(app, user_id):
+    """Run the user's provisioning job in the background.
+
+    Args:
+        app: Flask application, used to push an app context in the worker thread
+        user_id: ID of the user to provision
+
+    Returns:
+        Future for the job
+    """
+    with _futures_lock:
+        future = _futures.get(user_id)
+        if future is not None and not future.done():
+            return future
+        future = _get_executor().submit(_run_in_app_context, app, user_id)
+        _futures[user_id] = future
+
+    future.add_done_callback(lambda f: _forget_future(user_id, f))
+    logger.info(f"Submitted provisioning job for user: {user_id}")
+    return future
+
+def _forget_future(user_id, future):
+    with _futures_lock:
+        if _futures.get(user_id) is future:
+            del _futures[user_id]
+
+def _run_in_app_context(app, user_id):
+    with app.app_context():
+        try:
+            return run_provisioning(user_id)
+        finally:
+            db.session.remove()
+
+def _claim_job(user_id):
+    """Atomically mark a pending, stale or failed job that is due for a retry as running.
+
+    Returns:
+        True if this caller now owns the job
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=PROVISIONING_STALE_AFTER)
+    claimed = ProvisioningJob.query.filter(
+        ProvisioningJob.user_id == user_id,
+        db.or_(
+            ProvisioningJob.status == 'pending',
+            db.and_(ProvisioningJob.status == 'failed',
+                    ProvisioningJob.attempts < PROVISIONING_MAX_ATTEMPTS,
+                    ProvisioningJob.next_attempt_at <= now),
+            db.and_(ProvisioningJob.status == 'running', ProvisioningJob.started_at < stale_before)
+        )
+    ).update({
+        ProvisioningJob.status: 'running',
+        ProvisioningJob.started_at: now,
+        ProvisioningJob.attempts: ProvisioningJob.attempts + 1,
+        ProvisioningJob.error: None,
+        ProvisioningJob.next_attempt_at: None
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def _finish_job(user_id, status, error=None):
+    job = ProvisioningJob.query.filter_by(user_id=user_id).first()
+    if job:
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        job.next_attempt_at = None
+        if status == 'failed' and job.attempts < PROVISIONING_MAX_ATTEMPTS:
+            job.next_attempt_at = job.finished_at + timedelta(seconds=retry_backoff(job.attempts))
+        db.session.commit()
+
+def retry_backoff(attempts):
+    """Seconds to wait before retrying a job that has failed the given number of attempts."""
+    return PROVISIONING_RETRY_BACKOFF * 2 ** (max(attempts, 1) - 1)
+
+def run_provisioning(user_id):
+    """Provision the Sensay user and replica for a local user.
+
+    Does nothing if another thread or process already owns the job.
+
+    Returns:
+        The job status after this call
+    """
+    if not _claim_job(user_id):
+        job = _job_state(user_id)
+        return job.status if job else None
+
+    # Import here to avoid circular imports
+    from app.api.chat import ensure_replica_exists, send_system_update
+
+    start = time.monotonic()
+    _running.user_id = user_id
+    try:
+        user = User.query.get(user_id)
+        if not user:
+            raise ValueError(f"User not found: {user_id}")
+
+        sensay_client = get_sensay_client()
+
+        # Check if Sensay user exists
+        try:
+            logger.debug(f"Checking if Sensay user exists: {user.sensay_user_id}")
+            sensay_client.get_user(user.sensay_user_id)
+            logger.info(f"Sensay user already exists: {user.sensay_user_id}")
+        except Exception:
+            logger.info(f"Creating new Sensay user: {user.sensay_user_id}")
+            sensay_client.create_user({
+                'id': user.sensay_user_id,
+                'email': user.email,
+                'name': user.username
+            })
+            logger.info(f"Successfully created Sensay user: {user.sensay_user_id}")
+
+        replica_id = ensure_replica_exists(sensay_client, user.sensay_user_id)
+        logger.info(f"Created new replica with ID: {replica_id} for user: {user.username}")
+
+        # Send an initial hello message to the replica
+        send_system_update(user.id, "Hello", save_message=True)
+        logger.info(f"Sent initial hello message to replica for user: {user.username}")
+
+        _finish_job(user_id, 'completed')
+        logger.info(f"Provisioning completed for user {user_id} in {time.monotonic() - start:.2f}s")
+        return 'completed'
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Provisioning failed for user {user_id}: {str(e)}", exc_info=True)
+        _finish_job(user_id, 'failed', str(e))
+        return 'failed'
+    finally:
+        _running.user_id = None
+
+def get_provisioning_status(user_id):
+    """Return the user's provisioning job as a dictionary, or None if there is none."""
+    job = ProvisioningJob.query.filter_by(user_id=user_id).first()
+    return job.to_dict() if job else None
+
+def wait_for_provisioning(user_id, timeout=None):
+    """Make sure the user's provisioning job has finished before chatting.
+
+    Waits on a job running in this process, polls one running elsewhere, and
+    runs a pending job inline. A failed job is handed to the background pool
+    once its retry is due and never run inline. Users registered before
+    background provisioning have no job and are treated as provisioned.
+
+    Args:
+        user_id: ID of the user
+        timeout: Maximum seconds to wait for a running job. Defaults to PROVISIONING_WAIT_TIMEOUT.
+
+    Returns:
+        The job status, or None if the user has no job
+    """
+    if getattr(_running, 'user_id', None) == user_id:
+        # Called from inside this user's own provisioning job
+        return 'running'
+
+    timeout = PROVISIONING_WAIT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    waited = False
+
+    with _futures_lock:
+        future = _futures.get(user_id)
+    if future is not None and not future.done():
+        waited = True
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.warning(f"Timed out waiting for provisioning job of user: {user_id}")
+
+    while True:
+        job = _job_state(user_id)
+        if not job or job.status == 'completed':
+            if waited:
+                # The job stored the replica ID after the caller loaded the user
+                _expire_user(user_id)
+            return job.status if job else None
+        if job.status == 'pending':
+            logger.info(f"Running pending provisioning job inline for user: {user_id}")
+            return run_provisioning(user_id)
+        if job.status == 'failed':
+            if job.next_attempt_at is not None and job.next_attempt_at <= datetime.utcnow():
+                logger.info(f"Retrying failed provisioning job in the background for user: {user_id}")
+                submit_provisioning(current_app._get_current_object(), user_id)
+            return job.status
+        if time.monotonic() >= deadline:
+            logger.warning(f"Provisioning still running for user {user_id}, continuing without it")
+            return job.status
+        # Running in another worker: wait for it, or take over once it goes stale
+        if job.started_at and datetime.utcnow() - job.started_at > timedelta(seconds=PROVISIONING_STALE_AFTER):
+            return run_provisioning(user_id)
+        waited = True
+        time.sleep(PROVISIONING_POLL_INTERVAL)
+
+def _job_state(user_id):
+    """Read the status, start time and next retry of a user's job from the database.
+
+    A column query bypasses the identity map, so it sees changes made by
+    other threads and workers without expiring the session.
+    """
+    return db.session.execute(
+        select(ProvisioningJob.status, ProvisioningJob.started_at, ProvisioningJob.next_attempt_at).where(ProvisioningJob.user_id == user_id)
+    ).first()
+
+def _expire_user(user_id):
+    """Reload the user and its job on next access, if the session already holds them."""
+    user = db.session.identity_map.get(db.session.identity_key(User, int(user_id)))
+    if user is not None:
+        db.session.expire(user)
+    for instance in list(db.session.identity_map.values()):
+        if isinstance(instance, ProvisioningJob) and instance.user_id == int(user_id):
+            db.session.expire(instance)
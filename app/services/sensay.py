@@ -1,27 +1,248 @@
 import os
+import re
+import time
+import random
+import threading
 import requests
 import json
 import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from app.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Connection pool settings (per worker process)
+SENSAY_POOL_SIZE = int(os.environ.get('SENSAY_POOL_SIZE', 10))
+SENSAY_CONNECT_TIMEOUT = float(os.environ.get('SENSAY_CONNECT_TIMEOUT', 5))
+SENSAY_READ_TIMEOUT = float(os.environ.get('SENSAY_READ_TIMEOUT', 120))
+
+# Knowledge base upload settings
+SENSAY_TRAINING_CONCURRENCY = int(os.environ.get('SENSAY_TRAINING_CONCURRENCY', 8))
+SENSAY_TRAINING_RETRIES = int(os.environ.get('SENSAY_TRAINING_RETRIES', 2))
+TRAINING_RETRY_DELAY = 0.5  # Seconds before the first retry, doubled on each attempt
+
+# Retry and circuit breaker settings
+SENSAY_MAX_RETRIES = int(os.environ.get('SENSAY_MAX_RETRIES', 3))
+SENSAY_BACKOFF_BASE = float(os.environ.get('SENSAY_BACKOFF_BASE', 0.5))
+SENSAY_BACKOFF_MAX = float(os.environ.get('SENSAY_BACKOFF_MAX', 8))
+SENSAY_BREAKER_THRESHOLD = int(os.environ.get('SENSAY_BREAKER_THRESHOLD', 5))
+SENSAY_BREAKER_RESET_TIMEOUT = float(os.environ.get('SENSAY_BREAKER_RESET_TIMEOUT', 30))
+
+# Only these methods are retried; a repeated POST could create duplicates
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Fixed path segments that sit where an ID would in Sensay paths
+STATIC_PATH_SEGMENTS = {'completions', 'upload-url'}
+
+# Process-wide pooled session and shared client
+_session = None
+_session_lock = threading.Lock()
+_client = None
+_client_lock = threading.Lock()
+
+def get_http_session(pool_size: int = None) -> requests.Session:
+    """Return the process-wide pooled HTTP session used for Sensay calls.
+    
+    The session keeps connections alive between requests so repeated calls
+    skip the TCP and TLS handshake. It is created lazily on first use, which
+    keeps it out of the gunicorn master when the app is preloaded.
+    
+    Args:
+        pool_size: Maximum number of pooled connections per host. Only used
+            when the session is first created.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                size = pool_size or SENSAY_POOL_SIZE
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+                logger.info(f"Created pooled Sensay HTTP session (pool size: {size})")
+    return _session
+
 class SensayAPIError(Exception):
     """Exception raised for Sensay API errors."""
-    def __init__(self, status_code, message):
+    def __init__(self, status_code, message, retry_after=None):
         self.status_code = status_code
         self.message = message
+        self.retry_after = retry_after  # Seconds from a Retry-After header, if any
         super().__init__(f"Sensay API Error ({status_code}): {message}")
 
+class SensayConnectionError(SensayAPIError):
+    """Raised when no connection to Sensay could be made, so the request was never sent."""
+    def __init__(self, message):
+        super().__init__(500, message)
+
+class CircuitOpenError(SensayAPIError):
+    """Raised without calling Sensay while an endpoint's circuit breaker is open."""
+    def __init__(self, endpoint_key, retry_after=None):
+        super().__init__(503, f"Circuit breaker open for {endpoint_key}", retry_after)
+        self.endpoint_key = endpoint_key
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker.
+    
+    After `threshold` consecutive failures the breaker opens and calls fail
+    fast with CircuitOpenError. Once `reset_timeout` seconds have passed a
+    single probe call is let through (half-open); its outcome closes or
+    re-opens the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, key: str, threshold: int = None, reset_timeout: float = None):
+        self.key = key
+        self.threshold = threshold or SENSAY_BREAKER_THRESHOLD
+        self.reset_timeout = reset_timeout if reset_timeout is not None else SENSAY_BREAKER_RESET_TIMEOUT
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+        metrics.set_gauge(f"sensay.breaker_state[{key}]", self.state)
+    
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit breaker for {self.key}: {self.state} -> {state}")
+            self.state = state
+            metrics.set_gauge(f"sensay.breaker_state[{self.key}]", state)
+    
+    def before_request(self):
+        """Raise CircuitOpenError if the call should not be attempted."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0:
+                # Let this call through as the probe. Restarting the timer means a
+                # probe that never reports back is replaced after another timeout.
+                self.opened_at = time.monotonic()
+                self._set_state(self.HALF_OPEN)
+                return
+        metrics.incr(f"sensay.breaker_rejections[{self.key}]")
+        raise CircuitOpenError(self.key, retry_after=max(remaining, 0))
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._set_state(self.CLOSED)
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+                metrics.incr(f"sensay.breaker_trips[{self.key}]")
+
+class RetryPolicy:
+    """Jittered exponential backoff for idempotent Sensay calls."""
+    
+    def __init__(self, max_retries: int = None, backoff_base: float = None, backoff_max: float = None):
+        self.max_retries = SENSAY_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = SENSAY_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = SENSAY_BACKOFF_MAX if backoff_max is None else backoff_max
+    
+    def next_delay(self, method: str, error: SensayAPIError, attempt: int) -> Optional[float]:
+        """Return seconds to wait before retrying, or None to give up.
+        
+        Args:
+            method: HTTP method of the failed call
+            error: The error raised by the call
+            attempt: Number of retries already made
+        """
+        if method.upper() not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+            return None
+        if isinstance(error, CircuitOpenError) or error.status_code not in RETRYABLE_STATUS_CODES:
+            return None
+        if error.retry_after is not None:
+            # Honor the server's hint, but don't hold a worker longer than our own cap
+            return error.retry_after if error.retry_after <= self.backoff_max else None
+        # Full jitter: uniform between 0 and the exponential ceiling
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+# Breakers are shared by every client in the process
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(endpoint_key: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for an endpoint."""
+    breaker = _breakers.get(endpoint_key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(endpoint_key)
+            if breaker is None:
+                breaker = _breakers[endpoint_key] = CircuitBreaker(endpoint_key)
+    return breaker
+
+def get_circuit_breaker_states() -> Dict[str, str]:
+    """Return the current state of every circuit breaker."""
+    return {key: breaker.state for key, breaker in list(_breakers.items())}
+
+def reset_circuit_breakers():
+    """Forget all circuit breaker state."""
+    with _breakers_lock:
+        _breakers.clear()
+
+def endpoint_key(method: str, endpoint: str) -> str:
+    """Group calls per endpoint by replacing path IDs with {id}.
+    
+    Sensay paths alternate collection names and IDs after the version
+    segment (/v1/replicas/<id>/training/<id>), so every second segment is
+    treated as an ID unless it is a known fixed path segment.
+    """
+    segments = endpoint.split('?')[0].strip('/').split('/')
+    normalized = [
+        segment if index % 2 == 1 or index == 0 or segment in STATIC_PATH_SEGMENTS else '{id}'
+        for index, segment in enumerate(segments)
+    ]
+    return f"{method.upper()} /{'/'.join(normalized)}"
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if re.fullmatch(r'\d+(\.\d+)?', value):
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def _is_breaker_failure(error: SensayAPIError) -> bool:
+    """Only server-side trouble counts against the breaker, not 4xx client errors."""
+    return error.status_code in RETRYABLE_STATUS_CODES
+
 class SensayAPI:
     """Python client for the Sensay AI API."""
     
-    def __init__(self, api_key: str = None, base_url: str = "https://api.sensay.io"):
+    def __init__(self, api_key: str = None, base_url: str = "https://api.sensay.io",
+                 session: requests.Session = None, connect_timeout: float = None,
+                 read_timeout: float = None, retry_policy: RetryPolicy = None):
         """Initialize the Sensay API client.
         
         Args:
             api_key: Sensay API key. If None, will try to load from environment variable.
             base_url: Base URL for the Sensay API.
+            session: HTTP session to send requests with. Defaults to the process-wide pooled session.
+            connect_timeout: Seconds to wait for a connection. Defaults to SENSAY_CONNECT_TIMEOUT.
+            read_timeout: Seconds to wait for a response. Defaults to SENSAY_READ_TIMEOUT.
+            retry_policy: Backoff policy for idempotent calls. Defaults to RetryPolicy().
         """
         self.api_key = api_key or os.environ.get("SENSAY_API_KEY")
         if not self.api_key:
@@ -32,11 +253,24 @@ class SensayAPI:
             "X-ORGANIZATION-SECRET": self.api_key,
             "Content-Type": "application/json"
         }
+        self.session = session if session is not None else self._default_session()
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else SENSAY_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else SENSAY_READ_TIMEOUT
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+    
+    def _default_session(self):
+        """Return the HTTP session used when none is passed in."""
+        return get_http_session()
     
     def _make_request(self, method: str, endpoint: str, data: Dict = None, params: Dict = None, 
                       user_id: str = None, headers: Dict = None) -> Dict:
         """Make an HTTP request to the Sensay API.
         
+        Idempotent calls that fail with 429/5xx are retried with jittered
+        backoff, and every call passes through its endpoint's circuit breaker.
+        
         Args:
             method: HTTP method (GET, POST, PUT, DELETE)
             endpoint: API endpoint path
@@ -48,6 +282,73 @@ class SensayAPI:
         Returns:
             Response data as dictionary
         """
+        url, request_headers = self._prepare_request(method, endpoint, data, params, user_id, headers)
+        key = endpoint_key(method, endpoint)
+        breaker = get_circuit_breaker(key)
+        attempt = 0
+        
+        while True:
+            try:
+                breaker.before_request()
+                result = self._send_request(method, url, request_headers, params, data)
+            except SensayAPIError as e:
+                delay = self._on_request_error(method, key, breaker, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            
+            breaker.record_success()
+            return result
+    
+    def _send_request(self, method: str, url: str, headers: Dict, params: Dict = None, data: Dict = None) -> Dict:
+        """Send a single HTTP request and return the parsed response."""
+        metrics.incr("sensay.requests")
+        try:
+            response = self.session.request(
+                method=method,
+                url=url,
+                headers=headers,
+                params=params,
+                json=data,
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            logger.error(f"Request error: {str(e)}")
+            if _is_connect_failure(e):
+                raise SensayConnectionError(str(e))
+            raise SensayAPIError(500, str(e))
+        
+        return self._handle_response(response)
+    
+    def _on_request_error(self, method: str, key: str, breaker: CircuitBreaker,
+                          error: SensayAPIError, attempt: int) -> Optional[float]:
+        """Update breaker state and metrics for a failed call.
+        
+        Returns:
+            Seconds to wait before retrying, or None if the error should be raised
+        """
+        if not isinstance(error, CircuitOpenError):
+            if _is_breaker_failure(error):
+                metrics.incr(f"sensay.failures[{key}]")
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        
+        delay = self.retry_policy.next_delay(method, error, attempt)
+        if delay is not None:
+            metrics.incr(f"sensay.retries[{key}]")
+            logger.warning(f"Retrying {key} in {delay:.2f}s after error: {error} (retry {attempt + 1})")
+        return delay
+    
+    def _prepare_request(self, method: str, endpoint: str, data: Dict = None, params: Dict = None,
+                         user_id: str = None, headers: Dict = None):
+        """Build the URL and headers for a request and log its details.
+        
+        Returns:
+            Tuple of (url, request_headers)
+        """
         url = f"{self.base_url}{endpoint}"
         request_headers = self.headers.copy()
         
@@ -74,42 +375,40 @@ class SensayAPI:
                 logger.debug(f"Request Body: {data_str}")
         logger.debug(f"========================")
         
-        try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=request_headers,
-                params=params,
-                json=data
+        return url, request_headers
+    
+    def _handle_response(self, response) -> Dict:
+        """Log a response and return its JSON body, raising SensayAPIError on errors.
+        
+        Works with both requests and httpx responses.
+        """
+        # Log the raw response details
+        logger.debug(f"=== SENSAY API RESPONSE ===")
+        logger.debug(f"Status Code: {response.status_code}")
+        logger.debug(f"Response Headers: {dict(response.headers)}")
+        logger.debug(f"Response Body: {response.text}")
+        logger.debug(f"===========================")
+        
+        # Check for error responses
+        if response.status_code >= 400:
+            error_message = response.text
+            try:
+                error_data = response.json()
+                if "message" in error_data:
+                    error_message = error_data["message"]
+            except:
+                pass
+            logger.error(f"API Error - Status: {response.status_code}, Message: {error_message}")
+            raise SensayAPIError(
+                response.status_code,
+                error_message,
+                retry_after=_parse_retry_after(response.headers.get("Retry-After"))
             )
-            
-            # Log the raw response details
-            logger.debug(f"=== SENSAY API RESPONSE ===")
-            logger.debug(f"Status Code: {response.status_code}")
-            logger.debug(f"Response Headers: {dict(response.headers)}")
-            logger.debug(f"Response Body: {response.text}")
-            logger.debug(f"===========================")
-            
-            # Check for error responses
-            if response.status_code >= 400:
-                error_message = response.text
-                try:
-                    error_data = response.json()
-                    if "message" in error_data:
-                        error_message = error_data["message"]
-                except:
-                    pass
-                logger.error(f"API Error - Status: {response.status_code}, Message: {error_message}")
-                raise SensayAPIError(response.status_code, error_message)
-            
-            # Return successful response data
-            if response.text:
-                return response.json()
-            return {}
-            
-        except requests.RequestException as e:
-            logger.error(f"Request error: {str(e)}")
-            raise SensayAPIError(500, str(e))
+        
+        # Return successful response data
+        if response.text:
+            return response.json()
+        return {}
     
     # User Management
     
@@ -429,45 +728,158 @@ class SensayAPI:
             headers=headers
         )
         
-    def train_replica_with_knowledge_base(self, user_id: str, replica_id: str, entries: List[Dict]) -> List[Dict]:
-        """Train a replica with knowledge base entries.
+    def _knowledge_base_entry_data(self, entry: Dict) -> Dict:
+        """Convert a local knowledge base entry into the training API payload."""
+        return {
+            "rawText": entry.get("content", ""),
+            "processedText": entry.get("content", ""),
+            "metadata": {
+                "title": entry.get("title", "Untitled Entry"),
+                "description": entry.get("description", ""),
+                "tags": entry.get("tags", [])
+            }
+        }
+    
+    def upload_knowledge_base_entries(self, user_id: str, replica_id: str, entries: List[Dict],
+                                      max_workers: int = None, max_retries: int = None) -> List[Dict]:
+        """Upload knowledge base entries in parallel with a bounded number of workers.
         
         Args:
             user_id: Sensay user ID
             replica_id: Replica ID to train
             entries: List of dictionaries containing knowledge base entry data
+            max_workers: Maximum concurrent uploads. Defaults to SENSAY_TRAINING_CONCURRENCY.
+            max_retries: Retries per entry after the first attempt. Defaults to SENSAY_TRAINING_RETRIES.
                 
         Returns:
-            List of created knowledge base entry details
+            One report per entry, in input order, with keys: title, success,
+            attempts, elapsed (seconds), result (created entry or None) and
+            error (message or None)
         """
-        logger.info(f"Training replica {replica_id} with {len(entries)} knowledge base entries")
-        created_entries = []
+        if not entries:
+            return []
+        
+        max_workers = max_workers or SENSAY_TRAINING_CONCURRENCY
+        max_retries = SENSAY_TRAINING_RETRIES if max_retries is None else max_retries
         
-        for entry in entries:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(entries)),
+                                thread_name_prefix='sensay-training') as executor:
+            return list(executor.map(
+                lambda entry: self._upload_knowledge_base_entry(user_id, replica_id, entry, max_retries),
+                entries
+            ))
+    
+    def _upload_knowledge_base_entry(self, user_id: str, replica_id: str, entry: Dict, max_retries: int) -> Dict:
+        """Upload a single knowledge base entry, retrying transient failures."""
+        title = entry.get("title", "Untitled Entry")
+        entry_data = self._knowledge_base_entry_data(entry)
+        start = time.monotonic()
+        error = None
+        
+        for attempt in range(1, max_retries + 2):
             try:
-                # Prepare entry data in the format expected by the API
-                entry_data = {
-                    "rawText": entry.get("content", ""),
-                    "processedText": entry.get("content", ""),
-                    "metadata": {
-                        "title": entry.get("title", "Untitled Entry"),
-                        "description": entry.get("description", ""),
-                        "tags": entry.get("tags", [])
-                    }
-                }
-                
-                # Create knowledge base entry
                 result = self.create_knowledge_base_entry(user_id, replica_id, entry_data)
-                created_entries.append(result)
-                logger.debug(f"Created knowledge base entry for: {entry.get('title')}")
+                logger.debug(f"Created knowledge base entry for: {title} (attempt {attempt})")
+                return self._training_report(title, start, attempt, result=result)
             except Exception as e:
-                logger.error(f"Error creating knowledge base entry: {str(e)}")
-                # Continue with other entries even if one fails
+                error = str(e)
+                if not _is_retryable_training_error(e) or attempt > max_retries:
+                    break
+                logger.warning(f"Retrying knowledge base entry '{title}' after error: {error}")
+                time.sleep(TRAINING_RETRY_DELAY * 2 ** (attempt - 1))
+        
+        logger.error(f"Error creating knowledge base entry '{title}': {error}")
+        return self._training_report(title, start, attempt, error=error)
+    
+    def _training_report(self, title: str, start: float, attempts: int, result: Dict = None,
+                         error: str = None) -> Dict:
+        """Build the per-entry report returned by upload_knowledge_base_entries."""
+        return {
+            "title": title,
+            "success": error is None,
+            "attempts": attempts,
+            "elapsed": round(time.monotonic() - start, 3),
+            "result": result,
+            "error": error
+        }
+    
+    def _log_training_report(self, replica_id: str, report: List[Dict], elapsed: float):
+        """Log a summary of a knowledge base upload."""
+        failed = [item for item in report if not item["success"]]
+        logger.info(
+            f"Uploaded {len(report) - len(failed)}/{len(report)} knowledge base entries "
+            f"to replica {replica_id} in {elapsed:.2f}s"
+        )
+        for item in report:
+            logger.debug(
+                f"Knowledge base entry '{item['title']}': "
+                f"{'ok' if item['success'] else 'failed'} after {item['attempts']} attempt(s) "
+                f"in {item['elapsed']:.3f}s"
+            )
+        for item in failed:
+            logger.error(f"Failed to upload knowledge base entry '{item['title']}': {item['error']}")
+    
+    def train_replica_with_knowledge_base(self, user_id: str, replica_id: str, entries: List[Dict],
+                                          max_workers: int = None, max_retries: int = None) -> List[Dict]:
+        """Train a replica with knowledge base entries.
         
-        return created_entries
+        Entries are uploaded concurrently; see upload_knowledge_base_entries.
+        
+        Args:
+            user_id: Sensay user ID
+            replica_id: Replica ID to train
+            entries: List of dictionaries containing knowledge base entry data
+            max_workers: Maximum concurrent uploads
+            max_retries: Retries per entry after the first attempt
+                
+        Returns:
+            List of created knowledge base entry details
+        """
+        logger.info(f"Training replica {replica_id} with {len(entries)} knowledge base entries")
+        start = time.monotonic()
+        
+        report = self.upload_knowledge_base_entries(user_id, replica_id, entries, max_workers, max_retries)
+        self._log_training_report(replica_id, report, time.monotonic() - start)
+        
+        # Continue with other entries even if one fails
+        return [item["result"] for item in report if item["success"]]
+
+def _is_connect_failure(error: requests.RequestException) -> bool:
+    """True if the connection failed before the request was sent."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    # urllib3's NewConnectionError (refused, DNS failure) is a ConnectTimeoutError
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, ConnectTimeoutError)
 
-# Helper function to create and initialize the Sensay client
+def _is_retryable_training_error(error: Exception) -> bool:
+    """Retry creating a training entry only if the server cannot have created it.
+    
+    The create is a POST, so after a 5xx or a dropped response the entry may
+    already exist and a retry would duplicate it. Rate limiting (429) and
+    connections that failed before the request was sent are safe to retry.
+    An open circuit breaker will not close within the retry delays.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, SensayConnectionError):
+        return True
+    return isinstance(error, SensayAPIError) and error.status_code == 429
+
+# Helper function to get the shared Sensay client
 def get_sensay_client():
-    """Create and return a configured Sensay API client."""
+    """Return the process-wide Sensay API client.
+    
+    The client is stateless apart from its configuration, so a single instance
+    (and its pooled session) is shared by all requests in the worker. A new
+    client is built if the API key in the environment changes.
+    """
+    global _client
     api_key = os.environ.get("SENSAY_API_KEY")
-    return SensayAPI(api_key=api_key) 
\ No newline at end of file
+    client = _client
+    if client is None or client.api_key != api_key:
+        with _client_lock:
+            if _client is None or _client.api_key != api_key:
+                _client = SensayAPI(api_key=api_key)
+            client = _client
+    return client 
\ No newline at end of file
@@ -0,0 +1,200 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List
+
+import httpx
+
+from app.services.sensay import (
+    SensayAPI, SensayAPIError, SensayConnectionError, RetryPolicy, SENSAY_POOL_SIZE, SENSAY_TRAINING_CONCURRENCY, SENSAY_TRAINING_RETRIES,
+    TRAINING_RETRY_DELAY, _is_retryable_training_error, endpoint_key, get_circuit_breaker
+)
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class AsyncSensayAPI(SensayAPI):
+    """Asyncio client for the Sensay AI API.
+
+    Mirrors SensayAPI method for method. Every API method inherited from
+    SensayAPI hands its arguments to _make_request, which is a coroutine here,
+    so `await client.get_replica(...)`, `await client.create_chat_completion(...)`
+    and so on work unchanged. Errors are raised as SensayAPIError exactly as in
+    the synchronous client.
+
+    The underlying httpx.AsyncClient is bound to the event loop it is first
+    used on; close it with `await client.aclose()` or use the client as an
+    async context manager.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = "https://api.sensay.io",
+                 http_client: httpx.AsyncClient = None, connect_timeout: float = None,
+                 read_timeout: float = None, pool_size: int = None, retry_policy: RetryPolicy = None):
+        """Initialize the async Sensay API client.
+
+        Args:
+            api_key: Sensay API key. If None, will try to load from environment variable.
+            base_url: Base URL for the Sensay API.
+            http_client: httpx.AsyncClient to send requests with. Created on first use if None.
+            connect_timeout: Seconds to wait for a connection. Defaults to SENSAY_CONNECT_TIMEOUT.
+            read_timeout: Seconds to wait for a response. Defaults to SENSAY_READ_TIMEOUT.
+            pool_size: Maximum pooled connections. Defaults to SENSAY_POOL_SIZE.
+            retry_policy: Backoff policy for idempotent calls. Defaults to RetryPolicy().
+        """
+        super().__init__(api_key=api_key, base_url=base_url, session=http_client,
+                         connect_timeout=connect_timeout, read_timeout=read_timeout,
+                         retry_policy=retry_policy)
+        self.pool_size = pool_size or SENSAY_POOL_SIZE
+
+    def _default_session(self):
+        """The httpx client is created lazily inside the event loop."""
+        return None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Return the httpx client, creating it on first use."""
+        if self.session is None:
+            connect_timeout, read_timeout = self.timeout
+            self.session = httpx.AsyncClient(
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                )
+            )
+        return self.session
+
+    async def _make_request(self, method: str, endpoint: str, data: Dict = None, params: Dict = None,
+                            user_id: str = None, headers: Dict = None) -> Dict:
+        """Make a non-blocking HTTP request to the Sensay API.
+
+        Takes the same arguments as SensayAPI._make_request and applies the
+        same retry policy and circuit breakers.
+
+        Returns:
+            Response data as dictionary
+        """
+        url, request_headers = self._prepare_request(method, endpoint, data, params, user_id, headers)
+        key = endpoint_key(method, endpoint)
+        breaker = get_circuit_breaker(key)
+        attempt = 0
+
+        while True:
+            try:
+                breaker.before_request()
+                result = await self._send_request(method, url, request_headers, params, data)
+            except SensayAPIError as e:
+                delay = self._on_request_error(method, key, breaker, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            breaker.record_success()
+            return result
+
+    async def _send_request(self, method: str, url: str, headers: Dict, params: Dict = None, data: Dict = None) -> Dict:
+        """Send a single HTTP request and return the parsed response."""
+        metrics.incr("sensay.requests")
+        try:
+            response = await self._get_http_client().request(
+                method,
+                url,
+                headers=headers,
+                params=params,
+                json=data
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            logger.error(f"Request error: {str(e)}")
+            raise SensayConnectionError(str(e))
+        except httpx.HTTPError as e:
+            logger.error(f"Request error: {str(e)}")
+            raise SensayAPIError(500, str(e))
+
+        return self._handle_response(response)
+
+    async def upload_knowledge_base_entries(self, user_id: str, replica_id: str, entries: List[Dict],
+                                            max_workers: int = None, max_retries: int = None) -> List[Dict]:
+        """Upload knowledge base entries concurrently, bounded by a semaphore.
+
+        Takes the same arguments and returns the same per-entry report as
+        SensayAPI.upload_knowledge_base_entries.
+        """
+        if not entries:
+            return []
+
+        semaphore = asyncio.Semaphore(max_workers or SENSAY_TRAINING_CONCURRENCY)
+        max_retries = SENSAY_TRAINING_RETRIES if max_retries is None else max_retries
+
+        async def upload(entry):
+            async with semaphore:
+                return await self._upload_knowledge_base_entry(user_id, replica_id, entry, max_retries)
+
+        return list(await asyncio.gather(*(upload(entry) for entry in entries)))
+
+    async def _upload_knowledge_base_entry(self, user_id: str, replica_id: str, entry: Dict, max_retries: int) -> Dict:
+        """Upload a single knowledge base entry, retrying transient failures."""
+        title = entry.get("title", "Untitled Entry")
+        entry_data = self._knowledge_base_entry_data(entry)
+        start = time.monotonic()
+        error = None
+
+        for attempt in range(1, max_retries + 2):
+            try:
+                result = await self.create_knowledge_base_entry(user_id, replica_id, entry_data)
+                logger.debug(f"Created knowledge base entry for: {title} (attempt {attempt})")
+                return self._training_report(title, start, attempt, result=result)
+            except Exception as e:
+                error = str(e)
+                if not _is_retryable_training_error(e) or attempt > max_retries:
+                    break
+                logger.warning(f"Retrying knowledge base entry '{title}' after error: {error}")
+                await asyncio.sleep(TRAINING_RETRY_DELAY * 2 ** (attempt - 1))
+
+        logger.error(f"Error creating knowledge base entry '{title}': {error}")
+        return self._training_report(title, start, attempt, error=error)
+
+    async def train_replica_with_knowledge_base(self, user_id: str, replica_id: str, entries: List[Dict],
+                                                max_workers: int = None, max_retries: int = None) -> List[Dict]:
+        """Train a replica with knowledge base entries.
+
+        Args:
+            user_id: Sensay user ID
+            replica_id: Replica ID to train
+            entries: List of dictionaries containing knowledge base entry data
+            max_workers: Maximum concurrent uploads
+            max_retries: Retries per entry after the first attempt
+
+        Returns:
+            List of created knowledge base entry details
+        """
+        logger.info(f"Training replica {replica_id} with {len(entries)} knowledge base entries")
+        start = time.monotonic()
+
+        report = await self.upload_knowledge_base_entries(user_id, replica_id, entries, max_workers, max_retries)
+        self._log_training_report(replica_id, report, time.monotonic() - start)
+
+        return [item["result"] for item in report if item["success"]]
+
+    async def aclose(self):
+        """Close the underlying HTTP client and its pooled connections."""
+        if self.session is not None:
+            await self.session.aclose()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+# Helper function to create the async Sensay client
+def get_async_sensay_client():
+    """Create and return a configured async Sensay API client.
+
+    Unlike get_sensay_client(), a new client is returned on every call because
+    its connections belong to the running event loop. Close it when done.
+    """
+    api_key = os.environ.get("SENSAY_API_KEY")
+    return AsyncSensayAPI(api_key=api_key)
@@ -0,0 +1,335 @@
+"""
+Materialized per-user goal statistics.
+
+Each user has one UserStats row holding the counts behind the progress
+summary and the achievement stats: active, completed and abandoned goals,
+the sum of completion_status over active goals (for the average), completed
+milestones and review reflections. Reading them is a primary key lookup
+instead of aggregating over the user's goals on every request.
+
+The row is kept up to date by mapper events on Goal, Milestone and
+Reflection. Each insert, update or delete adds the change it makes to the
+totals as a delta, and the deltas of a flush are applied with one UPDATE
+per user in the same transaction, so they commit or roll back together with
+the change. When a delta cannot be worked out (the old value of a changed
+column was never loaded) the user's totals are recomputed at the end of the
+flush instead.
+
+Bulk Query.update()/delete() calls and bulk inserts bypass the mapper
+events. `flask rebuild_user_stats` and `flask verify_user_stats` (see
+app.py) recompute the totals to repair or detect such drift.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select, insert, update
+from sqlalchemy.orm import object_session
+
+from app import db
+from app.models import User, UserStats, Goal, Milestone, Reflection
+
+logger = logging.getLogger('strategist.user_stats')
+
+# Reflection types counted as lessons learned in the achievements
+REVIEW_REFLECTION_TYPES = ('review_positive', 'review_improve')
+
+STAT_COLUMNS = ('active_goals', 'completed_goals', 'abandoned_goals', 'active_completion_sum',
+                'completed_milestones', 'review_reflections')
+
+# Relative tolerance when comparing stored and recomputed completion sums
+COMPLETION_SUM_TOLERANCE = 1e-6
+
+# Marks a column value that is not loaded on the instance
+_UNKNOWN = object()
+
+def _empty_stats():
+    return {column: 0 for column in STAT_COLUMNS}
+
+def compute_all_user_stats(user_ids=None, connection=None):
+    """Aggregate the stats of several users from their goals, milestones and reflections.
+
+    Args:
+        user_ids: Users to compute, or None for every user
+        connection: Connection to query on (defaults to the session's)
+
+    Returns:
+        dict: User ID -> stats dict, including users without any goals
+    """
+    connection = connection or db.session.connection()
+
+    def restrict(query, column):
+        return query if user_ids is None else query.where(column.in_(list(user_ids)))
+
+    all_ids = connection.execute(restrict(select(User.id), User.id)).scalars()
+    stats = {user_id: _empty_stats() for user_id in all_ids}
+
+    goal_totals = connection.execute(restrict(
+        select(Goal.user_id, Goal.status, func.count(Goal.id), func.sum(Goal.completion_status))
+        .group_by(Goal.user_id, Goal.status), Goal.user_id))
+    for user_id, status, count, completion_sum in goal_totals:
+        if user_id not in stats:
+            continue
+        if status in ('active', 'completed', 'abandoned'):
+            stats[user_id][f'{status}_goals'] = count
+        if status == 'active':
+            stats[user_id]['active_completion_sum'] = completion_sum or 0.0
+
+    milestone_counts = connection.execute(restrict(
+        select(Goal.user_id, func.count(Milestone.id))
+        .join(Goal, Goal.id == Milestone.goal_id)
+        .where(Milestone.status == 'completed')
+        .group_by(Goal.user_id), Goal.user_id))
+    for user_id, count in milestone_counts:
+        if user_id in stats:
+            stats[user_id]['completed_milestones'] = count
+
+    reflection_counts = connection.execute(restrict(
+        select(Goal.user_id, func.count(Reflection.id))
+        .join(Goal, Goal.id == Reflection.goal_id)
+        .where(Reflection.reflection_type.in_(REVIEW_REFLECTION_TYPES))
+        .group_by(Goal.user_id), Goal.user_id))
+    for user_id, count in reflection_counts:
+        if user_id in stats:
+            stats[user_id]['review_reflections'] = count
+
+    return stats
+
+def compute_user_stats(user_id, connection=None):
+    """Aggregate one user's stats from scratch."""
+    return compute_all_user_stats([int(user_id)], connection).get(int(user_id), _empty_stats())
+
+def _store_user_stats(connection, user_id, stats):
+    """Overwrite the stats row of a user, creating it if needed."""
+    values = dict(stats, updated_at=datetime.utcnow())
+    result = connection.execute(update(UserStats.__table__).where(UserStats.user_id == user_id).values(**values))
+    if result.rowcount == 0:
+        connection.execute(insert(UserStats.__table__).values(user_id=user_id, **values))
+
+def get_user_stats(user_id):
+    """Return the stats of a user as a dict.
+
+    The row is created from the user's goals if it is missing (for example
+    for a user created by a bulk insert).
+    """
+    row = db.session.get(UserStats, int(user_id))
+    if row is not None:
+        return {column: getattr(row, column) for column in STAT_COLUMNS}
+
+    logger.warning(f"No stats row for user {user_id}, computing it")
+    stats = compute_user_stats(user_id)
+    _store_user_stats(db.session.connection(), int(user_id), stats)
+    db.session.commit()
+    return stats
+
+def rebuild_user_stats(user_ids=None):
+    """Recompute and store the stats of the given users (default: all users).
+
+    Returns:
+        int: Number of users rebuilt
+    """
+    connection = db.session.connection()
+    all_stats = compute_all_user_stats(user_ids, connection)
+    for user_id, stats in all_stats.items():
+        _store_user_stats(connection, user_id, stats)
+    db.session.commit()
+    logger.info(f"Rebuilt stats for {len(all_stats)} users")
+    return len(all_stats)
+
+def _stats_match(stored, actual):
+    for column in STAT_COLUMNS:
+        if column == 'active_completion_sum':
+            tolerance = COMPLETION_SUM_TOLERANCE * max(1.0, abs(actual[column]))
+            if abs((stored[column] or 0.0) - actual[column]) > tolerance:
+                return False
+        elif stored[column] != actual[column]:
+            return False
+    return True
+
+def verify_user_stats(user_ids=None):
+    """Compare stored stats with freshly computed ones.
+
+    Returns:
+        list: (user_id, stored, actual) for every user whose row differs or is
+            missing (stored is None then)
+    """
+    connection = db.session.connection()
+    actual_stats = compute_all_user_stats(user_ids, connection)
+    query = select(UserStats.__table__)
+    if user_ids is not None:
+        query = query.where(UserStats.user_id.in_(list(user_ids)))
+    stored_stats = {row.user_id: dict(row._mapping) for row in connection.execute(query)}
+
+    drift = []
+    for user_id, actual in sorted(actual_stats.items()):
+        stored = stored_stats.get(user_id)
+        if stored is None or not _stats_match(stored, actual):
+            drift.append((user_id, stored and {column: stored[column] for column in STAT_COLUMNS}, actual))
+    return drift
+
+# Incremental maintenance
+
+def _pending(session):
+    """Deltas, users to recompute and deleted users collected during the current flush."""
+    return session.info.setdefault('user_stats_pending', {
+        'deltas': defaultdict(lambda: defaultdict(int)),
+        'recompute': set(),
+        'deleted_users': set()
+    })
+
+def _goal_owner(session, connection, goal_id):
+    """Return the user ID of a goal, from the identity map when possible."""
+    if goal_id is None:
+        return None
+    goal = session.identity_map.get(inspect(Goal).identity_key_from_primary_key((goal_id,)))
+    if goal is not None and 'user_id' in inspect(goal).dict:
+        return goal.user_id
+    return connection.execute(select(Goal.user_id).where(Goal.id == goal_id)).scalar()
+
+def _goal_contribution(session, connection, values):
+    status = values['status']
+    completion = values['completion_status'] or 0.0
+    contribution = {}
+    if status in ('active', 'completed', 'abandoned'):
+        contribution[f'{status}_goals'] = 1
+    if status == 'active' and completion:
+        contribution['active_completion_sum'] = completion
+    return values['user_id'], contribution
+
+def _milestone_contribution(session, connection, values):
+    if values['status'] != 'completed':
+        return None, {}
+    return _goal_owner(session, connection, values['goal_id']), {'completed_milestones': 1}
+
+def _reflection_contribution(session, connection, values):
+    if values['reflection_type'] not in REVIEW_REFLECTION_TYPES:
+        return None, {}
+    return _goal_owner(session, connection, values['goal_id']), {'review_reflections': 1}
+
+# Columns each tracked model's contribution depends on
+_TRACKED = {
+    Goal: (('user_id', 'status', 'completion_status'), _goal_contribution),
+    Milestone: (('goal_id', 'status'), _milestone_contribution),
+    Reflection: (('goal_id', 'reflection_type'), _reflection_contribution)
+}
+
+def _add_contribution(pending, user_id, contribution, sign):
+    if user_id is None:
+        return
+    for column, amount in contribution.items():
+        # Goals created from a JWT identity carry the user ID as a string
+        pending['deltas'][int(user_id)][column] += sign * amount
+
+def _owner_for_recompute(target, session, connection):
+    """Best-effort owner of a row whose contribution is unknown."""
+    if isinstance(target, Goal):
+        return inspect(target).dict.get('user_id')
+    return _goal_owner(session, connection, inspect(target).dict.get('goal_id'))
+
+def _after_insert(mapper, connection, target):
+    session = object_session(target)
+    keys, contribution = _TRACKED[mapper.class_]
+    state = inspect(target)
+    if any(key not in state.dict for key in keys):
+        _pending(session)['recompute'].add(_owner_for_recompute(target, session, connection))
+        return
+    user_id, delta = contribution(session, connection, {key: state.dict[key] for key in keys})
+    _add_contribution(_pending(session), user_id, delta, 1)
+
+def _after_delete(mapper, connection, target):
+    session = object_session(target)
+    keys, contribution = _TRACKED[mapper.class_]
+    state = inspect(target)
+    old_values = {}
+    for key in keys:
+        history = state.attrs[key].history
+        if history.deleted:
+            old_values[key] = history.deleted[0]
+        elif history.unchanged:
+            old_values[key] = history.unchanged[0]
+        else:
+            _pending(session)['recompute'].add(_owner_for_recompute(target, session, connection))
+            return
+    user_id, delta = contribution(session, connection, old_values)
+    _add_contribution(_pending(session), user_id, delta, -1)
+
+def _after_update(mapper, connection, target):
+    session = object_session(target)
+    keys, contribution = _TRACKED[mapper.class_]
+    state = inspect(target)
+    old_values, new_values = {}, {}
+    changed = False
+    for key in keys:
+        history = state.attrs[key].history
+        if history.added or history.deleted:
+            changed = True
+            new_values[key] = history.added[0] if history.added else None
+            old_values[key] = history.deleted[0] if history.deleted else _UNKNOWN
+        else:
+            old_values[key] = new_values[key] = state.dict.get(key, _UNKNOWN)
+    if not changed:
+        return
+
+    pending = _pending(session)
+    if _UNKNOWN in old_values.values() or _UNKNOWN in new_values.values():
+        # The old values were never loaded; recompute both owners after the flush
+        pending['recompute'].add(_owner_for_recompute(target, session, connection))
+        if old_values.get('user_id') not in (None, _UNKNOWN):
+            pending['recompute'].add(old_values['user_id'])
+        return
+
+    old_user_id, old_delta = contribution(session, connection, old_values)
+    new_user_id, new_delta = contribution(session, connection, new_values)
+    _add_contribution(pending, old_user_id, old_delta, -1)
+    _add_contribution(pending, new_user_id, new_delta, 1)
+
+for _model in _TRACKED:
+    event.listen(_model, 'after_insert', _after_insert)
+    event.listen(_model, 'after_update', _after_update)
+    event.listen(_model, 'after_delete', _after_delete)
+
+@event.listens_for(User, 'after_insert')
+def _create_stats_row(mapper, connection, target):
+    """Start new users with an all-zero stats row."""
+    connection.execute(insert(UserStats.__table__).values(user_id=target.id, updated_at=datetime.utcnow(),
+                                                          **_empty_stats()))
+
+@event.listens_for(User, 'after_delete')
+def _forget_deleted_user(mapper, connection, target):
+    # The stats row goes with the user (cascade), so drop any pending deltas
+    _pending(object_session(target))['deleted_users'].add(target.id)
+
+@event.listens_for(db.session, 'after_flush')
+def _apply_pending_stats(session, flush_context):
+    """Apply the deltas collected during the flush, in the flush's transaction."""
+    pending = session.info.pop('user_stats_pending', None)
+    if not pending:
+        return
+
+    connection = session.connection()
+    recompute = {int(user_id) for user_id in pending['recompute'] if user_id is not None} - pending['deleted_users']
+    now = datetime.utcnow()
+    for user_id, delta in pending['deltas'].items():
+        if user_id in pending['deleted_users'] or user_id in recompute:
+            continue
+        delta = {column: amount for column, amount in delta.items() if amount}
+        if not delta:
+            continue
+        table = UserStats.__table__
+        values = {column: table.c[column] + amount for column, amount in delta.items()}
+        result = connection.execute(update(table).where(table.c.user_id == user_id).values(updated_at=now, **values))
+        if result.rowcount == 0:
+            # No row yet (e.g. a user created before the stats existed): the totals already include this flush
+            recompute.add(user_id)
+
+    if recompute:
+        logger.debug(f"Recomputing stats for users {sorted(recompute)}")
+        for user_id, stats in compute_all_user_stats(recompute, connection).items():
+            _store_user_stats(connection, user_id, stats)
+
+    # Loaded UserStats instances are now stale
+    for user_id in set(pending['deltas']) | recompute:
+        row = session.identity_map.get(inspect(UserStats).identity_key_from_primary_key((user_id,)))
+        if row is not None:
+            session.expire(row)
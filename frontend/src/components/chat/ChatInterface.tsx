@@ -160,11 +160,9 @@ const ChatInterface = forwardRef<ChatInterfaceHandle, ChatInterfaceProps>(
       try {
         setIsLoadingMore(true)
         const nextPage = page + 1
-        // Calculate how many messages to skip
-        const offset = page * messagesPerPage
         
-        // Use backend pagination
-        const response = await api.getChatHistory(false, messagesPerPage, offset)
+        // Use backend pagination, continuing from the oldest message shown
+        const response = await api.getChatHistory(false, messagesPerPage, 0, messages[0]?.id)
         
         if (response.messages.length > 0) {
           // Save scroll position
@@ -11,12 +11,28 @@ const apiBaseUrl = import.meta.env.VITE_API_BASE_URL || 'http://localhost:5000';
 axios.defaults.baseURL = apiBaseUrl;
 console.log('Setting axios.defaults.baseURL to:', axios.defaults.baseURL);
 
+// End of the read-your-writes window (Unix time) from the X-Read-Primary-Until header
+let readPrimaryUntil = 0;
+
 // Add request interceptor to include ngrok-skip-browser-warning header
 axios.interceptors.request.use(config => {
   config.headers['ngrok-skip-browser-warning'] = '69420';
+  // Keep reading from the primary database until our recent writes reach the read replica
+  if (readPrimaryUntil > Date.now() / 1000) {
+    config.headers['X-Read-Primary-Until'] = String(readPrimaryUntil);
+  }
   return config;
 });
 
+// Remember the read-your-writes window the API returns after a write
+axios.interceptors.response.use(response => {
+  const until = Number(response.headers['x-read-primary-until']);
+  if (until > readPrimaryUntil) {
+    readPrimaryUntil = until;
+  }
+  return response;
+});
+
 // Log API configuration on startup to help debug API URL issues
 logApiConfiguration();
 
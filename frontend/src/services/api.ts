@@ -13,10 +13,12 @@ export interface ChatMessage {
 export interface PaginatedResponse<T> {
   messages: T[]
   pagination: {
-    total: number
-    offset: number
+    total?: number // Offset mode only
+    offset?: number // Offset mode only
     limit: number
     has_more: boolean
+    before_id: number | null // Pass as beforeId to load the previous (older) page
+    after_id: number | null
   }
 }
 
@@ -63,11 +65,38 @@ export interface ProgressUpdate {
   created_at: string
 }
 
+export interface ProgressBucketStats {
+  count: number
+  avg: number
+  min: number
+  max: number
+  last: number // Value of the newest update in the bucket
+}
+
+export interface ProgressSeriesPoint {
+  id: number
+  created_at: string
+  value: number
+}
+
+export interface ProgressSeries {
+  goal_id: number
+  milestone_id: number | null
+  mode: 'buckets' | 'lttb'
+  interval?: 'day' | 'week' | 'month'
+  points?: number
+  // buckets mode: one entry per bucket; lttb mode: the downsampled points of each series
+  series: Array<{ bucket: string, progress: ProgressBucketStats | null, effort: ProgressBucketStats | null }>
+    | Record<'progress' | 'effort', { total: number, points: ProgressSeriesPoint[] }>
+}
+
 // API service
 const api = {
   // Chat
-  getChatHistory: async (includeSystem = false, limit = 50, offset = 0): Promise<PaginatedResponse<ChatMessage>> => {
-    const { data } = await axios.get(`/api/chat/history?include_system=${includeSystem}&limit=${limit}&offset=${offset}`)
+  getChatHistory: async (includeSystem = false, limit = 50, offset = 0, beforeId?: number): Promise<PaginatedResponse<ChatMessage>> => {
+    // Older pages are fetched with the before_id cursor, which stays fast however long the history is
+    const page = beforeId !== undefined ? `before_id=${beforeId}` : `offset=${offset}`
+    const { data } = await axios.get(`/api/chat/history?include_system=${includeSystem}&limit=${limit}&${page}`)
     return data
   },
 
@@ -154,6 +183,19 @@ const api = {
     return data.progress_updates
   },
 
+  // Chart-sized progress and effort series: per-day/week/month aggregates, or at most `points` points per series
+  getProgressSeries: async (
+    goalId: number,
+    options: { mode?: 'buckets' | 'lttb', interval?: 'day' | 'week' | 'month', points?: number, milestoneId?: number } = {}
+  ): Promise<ProgressSeries> => {
+    const params = new URLSearchParams({ mode: options.mode || 'buckets' })
+    if (options.interval) params.set('interval', options.interval)
+    if (options.points) params.set('points', String(options.points))
+    if (options.milestoneId !== undefined) params.set('milestone_id', String(options.milestoneId))
+    const { data } = await axios.get(`/api/progress/goals/${goalId}/series?${params}`)
+    return data
+  },
+
   // Create a progress state update (affects goal completion status)
   createProgressUpdate: async (goalId: number, progressValue: number, notes: string = ''): Promise<ProgressUpdate> => {
     const { data } = await axios.post(`/api/progress/goals/${goalId}/updates`, {
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark for paging through the chat history (GET /api/chat/history).
+
+Seeds a SQLite database with one user owning many chat messages (100,000 by
+default, every tenth a system message) next to a few other users, then
+requests pages at increasing depths in offset mode (offset/limit, counting
+the total on every page) and in cursor mode (before_id, fetching limit+1
+rows). It reports the median time per page for both and checks that both
+modes return the same messages.
+
+Usage: python scripts/bench_chat_history.py [--messages 100000] [--limit 50] [--repeat 5] [--database sqlite:///bench.db]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import insert
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User, ChatMessage
+
+def add_user(name):
+    user = User(username=name, email=f"{name}@example.com", sensay_user_id=f"navi_{name}")
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def seed(message_count, other_users=5, chunk_size=10000):
+    """Create the benchmark user with message_count messages and return the user's ID."""
+    user_ids = [add_user('bench')] + [add_user(f"other{index}") for index in range(other_users)]
+    start = datetime.utcnow() - timedelta(seconds=message_count)
+
+    rows = []
+    for index in range(message_count):
+        for position, user_id in enumerate(user_ids):
+            # The other users get one message for every hundred of the benchmark user's
+            if position and index % 100:
+                continue
+            sender = 'system' if index % 10 == 9 else ('user' if index % 2 else 'replica')
+            rows.append({'user_id': user_id, 'sender': sender, 'content': f"Message {index}",
+                         'created_at': start + timedelta(seconds=index)})
+        if len(rows) >= chunk_size:
+            db.session.execute(insert(ChatMessage.__table__), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(ChatMessage.__table__), rows)
+    db.session.commit()
+    return user_ids[0]
+
+def timed_get(client, url, headers, repeat):
+    """Return (median seconds, last response JSON) for `repeat` requests."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), response.get_json()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offset and cursor pagination of the chat history')
+    parser.add_argument('--messages', type=int, default=100000, help='Messages for the benchmark user')
+    parser.add_argument('--limit', type=int, default=50, help='Messages per page')
+    parser.add_argument('--repeat', type=int, default=5, help='Requests per page and mode')
+    parser.add_argument('--database', default='sqlite://', help='Database URL (default: in-memory SQLite)')
+    args = parser.parse_args()
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database,
+        'JWT_SECRET_KEY': 'chat-history-benchmark-secret-key',
+        'LOG_LEVEL': 'WARNING'
+    })
+
+    with app.app_context():
+        db.create_all()
+        user_id = seed(args.messages)
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user_id))}"}
+        # IDs of the messages the history shows, newest first
+        visible_ids = [message_id for (message_id,) in (db.session.query(ChatMessage.id)
+                                                        .filter(ChatMessage.user_id == user_id,
+                                                                ChatMessage.sender != 'system')
+                                                        .order_by(ChatMessage.id.desc()))]
+    client = app.test_client()
+
+    depths = sorted({depth for depth in (0, 1000, 10000, len(visible_ids) // 2, len(visible_ids) - args.limit)
+                     if 0 <= depth < len(visible_ids)})
+    print(f"Messages: {args.messages} ({len(visible_ids)} shown in the history), {args.limit} per page")
+    print(f"{'depth':>8} {'offset ms':>10} {'cursor ms':>10} {'speedup':>8}")
+
+    mismatches = 0
+    for depth in depths:
+        offset_time, offset_page = timed_get(
+            client, f"/api/chat/history?limit={args.limit}&offset={depth}", headers, args.repeat)
+        before_id = visible_ids[depth - 1] if depth else ''
+        cursor_time, cursor_page = timed_get(
+            client, f"/api/chat/history?limit={args.limit}&before_id={before_id}", headers, args.repeat)
+
+        if offset_page['messages'] != cursor_page['messages'] or \
+                offset_page['pagination']['has_more'] != cursor_page['pagination']['has_more']:
+            mismatches += 1
+        print(f"{depth:>8} {offset_time * 1000:>10.2f} {cursor_time * 1000:>10.2f} {offset_time / cursor_time:>7.1f}x")
+
+    if mismatches:
+        print(f"MISMATCH: {mismatches} pages differ between offset and cursor mode")
+        sys.exit(1)
+    print("Pages match")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark for creating a goal tree with create_goal_internal.
+
+Creates goals with 0, 10 and 50 milestones (and a few reflections) in a
+file-backed SQLite database, so every commit pays for a real fsync, using
+both the current single-transaction create_goal_internal and the previous
+implementation that committed after every step (kept below as
+legacy_create_goal_internal). It reports commits, SQL statements and the
+median wall time per goal, and checks that both create the same rows.
+
+Usage: python scripts/bench_create_goal.py [--milestones 0 10 50] [--repeat 20] [--database sqlite:///bench.db]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import User, Goal, Milestone, ProgressUpdate, Reflection
+from app.api.goals import create_goal_internal
+
+def legacy_create_goal_internal(user_id, data):
+    """The previous create_goal_internal: 2 + 2 per milestone + 1 commits."""
+    goal = Goal(user_id=user_id, title=data['title'], start_date=datetime.fromisoformat(data['start_date']),
+                target_date=datetime.fromisoformat(data['target_date']), status='active')
+    db.session.add(goal)
+    db.session.commit()
+
+    db.session.add(ProgressUpdate(goal_id=goal.id, progress_value=0.0, type='progress', progress_notes='Goal created'))
+    db.session.add(ProgressUpdate(goal_id=goal.id, progress_value=0.0, type='effort', effort_notes='Goal created'))
+    db.session.commit()
+
+    milestones_data = []
+    for milestone_data in data['milestones']:
+        milestone = Milestone(goal_id=goal.id, title=milestone_data['title'],
+                              target_date=datetime.fromisoformat(milestone_data['target_date']))
+        db.session.add(milestone)
+        db.session.commit()
+        db.session.add(ProgressUpdate(goal_id=goal.id, milestone_id=milestone.id, progress_value=0.0,
+                                      type='progress', progress_notes='Milestone created'))
+        db.session.add(ProgressUpdate(goal_id=goal.id, milestone_id=milestone.id, progress_value=0.0,
+                                      type='effort', effort_notes='Milestone created'))
+        db.session.commit()
+        milestones_data.append({'id': milestone.id, 'title': milestone.title,
+                                'target_date': milestone.target_date.isoformat(),
+                                'completion_status': milestone.completion_status, 'status': milestone.status})
+
+    for reflection_type, content in data['reflections'].items():
+        db.session.add(Reflection(goal_id=goal.id, reflection_type=reflection_type, content=content))
+    db.session.commit()
+
+    return {'id': goal.id, 'title': goal.title, 'milestones': milestones_data,
+            'reflections': {reflection.reflection_type: {'id': reflection.id, 'content': reflection.content}
+                            for reflection in goal.reflections}}
+
+def goal_data(milestone_count):
+    now = datetime.utcnow()
+    return {
+        'title': f"Plan with {milestone_count} milestones",
+        'start_date': now.isoformat(),
+        'target_date': (now + timedelta(days=365)).isoformat(),
+        'milestones': [{'title': f"Milestone {number}", 'target_date': (now + timedelta(days=7 * (number + 1))).isoformat()}
+                       for number in range(milestone_count)],
+        'reflections': {'importance': 'It matters to me', 'obstacles': 'Time', 'environment': 'Evenings'}
+    }
+
+def goal_rows(goal_id):
+    """Everything stored for a goal, without IDs and timestamps."""
+    milestones = Milestone.query.filter_by(goal_id=goal_id).order_by(Milestone.id).all()
+    positions = {milestone.id: index for index, milestone in enumerate(milestones)}
+    return {
+        'milestones': [(milestone.title, milestone.target_date, milestone.status, milestone.completion_status)
+                       for milestone in milestones],
+        'reflections': sorted((reflection.reflection_type, reflection.content)
+                              for reflection in Reflection.query.filter_by(goal_id=goal_id)),
+        'updates': sorted((positions.get(update.milestone_id, -1), update.type, update.progress_value,
+                           update.progress_notes or '', update.effort_notes or '')
+                          for update in ProgressUpdate.query.filter_by(goal_id=goal_id))
+    }
+
+class Counter:
+    def __init__(self, engine):
+        self.commits = self.statements = 0
+        event.listen(engine, 'commit', self._commit)
+        event.listen(engine, 'before_cursor_execute', self._statement)
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def _statement(self, *args):
+        self.statements += 1
+
+def measure(create, counter, repeat):
+    """Return (commits per goal, statements per goal, median seconds per goal, last goal ID)."""
+    timings = []
+    for _ in range(repeat):
+        counter.commits = counter.statements = 0
+        start = time.perf_counter()
+        goal_id = create()
+        timings.append(time.perf_counter() - start)
+        commits, statements = counter.commits, counter.statements
+        db.session.remove()
+    return commits, statements, statistics.median(timings), goal_id
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark create_goal_internal against the commit-per-step version')
+    parser.add_argument('--milestones', type=int, nargs='+', default=[0, 10, 50], help='Milestones per goal')
+    parser.add_argument('--repeat', type=int, default=20, help='Goals created per implementation and size')
+    parser.add_argument('--database', help='Database URL (default: a SQLite file in a temporary directory)')
+    args = parser.parse_args()
+
+    workdir = None
+    if not args.database:
+        workdir = tempfile.mkdtemp(prefix='bench-create-goal-')
+        args.database = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database,
+        'JWT_SECRET_KEY': 'create-goal-benchmark-secret-key',
+        'LOG_LEVEL': 'WARNING'
+    })
+
+    try:
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com', sensay_user_id='navi_bench')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            counter = Counter(db.engine)
+
+            print(f"{'milestones':>10} {'implementation':<15} {'commits':>8} {'statements':>11} {'ms/goal':>9}")
+            mismatches = 0
+            for milestone_count in args.milestones:
+                data = goal_data(milestone_count)
+                legacy = measure(lambda: legacy_create_goal_internal(user_id, data)['id'], counter, args.repeat)
+                current = measure(lambda: create_goal_internal(user_id, data)['id'], counter, args.repeat)
+                for name, (commits, statements, elapsed, _) in (('legacy', legacy), ('single commit', current)):
+                    print(f"{milestone_count:>10} {name:<15} {commits:>8} {statements:>11} {elapsed * 1000:>9.2f}")
+                print(f"{'':>10} speedup {legacy[2] / current[2]:.1f}x")
+                if goal_rows(legacy[3]) != goal_rows(current[3]):
+                    mismatches += 1
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if mismatches:
+        print(f"MISMATCH: {mismatches} goal sizes stored different rows")
+        sys.exit(1)
+    print("Stored rows match")
+
+if __name__ == "__main__":
+    main()
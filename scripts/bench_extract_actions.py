@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for extracting action JSON from replica replies.
+
+Compares the previous marker-based extract_action_json (kept below as
+legacy_extract_action_json) with the single-pass extract_actions scanner on
+a corpus of replies, and reports per-reply timings and how many actions each
+finds. The corpus is either a file of real replies (a JSON list of strings,
+or one JSON string per line, e.g. exported replica messages) or, by default,
+built-in replies modeled on the action formats in app/prompts.py: plain
+chat, a fenced action, several actions in one reply, braces inside strings
+and prose, and long replies.
+
+Usage: python scripts/bench_extract_actions.py [--corpus replies.jsonl] [--repeat 200]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.api.chat import extract_actions, strip_action_spans
+
+def legacy_extract_action_json(ai_content):
+    """The marker-based extractor used before extract_actions (one action at most)."""
+    json_start_markers = ['```json', '```', '{', 'Here\'s the action:', 'Action:']
+    json_end_markers = ['```', '}']
+
+    for start_marker in json_start_markers:
+        if start_marker in ai_content:
+            start_idx = ai_content.find(start_marker) + len(start_marker)
+            end_idx = None
+            if start_marker != '{':
+                for end_marker in json_end_markers:
+                    if end_marker in ai_content[start_idx:]:
+                        marker_idx = ai_content[start_idx:].find(end_marker)
+                        if end_marker == '}':
+                            marker_idx += 1
+                        end_idx = start_idx + marker_idx
+                        break
+            else:
+                if '}' in ai_content[start_idx-1:]:
+                    end_idx = ai_content.rfind('}') + 1
+
+            if end_idx:
+                json_str = ai_content[start_idx:end_idx].strip()
+                try:
+                    if not json_str.startswith('{'):
+                        json_start = json_str.find('{')
+                        if json_start >= 0:
+                            json_str = json_str[json_start:]
+                    data = json.loads(json_str)
+                    if 'action_type' in data:
+                        return data
+                except json.JSONDecodeError:
+                    continue
+
+    try:
+        start_idx = ai_content.find('{')
+        if start_idx >= 0:
+            end_idx = ai_content.rfind('}') + 1
+            if end_idx > start_idx:
+                data = json.loads(ai_content[start_idx:end_idx])
+                if 'action_type' in data:
+                    return data
+    except json.JSONDecodeError:
+        pass
+    return None
+
+def fenced(action):
+    return f"```json\n{json.dumps(action, indent=4)}\n```"
+
+def builtin_corpus():
+    """Replies shaped like the replica's, covering the cases the extractor must handle."""
+    create_goal = {
+        "action_type": "create_goal",
+        "data": {
+            "title": "Run a half marathon",
+            "target_date": "2027-04-01",
+            "milestones": [
+                {"title": "Run 5k without stopping", "target_date": "2026-12-01"},
+                {"title": "Run 10k", "target_date": "2027-01-15"}
+            ],
+            "reflections": {
+                "importance": "I want to prove to myself that I can stick with something {hard}.",
+                "obstacles": "Winter weather and late \"crunch\" weeks at work."
+            }
+        },
+        "display_message": "I've created your half marathon goal with two milestones."
+    }
+    update_progress = {
+        "action_type": "update_progress",
+        "data": {"goal_id": 3, "type": "progress", "value": 6, "notes": "Ran 3 times this week"}
+    }
+    update_milestone = {
+        "action_type": "update_milestone",
+        "data": {"goal_id": 3, "milestone_id": 7, "status": "completed"}
+    }
+    prose = (
+        "That's a great question. Consistency matters more than intensity early on, so aim for three "
+        "easy runs a week and one slightly longer run at the weekend. Keep an eye on how your legs feel "
+        "the day after; if you are still sore, take an extra rest day. "
+    )
+
+    return [
+        prose,
+        prose * 12,
+        f"Great, let's make it official!\n\n{fenced(create_goal)}\n\nYou can see it on your dashboard now.",
+        f"Nice work this week.\n\n{fenced(update_progress)}\n\nAnd congratulations on finishing the 5k:\n\n{fenced(update_milestone)}",
+        f"Here's the action: {json.dumps(update_progress)}",
+        f"Use a template like {{goal}} by {{date}} to phrase it. {prose}",
+        f"{prose * 6}\n\n{fenced(create_goal)}\n\n{prose * 6}",
+        f"Some templates to try: " + "{goal} by {date}, " * 200 + fenced(update_progress),
+        f"Let me fix that date.\n\n{fenced({'action_type': 'update_goal', 'data': {'goal_id': 3, 'target_date': '2027-05-01'}})}",
+    ]
+
+def load_corpus(path):
+    with open(path) as f:
+        text = f.read()
+    try:
+        replies = json.loads(text)
+        if isinstance(replies, list):
+            return [str(reply) for reply in replies]
+    except json.JSONDecodeError:
+        pass
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def time_per_reply(func, corpus, repeat):
+    """Return per-reply timings in microseconds (median over `repeat` runs)."""
+    timings = []
+    for reply in corpus:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(reply)
+            samples.append(time.perf_counter() - start)
+        timings.append(statistics.median(samples) * 1e6)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark action JSON extraction from replica replies')
+    parser.add_argument('--corpus', help='JSON list or JSON-lines file of reply strings')
+    parser.add_argument('--repeat', type=int, default=200, help='Runs per reply')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else builtin_corpus()
+    print(f"Corpus: {len(corpus)} replies, {sum(len(reply) for reply in corpus)} characters")
+
+    legacy = time_per_reply(legacy_extract_action_json, corpus, args.repeat)
+    scanner = time_per_reply(extract_actions, corpus, args.repeat)
+
+    print(f"\n{'reply':>5} {'chars':>7} {'legacy us':>10} {'scanner us':>11} {'legacy':>7} {'scanner':>8}")
+    legacy_found = scanner_found = 0
+    for index, reply in enumerate(corpus):
+        legacy_count = 1 if legacy_extract_action_json(reply) else 0
+        scanner_count = len(extract_actions(reply))
+        legacy_found += legacy_count
+        scanner_found += scanner_count
+        print(f"{index:>5} {len(reply):>7} {legacy[index]:>10.1f} {scanner[index]:>11.1f} {legacy_count:>7} {scanner_count:>8}")
+
+    print(f"\nTotal time per corpus pass: legacy {sum(legacy):.1f} us, scanner {sum(scanner):.1f} us "
+          f"({sum(legacy) / sum(scanner):.2f}x)")
+    print(f"Actions found: legacy {legacy_found}, scanner {scanner_found}")
+
+    sample = next((reply for reply in corpus if len(extract_actions(reply)) > 1), None)
+    if sample:
+        print("\nDisplay text of a multi-action reply after stripping the actions:")
+        print(strip_action_spans(sample, extract_actions(sample)))
+
+if __name__ == "__main__":
+    main()
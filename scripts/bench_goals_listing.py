@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the goals listing (GET /api/goals/).
+
+Seeds a SQLite database with one user owning many goals (1,000 by default),
+each with milestones, reflections, progress updates and some subgoals, then
+calls the endpoint through the test client. It reports the number of SQL
+statements and the wall time per request, next to the previous per-goal
+implementation (kept below as legacy_goals_listing), and checks that both
+return the same goals.
+
+Usage: python scripts/bench_goals_listing.py [--goals 1000] [--repeat 5] [--database sqlite:///bench.db]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event, desc
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User, Goal, Milestone, ProgressUpdate, Reflection
+
+def legacy_goals_listing(user_id):
+    """The per-goal listing used before: 4 extra queries for every goal."""
+    goals = Goal.query.filter_by(user_id=user_id).order_by(desc(Goal.created_at)).all()
+    goals_data = []
+    for goal in goals:
+        milestones_data = [{
+            'id': milestone.id,
+            'title': milestone.title,
+            'target_date': milestone.target_date.isoformat(),
+            'completion_status': milestone.completion_status,
+            'status': milestone.status,
+            'created_at': milestone.created_at.isoformat()
+        } for milestone in goal.milestones]
+        reflections_data = {reflection.reflection_type: {
+            'id': reflection.id,
+            'content': reflection.content,
+            'created_at': reflection.created_at.isoformat()
+        } for reflection in goal.reflections}
+        goals_data.append({
+            'id': goal.id,
+            'title': goal.title,
+            'start_date': goal.start_date.isoformat(),
+            'target_date': goal.target_date.isoformat(),
+            'completion_status': goal.completion_status,
+            'status': goal.status,
+            'parent_goal_id': goal.parent_goal_id,
+            'milestones': milestones_data,
+            'reflections': reflections_data,
+            'progress_updates_count': len(goal.progress_updates),
+            'subgoals_count': Goal.query.filter_by(parent_goal_id=goal.id).count(),
+            'created_at': goal.created_at.isoformat(),
+            'updated_at': goal.updated_at.isoformat()
+        })
+    return goals_data
+
+def seed(goal_count):
+    """Create a user with goal_count goals and return the user's ID."""
+    user = User(username='bench', email='bench@example.com', sensay_user_id='navi_bench')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+
+    now = datetime.utcnow()
+    goals = []
+    for index in range(goal_count):
+        goals.append({
+            'id': index + 1,
+            'user_id': user.id,
+            'title': f"Goal {index}",
+            'start_date': now,
+            'target_date': now + timedelta(days=90),
+            'status': 'active' if index % 4 else 'completed',
+            # Every tenth goal is a subgoal of an earlier one
+            'parent_goal_id': index // 10 + 1 if index % 10 == 9 else None,
+            'created_at': now - timedelta(minutes=index),
+            'updated_at': now
+        })
+    db.session.bulk_insert_mappings(Goal, goals)
+
+    milestones, reflections, updates = [], [], []
+    for goal in goals:
+        for number in range(3):
+            milestones.append({'goal_id': goal['id'], 'title': f"Milestone {number}",
+                               'target_date': now + timedelta(days=30 * (number + 1)), 'created_at': now})
+        for reflection_type in ('importance', 'obstacles'):
+            reflections.append({'goal_id': goal['id'], 'reflection_type': reflection_type,
+                                'content': 'Because it matters', 'created_at': now})
+        for day in range(3):
+            for update_type in ('progress', 'effort'):
+                updates.append({'goal_id': goal['id'], 'progress_value': 10.0 * day, 'type': update_type,
+                                'created_at': now - timedelta(days=day)})
+    db.session.bulk_insert_mappings(Milestone, milestones)
+    db.session.bulk_insert_mappings(Reflection, reflections)
+    db.session.bulk_insert_mappings(ProgressUpdate, updates)
+    db.session.commit()
+    return user.id
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+def measure(func, counter, repeat):
+    """Return (queries per call, median seconds per call, last result)."""
+    timings = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        counter.count = 0
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return counter.count, statistics.median(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark GET /api/goals/ against the per-goal listing')
+    parser.add_argument('--goals', type=int, default=1000, help='Goals for the benchmark user')
+    parser.add_argument('--repeat', type=int, default=5, help='Requests per implementation')
+    parser.add_argument('--database', default='sqlite://', help='Database URL (default: in-memory SQLite)')
+    args = parser.parse_args()
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database,
+        'JWT_SECRET_KEY': 'goals-listing-benchmark-secret-key',
+        'LOG_LEVEL': 'WARNING'
+    })
+
+    with app.app_context():
+        db.create_all()
+        user_id = seed(args.goals)
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user_id))}"}
+        client = app.test_client()
+        counter = QueryCounter(db.engine)
+
+        legacy_queries, legacy_time, legacy_result = measure(lambda: legacy_goals_listing(user_id), counter, args.repeat)
+        queries, elapsed, response = measure(lambda: client.get('/api/goals/', headers=headers), counter, args.repeat)
+        current_result = response.get_json()['goals']
+
+    print(f"Goals: {args.goals}")
+    print(f"{'implementation':<16} {'queries':>8} {'ms/request':>11}")
+    print(f"{'legacy':<16} {legacy_queries:>8} {legacy_time * 1000:>11.1f}")
+    print(f"{'GET /api/goals/':<16} {queries:>8} {elapsed * 1000:>11.1f}")
+    print(f"Speedup: {legacy_time / elapsed:.1f}x (the endpoint time includes JSON serialization)")
+
+    if current_result != legacy_result:
+        print("MISMATCH: the endpoint returned different goals than the legacy listing")
+        sys.exit(1)
+    print("Results match")
+
+if __name__ == "__main__":
+    main()
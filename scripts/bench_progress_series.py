@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the progress time series endpoint.
+
+Seeds one goal with a progress and an effort update per day for several
+years in a file-backed SQLite database, then compares what a chart costs
+when drawn from the full update list (GET /api/progress/goals/<id>/updates)
+with the bucketed (day, week, month) and LTTB-downsampled modes of
+GET /api/progress/goals/<id>/series: median response time, response size
+and number of chart points.
+
+Usage: python scripts/bench_progress_series.py [--days 1825] [--points 100] [--repeat 20]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import logging
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User, Goal, ProgressUpdate
+
+def seed(days):
+    """Create a user with one goal updated daily; return (user ID, goal ID)."""
+    user = User(username='bench', email='bench@example.com', sensay_user_id='navi_bench')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    start = datetime.utcnow() - timedelta(days=days)
+    goal = Goal(user_id=user.id, title='Daily habit', start_date=start, target_date=start + timedelta(days=days + 30))
+    db.session.add(goal)
+    db.session.flush()
+    db.session.bulk_insert_mappings(ProgressUpdate, [
+        {'goal_id': goal.id, 'type': update_type, 'created_at': start + timedelta(days=day, hours=hour),
+         'progress_value': min(100.0, day * 100.0 / days + (day % 7) * 0.5)}
+        for day in range(days) for update_type, hour in (('progress', 20), ('effort', 21))
+    ])
+    db.session.commit()
+    return user.id, goal.id
+
+def chart_points(url, body):
+    """Number of points a chart draws from a response."""
+    if '/updates' in url:
+        return len(body['progress_updates'])
+    series = body['series']
+    if isinstance(series, dict):
+        return sum(len(values['points']) for values in series.values())
+    return sum(1 for bucket in series for key in ('progress', 'effort') if bucket[key])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the progress series endpoint against the full update list')
+    parser.add_argument('--days', type=int, default=5 * 365, help='Days of daily progress and effort updates')
+    parser.add_argument('--points', type=int, default=100, help='Points per series in lttb mode')
+    parser.add_argument('--repeat', type=int, default=20, help='Requests per variant')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-progress-series-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'JWT_SECRET_KEY': 'progress-series-benchmark-secret-key',
+        'LOG_LEVEL': 'WARNING'
+    })
+    logging.getLogger('strategist').setLevel(logging.WARNING)
+
+    try:
+        with app.app_context():
+            db.create_all()
+            user_id, goal_id = seed(args.days)
+            headers = {'Authorization': f"Bearer {create_access_token(identity=str(user_id))}"}
+        client = app.test_client()
+
+        variants = [
+            ('full list', f'/api/progress/goals/{goal_id}/updates'),
+            ('day buckets', f'/api/progress/goals/{goal_id}/series?interval=day'),
+            ('week buckets', f'/api/progress/goals/{goal_id}/series?interval=week'),
+            ('month buckets', f'/api/progress/goals/{goal_id}/series?interval=month'),
+            (f'lttb {args.points}', f'/api/progress/goals/{goal_id}/series?mode=lttb&points={args.points}')
+        ]
+        print(f"{args.days * 2} updates")
+        print(f"{'variant':<14} {'ms':>8} {'bytes':>10} {'points':>7}")
+        for name, url in variants:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.get(url, headers=headers)
+                timings.append(time.perf_counter() - start)
+            body = response.get_json()
+            print(f"{name:<14} {statistics.median(timings) * 1000:>8.2f} "
+                  f"{len(json.dumps(body)):>10} {chart_points(url, body):>7}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark for pooled keep-alive Sensay requests.
+
+Starts a local HTTP/1.1 server that stands in for the Sensay API and compares
+the per-call latency of a fresh connection per request (the old bare
+requests.request behaviour) with the pooled session used by SensayAPI. The stand-in speaks plain HTTP over
+loopback, so only the TCP handshake is saved here; against api.sensay.io each
+fresh connection also pays a TLS handshake and the gap is much wider.
+
+Usage: python scripts/bench_sensay_session.py [--calls 500] [--latency-ms 0]
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.sensay import SensayAPI
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal keep-alive handler answering every call with a replica payload."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({'uuid': 'bench-replica', 'content': 'ok'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+    do_PUT = _respond
+    do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+class FreshConnectionSensayAPI(SensayAPI):
+    """Client that opens a new connection per call, as before pooling."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests
+
+def run(client, calls):
+    """Time `calls` sequential get_replica calls and return latencies in ms."""
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client.get_replica('bench-replica', 'bench-user')
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<18} mean {statistics.mean(latencies):7.3f} ms   "
+          f"median {statistics.median(latencies):7.3f} ms   p95 {p95:7.3f} ms")
+    return statistics.mean(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pooled vs. fresh Sensay HTTP connections')
+    parser.add_argument('--calls', type=int, default=500, help='Number of calls per mode')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Simulated server processing time')
+    args = parser.parse_args()
+
+    StandInHandler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        fresh = FreshConnectionSensayAPI(api_key='bench', base_url=base_url)
+        pooled = SensayAPI(api_key='bench', base_url=base_url)
+
+        # Warm up both paths once
+        run(fresh, 5)
+        run(pooled, 5)
+
+        print(f"{args.calls} sequential get_replica calls against {base_url}")
+        fresh_mean = report('fresh connection', run(fresh, args.calls))
+        pooled_mean = report('pooled session', run(pooled, args.calls))
+        print(f"Speedup: {fresh_mean / pooled_mean:.2f}x per call")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the SQLite engine profiles.
+
+Seeds a file-backed SQLite database with a few users, each with goals and
+milestones, then starts several worker processes (like gunicorn workers)
+that call the API through the test client with a mix of reads
+(GET /api/goals/, GET /api/goals/<id>, GET /api/progress/summary) and writes
+(POST /api/progress/goals/<id>/updates, which also queues a system update).
+Each engine profile ('default': rollback journal, no pool; 'production':
+WAL and tuned pragmas, see app/database.py) gets a fresh database. The
+benchmark reports throughput, read and write latency percentiles and the
+number of failed requests ("database is locked").
+
+Usage: python scripts/bench_sqlite_concurrency.py [--processes 4] [--requests 300] [--write-ratio 0.2] [--profiles default production]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import logging
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User
+
+JWT_SECRET_KEY = 'sqlite-concurrency-benchmark-secret-key'
+
+def make_app(database, profile):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database,
+        'JWT_SECRET_KEY': JWT_SECRET_KEY,
+        'LOG_LEVEL': 'CRITICAL',
+        'DB_ENGINE_PROFILE': profile
+    })
+    logging.getLogger('strategist').setLevel(logging.CRITICAL)
+    return app
+
+def seed(database, profile, users, goals_per_user):
+    """Create the users and their goals; return {user_id: [goal_id, ...]}."""
+    from app.api.goals import create_goal_internal
+
+    app = make_app(database, profile)
+    goal_ids = {}
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        for index in range(users):
+            user = User(username=f"user{index}", email=f"user{index}@example.com", sensay_user_id=f"navi_user{index}")
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            goal_ids[user.id] = [create_goal_internal(user.id, {
+                'title': f"Goal {number}",
+                'target_date': now + timedelta(days=5 + number),
+                'milestones': [{'title': f"Milestone {step}", 'target_date': now + timedelta(days=step + 1)}
+                               for step in range(3)],
+                'reflections': {'importance': 'It matters'}
+            })['id'] for number in range(goals_per_user)]
+        db.engine.dispose()
+    return goal_ids
+
+def worker(database, profile, goal_ids, requests, write_ratio, seed_value, start_at):
+    """Issue `requests` mixed requests; return (read latencies, write latencies, errors)."""
+    app = make_app(database, profile)
+    random.seed(seed_value)
+    client = app.test_client()
+    with app.app_context():
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in goal_ids}
+
+    reads, writes, errors = [], [], []
+    # Start together so the processes actually contend
+    time.sleep(max(0.0, start_at - time.time()))
+    for _ in range(requests):
+        user_id = random.choice(list(goal_ids))
+        goal_id = random.choice(goal_ids[user_id])
+        headers = {'Authorization': f"Bearer {tokens[user_id]}"}
+        is_write = random.random() < write_ratio
+        start = time.perf_counter()
+        if is_write:
+            response = client.post(f"/api/progress/goals/{goal_id}/updates", headers=headers,
+                                   json={'progress_value': random.randint(0, 100), 'type': 'progress'})
+        else:
+            url = random.choice(['/api/goals/', f"/api/goals/{goal_id}", '/api/progress/summary'])
+            response = client.get(url, headers=headers)
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            errors.append((response.status_code, (response.get_json() or {}).get('error', '')[:120]))
+        else:
+            (writes if is_write else reads).append(elapsed)
+    return reads, writes, errors
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run_profile(profile, args):
+    workdir = tempfile.mkdtemp(prefix='bench-sqlite-')
+    database = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    try:
+        goal_ids = seed(database, profile, args.users, args.goals)
+        context = multiprocessing.get_context('spawn')
+        start_at = time.time() + 3
+        with context.Pool(args.processes) as pool:
+            jobs = [pool.apply_async(worker, (database, profile, goal_ids, args.requests, args.write_ratio,
+                                              index, start_at))
+                    for index in range(args.processes)]
+            results = [job.get() for job in jobs]
+        wall = time.time() - start_at
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    reads = [latency for result in results for latency in result[0]]
+    writes = [latency for result in results for latency in result[1]]
+    errors = [error for result in results for error in result[2]]
+    return {
+        'profile': profile,
+        'throughput': (len(reads) + len(writes)) / wall,
+        'read_p50': percentile(reads, 0.5), 'read_p95': percentile(reads, 0.95),
+        'write_p50': percentile(writes, 0.5), 'write_p95': percentile(writes, 0.95),
+        'errors': errors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mixed reads and writes from several processes per engine profile')
+    parser.add_argument('--processes', type=int, default=4, help='Concurrent worker processes')
+    parser.add_argument('--requests', type=int, default=300, help='Requests per process')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of requests that write')
+    parser.add_argument('--users', type=int, default=4, help='Users to spread the requests over')
+    parser.add_argument('--goals', type=int, default=20, help='Goals per user')
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'], help='Engine profiles to compare')
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.requests} requests, {args.write_ratio:.0%} writes")
+    print(f"{'profile':<11} {'req/s':>7} {'read p50':>9} {'read p95':>9} {'write p50':>10} {'write p95':>10} {'errors':>7}")
+    for profile in args.profiles:
+        result = run_profile(profile, args)
+        print(f"{profile:<11} {result['throughput']:>7.1f} "
+              f"{result['read_p50'] * 1000:>7.1f}ms {result['read_p95'] * 1000:>7.1f}ms "
+              f"{result['write_p50'] * 1000:>8.1f}ms {result['write_p95'] * 1000:>8.1f}ms {len(result['errors']):>7}")
+        for status, message in sorted(set(result['errors']))[:3]:
+            print(f"    {status}: {message}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Check the bucketed and downsampled progress series of app/progress_series.py.
+
+Seeds a goal with progress and effort updates spread over day, week (Monday)
+and month boundaries in a throwaway SQLite database and compares every
+bucket returned by bucketed_progress_series (count, avg, min, max, last)
+with the same aggregates computed in Python. The PostgreSQL form of the
+bucket query (date_trunc cast to DATE) is compiled and checked as well, since
+no PostgreSQL server is needed to verify the generated SQL. Finally
+lttb_indices must keep the first and last points and the spikes of a flat
+series.
+
+Usage: python scripts/check_progress_series.py [--updates 2000]
+"""
+
+import os
+import sys
+import random
+import argparse
+import tempfile
+import shutil
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.dialects import postgresql
+
+from app import create_app, db
+from app.models import User, Goal, ProgressUpdate
+from app.progress_series import bucket_query, bucketed_progress_series, downsampled_progress_series, lttb_indices
+
+def bucket_key(created_at, interval):
+    day = created_at.date()
+    if interval == 'day':
+        return day.isoformat()
+    if interval == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.replace(day=1).isoformat()
+
+def expected_buckets(updates, interval):
+    """The buckets bucketed_progress_series should return, computed in Python."""
+    grouped = defaultdict(list)
+    for update in updates:
+        grouped[(bucket_key(update.created_at, interval), update.type)].append(update)
+    buckets = {}
+    for (label, update_type), group in sorted(grouped.items()):
+        values = [update.progress_value for update in group]
+        entry = buckets.setdefault(label, {'bucket': label, 'progress': None, 'effort': None})
+        entry[update_type] = {
+            'count': len(values), 'avg': sum(values) / len(values), 'min': min(values), 'max': max(values),
+            'last': max(group, key=lambda update: (update.created_at, update.id)).progress_value
+        }
+    return list(buckets.values())
+
+def same_buckets(actual, expected):
+    if [bucket['bucket'] for bucket in actual] != [bucket['bucket'] for bucket in expected]:
+        return False
+    for got, want in zip(actual, expected):
+        for update_type in ('progress', 'effort'):
+            if (got[update_type] is None) != (want[update_type] is None):
+                return False
+            if got[update_type] and any(abs(got[update_type][key] - want[update_type][key]) > 1e-9
+                                        for key in want[update_type]):
+                return False
+    return True
+
+def check_postgresql_sql():
+    """Compile the bucket query for PostgreSQL; return a list of problems."""
+    problems = []
+    for interval in ('day', 'week', 'month'):
+        sql = str(bucket_query(1, None, interval, dialect='postgresql').compile(
+            dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+        if f"CAST(date_trunc('{interval}', progress_updates.created_at) AS DATE)" not in sql:
+            problems.append(f"PostgreSQL {interval} buckets do not cast date_trunc to DATE:\n{sql}")
+        if 'date(' in sql.lower().replace('date_trunc(', ''):
+            problems.append(f"PostgreSQL {interval} buckets call a date() function:\n{sql}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the bucketed and LTTB progress series')
+    parser.add_argument('--updates', type=int, default=2000, help='Progress and effort updates to seed')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check-progress-series-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'check.db')}",
+        'JWT_SECRET_KEY': 'progress-series-check-secret-key',
+        'LOG_LEVEL': 'WARNING'
+    })
+
+    problems = check_postgresql_sql()
+    try:
+        with app.app_context():
+            db.create_all()
+            user = User(username='checker', email='checker@example.com', sensay_user_id='navi_checker')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.flush()
+            goal = Goal(user_id=user.id, title='Checked goal', start_date=datetime(2024, 1, 1),
+                        target_date=datetime(2026, 1, 1))
+            db.session.add(goal)
+            db.session.flush()
+
+            random.seed(1)
+            start = datetime(2024, 1, 1)
+            db.session.bulk_insert_mappings(ProgressUpdate, [
+                {'goal_id': goal.id, 'type': random.choice(['progress', 'effort']),
+                 'progress_value': round(random.random() * 100, 1),
+                 # Around midnight, so updates land on both sides of day, week and month boundaries
+                 'created_at': start + timedelta(hours=7 * index + random.choice([-0.5, 0.5]))}
+                for index in range(args.updates)
+            ])
+            db.session.commit()
+            updates = ProgressUpdate.query.filter_by(goal_id=goal.id, milestone_id=None).all()
+
+            for interval in ('day', 'week', 'month'):
+                actual = bucketed_progress_series(goal.id, None, interval)
+                if not same_buckets(actual, expected_buckets(updates, interval)):
+                    problems.append(f"SQLite {interval} buckets differ from the Python aggregates")
+                else:
+                    print(f"{interval:>5} buckets: {len(actual)} match")
+
+            series = downsampled_progress_series(goal.id, None, 50)
+            for update_type, values in series.items():
+                ordered = sorted((update for update in updates if update.type == update_type),
+                                 key=lambda update: (update.created_at, update.id))
+                points = values['points']
+                if (values['total'] != len(ordered) or len(points) != min(50, len(ordered))
+                        or points[0]['id'] != ordered[0].id or points[-1]['id'] != ordered[-1].id):
+                    problems.append(f"LTTB {update_type} series does not keep its endpoints")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    spikes = [0.0] * 1000
+    spikes[250], spikes[500] = -50.0, 100.0
+    kept = lttb_indices(list(range(1000)), spikes, 20)
+    if len(kept) != 20 or kept[0] != 0 or kept[-1] != 999 or not {250, 500} <= set(kept):
+        problems.append(f"lttb_indices dropped the spikes of a flat series: {kept}")
+
+    if problems:
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        sys.exit(1)
+    print("OK: progress series match")
+
+if __name__ == "__main__":
+    main()
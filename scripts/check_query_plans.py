@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Check that the queries issued by the goals, progress and chat endpoints use indexes.
+
+Builds a throwaway SQLite database by running the Flask-Migrate migrations,
+seeds users with goals, subgoals, milestones, progress updates, reflections
+and chat history, then calls every endpoint in app/api/goals.py,
+app/api/progress.py and app/api/chat.py through the test client. Each SELECT,
+UPDATE and DELETE they issue is run again under EXPLAIN QUERY PLAN, and the
+script fails if any plan scans a whole table. Sorts that need a temporary
+B-tree are listed too, and fail the check with --strict.
+
+Chat replies come from an offline stand-in for the Sensay client, so no API
+key or network access is needed.
+
+Usage: python scripts/check_query_plans.py [--goals 50] [--other-users 20] [--strict] [--verbose]
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import traceback
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+from flask_migrate import upgrade
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User, Goal, Milestone, ProgressUpdate, Reflection, ChatMessage, ReplicaState
+from app.prompts import STRATEGIST_SYSTEM_MESSAGE
+from app.knowledge_base import get_knowledge_base_manifest_hash
+import app.api.chat as chat_module
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Full scans look like "SCAN goals" (or "SCAN TABLE goals" on older SQLite);
+# "SCAN goals USING INDEX ..." walks an index and is allowed
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+TEMP_BTREE = re.compile(r'USE TEMP B-TREE')
+
+def is_full_scan(detail):
+    """True if a plan step reads a whole table (scans of subqueries and CTEs are fine)."""
+    match = FULL_SCAN.match(detail)
+    return bool(match) and 'USING' not in detail and match.group(1) in db.metadata.tables
+
+class OfflineSensayClient:
+    """Answers chat completions locally; any other Sensay call fails the check."""
+
+    def __init__(self):
+        self.replies = []
+
+    def create_chat_completion(self, replica_id, user_id, content, source='web', skip_chat_history=False):
+        return {'content': self.replies.pop(0) if self.replies else 'Keep going, you are doing well.'}
+
+    def __getattr__(self, name):
+        raise AssertionError(f"Unexpected Sensay call during the query plan check: {name}")
+
+def add_user(name, goal_count):
+    """Add a user with goals, subgoals, milestones, progress, reflections and chat history."""
+    user = User(username=name, email=f"{name}@example.com", sensay_user_id=f"navi_{name}", replica_id=f"replica-{name}")
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    goals = []
+    for index in range(goal_count):
+        parent = goals[index // 5] if index >= 5 and index % 3 == 0 else None
+        goal = Goal(user_id=user.id, title=f"Goal {index}", start_date=now - timedelta(days=index),
+                    target_date=now + timedelta(days=90), status=['active', 'completed', 'abandoned'][index % 3],
+                    parent_goal_id=parent.id if parent else None)
+        db.session.add(goal)
+        db.session.flush()
+        goals.append(goal)
+
+        for number in range(4):
+            milestone = Milestone(goal_id=goal.id, title=f"Milestone {number}", target_date=now + timedelta(days=20 * number),
+                                  status='completed' if number < 2 else 'pending')
+            db.session.add(milestone)
+            db.session.flush()
+            for day in range(3):
+                for update_type in ('progress', 'effort'):
+                    db.session.add(ProgressUpdate(goal_id=goal.id, milestone_id=milestone.id, progress_value=10 * day,
+                                                  type=update_type, created_at=now - timedelta(days=day)))
+
+        for day in range(10):
+            for update_type in ('progress', 'effort'):
+                db.session.add(ProgressUpdate(goal_id=goal.id, progress_value=5 * day, type=update_type,
+                                              progress_notes='Steady week', created_at=now - timedelta(days=day)))
+
+        for reflection_type in ('importance', 'obstacles', 'review_positive'):
+            db.session.add(Reflection(goal_id=goal.id, reflection_type=reflection_type, content='Because it matters'))
+
+        for number in range(10):
+            db.session.add(ChatMessage(user_id=user.id, sender=['user', 'replica', 'system'][number % 3],
+                                       content=f"Message {number}", related_goal_id=goal.id if number % 2 else None))
+
+    return user, goals
+
+def seed(goal_count, other_users):
+    """Create the checked user among other users, and return its ID and one of its goal IDs.
+
+    Other users keep the table statistics realistic: with a single user,
+    SQLite rightly prefers scanning a table to searching on user_id.
+    """
+    for number in range(other_users):
+        add_user(f"other{number}", max(1, goal_count // 5))
+    user, goals = add_user('planner', goal_count)
+
+    # A verified replica, so chat requests skip the Sensay replica checks
+    db.session.add(ReplicaState(
+        user_id=user.id,
+        replica_id=user.replica_id,
+        system_message_hash=chat_module.hash_system_message(STRATEGIST_SYSTEM_MESSAGE),
+        kb_manifest_hash=get_knowledge_base_manifest_hash()
+    ))
+
+    db.session.commit()
+    return user.id, goals[0].id
+
+def exercise_endpoints(client, headers, goal_id, sensay_client):
+    """Call every endpoint of the goals, progress and chat blueprints."""
+    def call(method, url, expected=(200, 201), **kwargs):
+        response = client.open(url, method=method, headers=headers, **kwargs)
+        if response.status_code not in expected:
+            raise AssertionError(f"{method} {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+    # Goals
+    call('GET', '/api/goals/')
+    call('GET', '/api/goals/?status=active&parent_id=null')
+    call('GET', f'/api/goals/?parent_id={goal_id}')
+    call('GET', f'/api/goals/{goal_id}')
+    created = call('POST', '/api/goals/', json={
+        'title': 'Checked goal', 'target_date': '2027-01-01T00:00:00', 'parent_goal_id': goal_id,
+        'milestones': [{'title': 'First', 'target_date': '2026-12-01T00:00:00'}],
+        'reflections': {'importance': 'Check it'}
+    })['goal']
+    new_goal_id = created['id']
+    milestone_id = created['milestones'][0]['id']
+    call('PUT', f'/api/goals/{new_goal_id}', json={
+        'title': 'Checked goal, renamed', 'status': 'active', 'parent_goal_id': goal_id,
+        'reflections': {'importance': 'Still matters', 'obstacles': 'Time'}
+    })
+    call('GET', f'/api/goals/{new_goal_id}/milestones')
+    second = call('POST', f'/api/goals/{new_goal_id}/milestones',
+                  json={'title': 'Second', 'target_date': '2026-12-15T00:00:00'})
+    call('PUT', f'/api/goals/{new_goal_id}/milestones/{milestone_id}', json={'status': 'completed', 'completion_status': 100})
+    call('POST', f'/api/goals/{new_goal_id}/milestones/{milestone_id}/progress', json={'progress_value': 40, 'type': 'progress'})
+    call('GET', f'/api/goals/{new_goal_id}/milestones/{milestone_id}/progress')
+    call('GET', f'/api/goals/{new_goal_id}/milestones/{milestone_id}/progress?type=effort')
+    call('GET', f'/api/goals/{new_goal_id}/reflections')
+    call('POST', f'/api/goals/{new_goal_id}/reflections', json={'reflection_type': 'importance', 'content': 'Updated'})
+    call('POST', f'/api/goals/{new_goal_id}/reflections', json={'reflection_type': 'environment', 'content': 'New'})
+
+    # Progress
+    call('GET', f'/api/progress/goals/{goal_id}/updates')
+    call('GET', f'/api/progress/goals/{goal_id}/updates?type=effort')
+    update = call('POST', f'/api/progress/goals/{new_goal_id}/updates', json={'progress_value': 30, 'progress_notes': 'Good week'})
+    call('DELETE', f"/api/progress/goals/{new_goal_id}/updates/{update['progress_update']['id']}")
+    call('GET', f'/api/progress/goals/{goal_id}/series')
+    call('GET', f'/api/progress/goals/{goal_id}/series?interval=week&start=2020-01-01T00:00:00')
+    call('GET', f'/api/progress/goals/{goal_id}/series?mode=lttb&points=5')
+    call('GET', f'/api/progress/goals/{new_goal_id}/series?milestone_id={milestone_id}&interval=month')
+    call('GET', '/api/progress/summary')
+    call('GET', '/api/progress/achievements')
+
+    # Chat
+    call('GET', '/api/chat/history')
+    call('GET', f'/api/chat/history?goal_id={goal_id}&limit=20&offset=10')
+    call('GET', '/api/chat/history?include_system=true')
+    call('GET', '/api/chat/history?before_id=&limit=20')
+    call('GET', '/api/chat/history?before_id=40&limit=20')
+    call('GET', f'/api/chat/history?goal_id={goal_id}&after_id=5&limit=20')
+    call('POST', '/api/chat/send', json={'content': 'How am I doing?', 'related_goal_id': goal_id})
+    sensay_client.replies.append('Noted.\n\n```json\n' + json.dumps({
+        'action_type': 'update_progress', 'data': {'goal_id': new_goal_id, 'progress_value': 50}
+    }) + '\n```\n\n```json\n' + json.dumps({
+        'action_type': 'save_reflections', 'data': {'goal_id': new_goal_id, 'reflections': [{'type': 'timeline', 'content': 'Soon'}]}
+    }) + '\n```')
+    call('POST', '/api/chat/send', json={'content': 'I am halfway there', 'related_goal_id': new_goal_id})
+
+    # Deletes last
+    call('DELETE', f"/api/goals/{new_goal_id}/milestones/{second['milestone']['id']}")
+    call('DELETE', f'/api/goals/{new_goal_id}')
+
+def query_origin():
+    """Return 'file:line' of the innermost application frame issuing the current query."""
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(os.path.join(ROOT, 'app') + os.sep):
+            return f"{os.path.relpath(path, ROOT)}:{frame.lineno}"
+    return '?'
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that API queries use indexes (SQLite EXPLAIN QUERY PLAN)')
+    parser.add_argument('--goals', type=int, default=50, help='Goals to seed for the test user')
+    parser.add_argument('--other-users', type=int, default=20, help='Other users to seed, with a fifth as many goals each')
+    parser.add_argument('--strict', action='store_true', help='Also fail on sorts that need a temporary B-tree')
+    parser.add_argument('--verbose', action='store_true', help='Print the plan of every query')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='query-plans-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'check.db')}",
+        'JWT_SECRET_KEY': 'query-plan-check-secret-key-0123456789',
+        'LOG_LEVEL': 'WARNING'
+    })
+
+    sensay_client = OfflineSensayClient()
+    chat_module.get_sensay_client = lambda: sensay_client
+
+    with app.app_context():
+        upgrade()
+        user_id, goal_id = seed(args.goals, args.other_users)
+        db.session.execute('ANALYZE')
+        db.session.commit()
+
+        statements = {}
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if executemany or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                return
+            statements.setdefault(statement, (parameters, query_origin()))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        client = app.test_client()
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user_id))}"}
+        try:
+            exercise_endpoints(client, headers, goal_id, sensay_client)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        failures = []
+        sorts = []
+        with db.engine.connect() as connection:
+            for statement, (parameters, origin) in statements.items():
+                plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+                scans = [detail for detail in plan if is_full_scan(detail)]
+                temp_sorts = [detail for detail in plan if TEMP_BTREE.search(detail)]
+                if scans:
+                    failures.append((origin, statement, plan))
+                elif temp_sorts:
+                    sorts.append((origin, statement, plan))
+                if args.verbose:
+                    print(f"\n{origin}\n  {' '.join(statement.split())}")
+                    for detail in plan:
+                        print(f"    {detail}")
+
+    print(f"Checked {len(statements)} distinct queries from {args.goals} seeded goals")
+    for title, entries in (('Full table scans', failures), ('Sorts using a temporary B-tree', sorts)):
+        if entries:
+            print(f"\n{title}:")
+            for origin, statement, plan in entries:
+                print(f"  {origin}: {' '.join(statement.split())[:160]}")
+                for detail in plan:
+                    print(f"      {detail}")
+
+    if failures or (args.strict and sorts):
+        print("\nFAILED")
+        sys.exit(1)
+    print("\nOK: every query uses an index")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Fault-injection check for the Sensay retry and circuit breaker layer.
+
+Starts a local stand-in for the Sensay API that answers from a scripted list
+of responses (429 with Retry-After, 5xx, ...) and runs the sync and async
+clients against it, checking retries, Retry-After handling, that POSTs are
+not retried, and that the per-endpoint circuit breaker trips, fails fast and
+recovers. Prints the resulting metrics at the end.
+
+Usage: python scripts/sensay_fault_injection.py
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.metrics import metrics
+from app.services.sensay import (
+    SensayAPI, SensayAPIError, CircuitOpenError, RetryPolicy, endpoint_key,
+    get_circuit_breaker, get_circuit_breaker_states, reset_circuit_breakers
+)
+
+class FaultInjectingHandler(BaseHTTPRequestHandler):
+    """Answers from `script` (status, headers, body) in order, then with 200s."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    script = []
+    calls = 0
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        FaultInjectingHandler.calls += 1
+        if FaultInjectingHandler.script:
+            status, headers, body = FaultInjectingHandler.script.pop(0)
+        else:
+            status, headers, body = 200, {}, {'uuid': 'replica', 'content': 'ok'}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _respond
+    do_POST = _respond
+    do_PUT = _respond
+    do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+def inject(*responses):
+    """Queue responses and reset per-scenario state."""
+    FaultInjectingHandler.script = list(responses)
+    FaultInjectingHandler.calls = 0
+    reset_circuit_breakers()
+
+def error(status, message='injected', headers=None):
+    return (status, headers or {}, {'message': message})
+
+def check(name, condition, detail=''):
+    print(f"{'PASS' if condition else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+    return condition
+
+def scenario_retry_then_success(client):
+    inject(error(503), error(502))
+    result = client.get_replica('replica', 'user')
+    return check('GET retried through 503, 502', result.get('uuid') == 'replica' and FaultInjectingHandler.calls == 3,
+                 f"{FaultInjectingHandler.calls} calls")
+
+def scenario_retry_after(client):
+    inject(error(429, 'slow down', {'Retry-After': '1'}))
+    start = time.monotonic()
+    client.list_replicas('user')
+    elapsed = time.monotonic() - start
+    return check('429 Retry-After honored', 0.9 <= elapsed < 2 and FaultInjectingHandler.calls == 2,
+                 f"waited {elapsed:.2f}s")
+
+def scenario_retry_after_too_long(client):
+    inject(error(429, 'slow down', {'Retry-After': '3600'}))
+    try:
+        client.list_replicas('user')
+        return check('Retry-After beyond cap fails fast', False)
+    except SensayAPIError as e:
+        return check('Retry-After beyond cap fails fast', e.status_code == 429 and FaultInjectingHandler.calls == 1,
+                     f"retry_after={e.retry_after}")
+
+def scenario_post_not_retried(client):
+    inject(error(503))
+    try:
+        client.create_chat_completion('replica', 'user', 'hello')
+        return check('POST not retried', False)
+    except SensayAPIError as e:
+        return check('POST not retried', e.status_code == 503 and FaultInjectingHandler.calls == 1)
+
+def scenario_client_error_not_retried(client):
+    inject(error(404, 'not found'))
+    try:
+        client.get_replica('missing', 'user')
+        return check('404 not retried', False)
+    except SensayAPIError as e:
+        return check('404 not retried', e.status_code == 404 and FaultInjectingHandler.calls == 1)
+
+def scenario_breaker(base_url):
+    inject(*[error(500)] * 3)
+    client = SensayAPI(api_key='fault', base_url=base_url, retry_policy=RetryPolicy(max_retries=0))
+    breaker = get_circuit_breaker(endpoint_key('GET', '/v1/users/someone'))
+    breaker.threshold = 3
+    breaker.reset_timeout = 0.5
+
+    for _ in range(3):
+        try:
+            client.get_user('someone')
+        except SensayAPIError:
+            pass
+    ok = check('breaker opens after threshold', breaker.state == breaker.OPEN)
+
+    try:
+        client.get_user('someone')
+        ok = check('open breaker fails fast', False) and ok
+    except CircuitOpenError:
+        ok = check('open breaker fails fast', FaultInjectingHandler.calls == 3,
+                   f"{FaultInjectingHandler.calls} server calls") and ok
+
+    time.sleep(0.6)
+    client.get_user('someone')
+    ok = check('half-open probe closes breaker', breaker.state == breaker.CLOSED) and ok
+    return ok
+
+def scenario_async(base_url):
+    try:
+        from app.services.sensay_async import AsyncSensayAPI
+    except ImportError:
+        print("SKIP  async client (httpx not installed)")
+        return True
+
+    async def run():
+        inject(error(503), error(504))
+        async with AsyncSensayAPI(api_key='fault', base_url=base_url,
+                                  retry_policy=RetryPolicy(backoff_base=0.01)) as client:
+            result = await client.get_replica('replica', 'user')
+        return check('async GET retried through 503, 504',
+                     result.get('uuid') == 'replica' and FaultInjectingHandler.calls == 3)
+
+    return asyncio.run(run())
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FaultInjectingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        client = SensayAPI(api_key='fault', base_url=base_url,
+                           retry_policy=RetryPolicy(backoff_base=0.01, backoff_max=2))
+        results = [
+            scenario_retry_then_success(client),
+            scenario_retry_after(client),
+            scenario_retry_after_too_long(client),
+            scenario_post_not_retried(client),
+            scenario_client_error_not_retried(client),
+            scenario_breaker(base_url),
+            scenario_async(base_url),
+        ]
+    finally:
+        server.shutdown()
+
+    print("\nMetrics:")
+    snapshot = metrics.snapshot()
+    snapshot['sensay_circuit_breakers'] = get_circuit_breaker_states()
+    print(json.dumps(snapshot, indent=2))
+
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()